@@ -0,0 +1,188 @@
+# اسم الملف: benchmark_reports.py
+# قياس سرعة استعلامات التقارير على سنة كاملة من المبيعات التجريبية
+# قبل وبعد إضافة عمود sale_day والفهارس
+#
+# الاستخدام: python benchmark_reports.py [عدد_الفواتير_في_اليوم]
+
+import contextlib
+import io
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from database import Database
+
+# الاستعلامات القديمة كما كانت قبل إضافة sale_day
+LEGACY_QUERIES = {
+    'get_invoices_by_date_range': """
+        SELECT
+            i.invoice_id, i.date, i.customer_id, i.cashier_username,
+            i.total, i.discount, i.net_total,
+            COALESCE(SUM(
+                CASE
+                    WHEN p.purchase_price > 0
+                    THEN (ii.total_price - (p.purchase_price * ii.quantity))
+                    ELSE 0
+                END
+            ), 0) as invoice_profit
+        FROM invoices i
+        LEFT JOIN invoice_items ii ON i.invoice_id = ii.invoice_id
+        LEFT JOIN products p ON ii.product_code = p.code
+        WHERE date(substr(i.date, 1, 10)) BETWEEN date(?) AND date(?)
+        GROUP BY i.invoice_id, i.date, i.customer_id, i.cashier_username, i.total, i.discount, i.net_total
+        ORDER BY i.date DESC
+    """,
+    'get_top_products': """
+        SELECT
+            p.code, p.name, p.sell_by,
+            COALESCE(SUM(ii.quantity), 0),
+            COALESCE(SUM(ii.weight), 0),
+            COALESCE(SUM(ii.total_price), 0)
+        FROM products p
+        LEFT JOIN invoice_items ii ON p.code = ii.product_code
+        LEFT JOIN invoices i ON ii.invoice_id = i.invoice_id
+            AND date(substr(i.date, 1, 10)) BETWEEN date(?) AND date(?)
+        GROUP BY p.code, p.name, p.sell_by
+    """,
+    'get_low_selling_products': """
+        SELECT
+            p.code, p.name, p.sell_by,
+            COALESCE(SUM(ii.quantity), 0),
+            COUNT(DISTINCT i.invoice_id)
+        FROM products p
+        LEFT JOIN invoice_items ii ON p.code = ii.product_code
+        LEFT JOIN invoices i ON ii.invoice_id = i.invoice_id
+            AND date(substr(i.date, 1, 10)) BETWEEN date(?) AND date(?)
+        GROUP BY p.code, p.name, p.sell_by
+    """,
+}
+
+# الفترات المطلوب قياسها (يوم، أسبوع، شهر)
+RANGES = [
+    ('يوم', '2024-06-15', '2024-06-15'),
+    ('أسبوع', '2024-06-10', '2024-06-16'),
+    ('شهر', '2024-06-01', '2024-06-30'),
+]
+
+# أجزاء أسماء المنتجات التجريبية حتى يقيس البحث بالاسم (FTS و LIKE) أسماء حقيقية
+PRODUCT_KINDS = ["أرز", "سكر", "زيت", "مكرونة", "شاي", "جبنة", "لبن", "عصير", "بسكويت", "صابون",
+                 "شيبسي", "قهوة", "عدس", "فول", "تونة", "مربى", "دقيق", "سمن", "شامبو", "مناديل"]
+PRODUCT_BRANDS = ["الضحى", "كريستال", "جهينة", "ليبتون", "دومتي", "المراعي", "إيديتا", "فيوري",
+                  "العربي", "هارفست", "الملكة", "بريل"]
+PRODUCT_SIZES = ["1 كجم", "500 جم", "250 جم", "1 لتر", "2 لتر", "عبوة عائلية", "كرتونة 12"]
+
+# نصوص البحث بالاسم المطلوب قياسها
+SEARCH_QUERIES = ["أرز", "زيت كريستال", "جبن", "مكرونه 500", "شاي ليب"]
+
+def quiet():
+    """إخفاء رسائل print من دوال Database أثناء القياس"""
+    return contextlib.redirect_stdout(io.StringIO())
+
+def generate_sales(database, invoices_per_day, products_count=2000, seed=42):
+    """إنشاء منتجات وفواتير تجريبية لسنة 2024 كاملة"""
+    random.seed(seed)
+    cursor = database.conn.cursor()
+    products = []
+    for i in range(products_count):
+        sell_by = 'weight' if i % 5 == 0 else 'quantity'
+        price = round(random.uniform(5, 200), 2)
+        name = f"{random.choice(PRODUCT_KINDS)} {random.choice(PRODUCT_BRANDS)} {random.choice(PRODUCT_SIZES)}"
+        products.append((f"{6220000000000 + i}", name, price, round(price * 0.8, 2),
+                         1000000, 1000000, sell_by))
+    cursor.executemany('''INSERT INTO products (code, name, price, purchase_price, quantity, weight, sell_by)
+                          VALUES (?, ?, ?, ?, ?, ?, ?)''', products)
+
+    invoices = []
+    items = []
+    day = datetime(2024, 1, 1)
+    for _ in range(366):
+        for n in range(invoices_per_day):
+            stamp = day + timedelta(seconds=8 * 3600 + n * 40)
+            invoice_id = f"INV-{stamp.strftime('%Y%m%d%H%M%S')}-{n}"
+            total = 0
+            for _ in range(random.randint(1, 6)):
+                code, name, price, cost, _, _, sell_by = random.choice(products)
+                quantity = 0 if sell_by == 'weight' else random.randint(1, 5)
+                weight = round(random.uniform(0.2, 3), 3) if sell_by == 'weight' else 0
+                line_total = price * (weight or quantity)
+                total += line_total
+                items.append((invoice_id, code, name, price, quantity, weight, line_total, cost))
+            invoices.append((invoice_id, stamp.strftime("%Y-%m-%d %H:%M:%S"), 'admin', total, 0, total))
+        day += timedelta(days=1)
+
+    cursor.executemany('''INSERT INTO invoices (invoice_id, date, cashier_username, total, discount, net_total)
+                          VALUES (?, ?, ?, ?, ?, ?)''', invoices)
+    cursor.executemany('''INSERT INTO invoice_items
+                          (invoice_id, product_code, product_name, price, quantity, weight, total_price, unit_cost)
+                          VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', items)
+    database.conn.commit()
+    return len(invoices), len(items)
+
+def time_call(func, repeat=3):
+    """أفضل زمن تنفيذ (بالمللي ثانية) من عدة محاولات، بدون طباعة رسائل الدالة"""
+    best = None
+    for _ in range(repeat):
+        with quiet():
+            start = time.perf_counter()
+            func()
+            elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def run_benchmark(invoices_per_day=150):
+    work_dir = tempfile.mkdtemp(prefix='pos_bench_')
+    try:
+        after_path = os.path.join(work_dir, 'after.db')
+        before_path = os.path.join(work_dir, 'before.db')
+
+        with quiet():
+            after_db = Database(db_path=after_path)
+            invoices_count, items_count = generate_sales(after_db, invoices_per_day)
+            after_db.rebuild_sales_rollup()
+            after_db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            after_db.conn.execute("ANALYZE")
+            after_db.conn.commit()
+        print(f"\nتم إنشاء {invoices_count} فاتورة و {items_count} عنصر")
+
+        # نسخة بدون الفهارس الجديدة تمثل الوضع السابق
+        shutil.copy2(after_path, before_path)
+        before_conn = sqlite3.connect(before_path)
+        for index in ('idx_invoices_sale_day_date', 'idx_invoice_items_invoice_id', 'idx_invoice_items_product_code'):
+            before_conn.execute(f"DROP INDEX IF EXISTS {index}")
+        before_conn.commit()
+
+        after_calls = {
+            'get_invoices_by_date_range': after_db.get_invoices_by_date_range,
+            'get_top_products': after_db.get_top_products,
+            'get_low_selling_products': after_db.get_low_selling_products,
+        }
+
+        print(f"\n{'الاستعلام':<28} {'الفترة':<8} {'قبل (ms)':>10} {'بعد (ms)':>10} {'التسريع':>8}")
+        for name, query in LEGACY_QUERIES.items():
+            for label, start_date, end_date in RANGES:
+                before = time_call(lambda: before_conn.execute(query, (start_date, end_date)).fetchall())
+                after = time_call(lambda: after_calls[name](start_date, end_date))
+                print(f"{name:<28} {label:<8} {before:>10.1f} {after:>10.1f} {before / after:>7.1f}x")
+
+        # البحث بالاسم: الفهرس FTS مقابل LIKE على كل الأسماء
+        print(f"\n{'البحث بالاسم':<28} {'LIKE (ms)':>10} {'FTS (ms)':>10} {'التسريع':>8}")
+        for text in SEARCH_QUERIES:
+            after_db.product_search_fts = False
+            like = time_call(lambda: after_db.search_products(text, limit=20))
+            after_db.product_search_fts = True
+            fts = time_call(lambda: after_db.search_products(text, limit=20))
+            print(f"{text:<28} {like:>10.2f} {fts:>10.2f} {like / fts:>7.1f}x")
+
+        before_conn.close()
+        after_db.conn.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    per_day = int(sys.argv[1]) if len(sys.argv) > 1 else 150
+    run_benchmark(per_day)
@@ -0,0 +1,193 @@
+# اسم الملف: benchmark_scanner.py
+# قياس سرعة ودقة ماسح الكاميرا (QRCodeScanner) بدون كاميرا، على فيديو مسجل
+# أو مجلد صور، بنفس خطوات فك الكود المستخدمة في البرنامج
+#
+# الاستخدام:
+#   python benchmark_scanner.py <فيديو_أو_مجلد_صور> <ملف_الحقيقة> [--fps 30] [--full]
+#   python benchmark_scanner.py --generate <مجلد>   (إنشاء عينة صور تجريبية)
+#
+# ملف الحقيقة: سطر لكل ظهور لكود أمام الكاميرا بالشكل
+#   <أول_إطار> <آخر_إطار> <الكود>
+# أرقام الإطارات تبدأ من 0، والأسطر التي تبدأ بـ # تُتجاهل.
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from qr_scanner import FrameDecoder, DetectionFilter
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+
+def load_frames(source):
+    """الإطارات بالترتيب من ملف فيديو أو مجلد صور، مع معدل الإطارات إن وجد"""
+    if os.path.isdir(source):
+        names = sorted(name for name in os.listdir(source) if name.lower().endswith(IMAGE_EXTENSIONS))
+        frames = (cv2.imread(os.path.join(source, name)) for name in names)
+        return frames, None
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise IOError(f"لا يمكن فتح الفيديو: {source}")
+
+    def read_all():
+        try:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield frame
+        finally:
+            cap.release()
+    return read_all(), cap.get(cv2.CAP_PROP_FPS) or None
+
+def load_ground_truth(path):
+    """قائمة (أول إطار، آخر إطار، الكود) من ملف الحقيقة"""
+    appearances = []
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.replace(',', ' ').split(None, 2)
+            if len(parts) != 3:
+                raise ValueError(f"سطر غير صحيح في ملف الحقيقة ({number}): {line}")
+            appearances.append((int(parts[0]), int(parts[1]), parts[2].strip()))
+    return appearances
+
+def run_decoder(frames, fps, adaptive=True):
+    """تمرير الإطارات على FrameDecoder و DetectionFilter كما في QRCodeScanner
+
+    الوقت المستخدم في DetectionFilter هو وقت الفيديو (رقم الإطار / fps)،
+    وزمن فك الكود فقط هو الذي يُقاس (بدون قراءة الفيديو من القرص).
+    """
+    decoder = FrameDecoder(adaptive=adaptive)
+    detection_filter = DetectionFilter()
+    emissions = []   # (رقم الإطار، الكود)
+    decode_time = 0.0
+    count = 0
+    for index, frame in enumerate(frames):
+        if frame is None:
+            continue
+        start = time.perf_counter()
+        detections = decoder.decode(frame)
+        decode_time += time.perf_counter() - start
+        count += 1
+        for detection in detections:
+            if detection_filter.accept(detection.data, index / fps):
+                emissions.append((index, detection.data))
+    return {
+        'frames': count,
+        'decode_time': decode_time,
+        'emissions': emissions,
+        'counters': dict(decoder.counters),
+    }
+
+def evaluate(emissions, appearances, fps):
+    """مقارنة الأكواد المرسلة بملف الحقيقة
+
+    كل إرسال داخل ظهور لنفس الكود يُحسب لهذا الظهور: الأول صحيح والباقي
+    تكرار. الإرسال خارج أي ظهور أو بكود مختلف يُحسب خطأ.
+    """
+    hits = [[] for _ in appearances]
+    false_codes = []
+    for index, code in emissions:
+        for number, (first, last, expected) in enumerate(appearances):
+            if first <= index <= last and code == expected:
+                hits[number].append(index)
+                break
+        else:
+            false_codes.append((index, code))
+
+    delays = [(frames[0] - appearances[number][0]) / fps * 1000
+              for number, frames in enumerate(hits) if frames]
+    return {
+        'appearances': len(appearances),
+        'detected': sum(1 for frames in hits if frames),
+        'missed': [appearances[number] for number, frames in enumerate(hits) if not frames],
+        'duplicates': sum(len(frames) - 1 for frames in hits if frames),
+        'false': false_codes,
+        'first_decode_ms': (sum(delays) / len(delays)) if delays else None,
+        'worst_first_decode_ms': max(delays) if delays else None,
+    }
+
+def print_report(label, result, evaluation):
+    frames = result['frames']
+    decode_time = result['decode_time']
+    print(f"\n=== {label} ===")
+    print(f"الإطارات: {frames}")
+    if decode_time > 0:
+        print(f"سرعة فك الكود: {frames / decode_time:.1f} إطار/ث ({decode_time * 1000 / frames:.2f} ms لكل إطار)")
+    print(f"طريقة فك الكود: {result['counters']}")
+    print(f"الأكواد المكتشفة: {evaluation['detected']} من {evaluation['appearances']}")
+    if evaluation['first_decode_ms'] is not None:
+        print(f"زمن أول اكتشاف: متوسط {evaluation['first_decode_ms']:.0f} ms، أقصى {evaluation['worst_first_decode_ms']:.0f} ms")
+    print(f"أكواد لم تكتشف: {len(evaluation['missed'])}")
+    for first, last, code in evaluation['missed']:
+        print(f"  - {code} (الإطارات {first}-{last})")
+    print(f"إرسال مكرر: {evaluation['duplicates']}")
+    print(f"إرسال خاطئ: {len(evaluation['false'])}")
+    for index, code in evaluation['false']:
+        print(f"  - {code} (الإطار {index})")
+
+def generate_fixture(directory, codes=("6221234567890", "6220000000017", "6229876543210"),
+                     hold_frames=45, gap_frames=15, seed=42):
+    """إنشاء مجلد صور لكود QR يتحرك أمام خلفية فيها تشويش، مع ملف الحقيقة"""
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    encoder = cv2.QRCodeEncoder.create()
+    lines = ["# first_frame last_frame code"]
+    index = 0
+    for number, code in enumerate(codes):
+        size = 140 - number * 30   # أكواد أصغر (أبعد عن الكاميرا) في كل مرة
+        symbol = cv2.resize(encoder.encode(code), (size, size), interpolation=cv2.INTER_NEAREST)
+        first = index + gap_frames
+        for step in range(gap_frames + hold_frames):
+            frame = np.full((480, 640, 3), 190, np.uint8)
+            if step >= gap_frames:
+                moved = step - gap_frames
+                x, y = 80 + moved * 4, 120 + (moved % 10)
+                frame[y:y + size, x:x + size] = symbol[..., None]
+            noise = rng.normal(0, 3, frame.shape)
+            frame = np.clip(frame + noise, 0, 255).astype(np.uint8)
+            cv2.imwrite(os.path.join(directory, f"frame_{index:05d}.png"), frame)
+            index += 1
+        lines.append(f"{first} {index - 1} {code}")
+    truth_path = os.path.join(directory, "ground_truth.txt")
+    with open(truth_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    print(f"تم إنشاء {index} صورة في {directory}")
+    return truth_path
+
+def main():
+    parser = argparse.ArgumentParser(description="قياس أداء ماسح الكاميرا على فيديو أو صور مسجلة")
+    parser.add_argument('source', nargs='?', help="ملف فيديو أو مجلد صور")
+    parser.add_argument('truth', nargs='?', help="ملف الحقيقة")
+    parser.add_argument('--fps', type=float, default=None,
+                        help="معدل الإطارات لمجلد الصور أو للفيديو الذي لا يحدده (الافتراضي 30)")
+    parser.add_argument('--full', action='store_true',
+                        help="مقارنة مع فك الكود الكامل لكل إطار")
+    parser.add_argument('--generate', metavar='DIR', help="إنشاء عينة صور تجريبية في المجلد")
+    args = parser.parse_args()
+
+    if args.generate:
+        generate_fixture(args.generate)
+        return 0
+    if not args.source or not args.truth:
+        parser.print_usage()
+        return 2
+
+    appearances = load_ground_truth(args.truth)
+    modes = [('فك الكود التكيفي', True)] + ([('فك الكود الكامل لكل إطار', False)] if args.full else [])
+    for label, adaptive in modes:
+        frames, source_fps = load_frames(args.source)
+        fps = args.fps or source_fps or 30.0
+        result = run_decoder(frames, fps, adaptive=adaptive)
+        print_report(label, result, evaluate(result['emissions'], appearances, fps))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,9 +3,283 @@ import os
 import shutil
 from datetime import datetime
 import sys
+import threading
+import time
+import re
+import socket
+
+# أطوال الباركود القياسية (EAN-8 / UPC-A / EAN-13) التي تحتوي على رقم تحقق
+GTIN_LENGTHS = (8, 12, 13)
+
+def gtin_check_digit_valid(digits):
+    """Validate the trailing check digit of an EAN-8/UPC-A/EAN-13 code"""
+    if not digits.isdigit() or len(digits) < 2:
+        return False
+    body, check = digits[:-1], int(digits[-1])
+    # الأوزان 3 و 1 بالتبادل بدءاً من أقرب رقم لرقم التحقق
+    total = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(body)))
+    return (10 - total % 10) % 10 == check
+
+def barcode_misread(code):
+    """True for an EAN-8/UPC-A/EAN-13 length code whose check digit is wrong"""
+    code = str(code).strip()
+    return code.isdigit() and len(code) in GTIN_LENGTHS and not gtin_check_digit_valid(code)
+
+def normalize_barcode(code):
+    """Return the canonical lookup key of a product code
+
+    Numeric codes lose their leading zeros so that the EAN-13, UPC-A and
+    stripped variants a scanner may send all map to the same key. Other
+    codes are only trimmed.
+    """
+    if code is None:
+        return None
+    code = str(code).strip()
+    if code.isdigit():
+        return code.lstrip('0') or '0'
+    return code
+
+# توحيد كتابة الحروف العربية في البحث: أشكال الألف والهمزة والتاء المربوطة
+# والألف المقصورة، وحذف التشكيل والتطويل
+ARABIC_NORMALIZATION = (
+    ('أ', 'ا'), ('إ', 'ا'), ('آ', 'ا'), ('ٱ', 'ا'),
+    ('ؤ', 'و'), ('ئ', 'ي'), ('ى', 'ي'), ('ة', 'ه'),
+    ('\u0640', ''),  # التطويل
+) + tuple((chr(mark), '') for mark in range(0x064B, 0x0653)) + (('\u0670', ''),)
+
+def normalize_arabic(text):
+    """Normalize Arabic spelling variants and strip diacritics for search"""
+    text = str(text or '')
+    for source, target in ARABIC_NORMALIZATION:
+        text = text.replace(source, target)
+    return text
+
+def normalize_arabic_sql(expression):
+    """The SQL equivalent of normalize_arabic, for triggers and fallbacks"""
+    for source, target in ARABIC_NORMALIZATION:
+        expression = f"replace({expression}, '{source}', '{target}')"
+    return expression
+
+class ProductCache:
+    """In-memory product catalog keyed by code for the scan path"""
+    COLUMNS = ('code', 'name', 'price', 'quantity', 'weight', 'sell_by',
+               'safe_limit', 'purchase_price', 'price_type')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.products = {}
+        self.hits = 0
+        self.misses = 0
+        self.loaded = False
+        self.lock = threading.RLock()
+
+    def _select(self, where=""):
+        return f"SELECT {', '.join(self.COLUMNS)} FROM products {where}"
+
+    def reload(self):
+        """Load (or force reload) the whole catalog from the database"""
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(self._select())
+            products = {str(row[0]): row for row in cursor.fetchall()}
+            with self.lock:
+                self.products = products
+                self.loaded = True
+            print(f"تم تحميل {len(products)} منتج في الذاكرة المؤقتة")
+            return True
+        except Exception as e:
+            print(f"Error loading product cache: {e}")
+            return False
+
+    def get(self, code):
+        """Return the cached product row for code, falling back to the database on a miss"""
+        code = str(code)
+        with self.lock:
+            product = self.products.get(code)
+            if product is not None:
+                self.hits += 1
+                return product
+            self.misses += 1
+        # المنتج غير موجود في الذاكرة، ربما أضيف من جهاز آخر
+        try:
+            cursor = self.conn.cursor()
+            cursor.execute(self._select("WHERE code = ?"), (code,))
+            product = cursor.fetchone()
+            if product:
+                with self.lock:
+                    self.products[code] = product
+            return product
+        except Exception as e:
+            print(f"Error reading product {code} for cache: {e}")
+            return None
+
+    def get_any(self, codes):
+        """Return the cached product of the first matching code, with one database read on a miss"""
+        codes = list(dict.fromkeys(str(code) for code in codes))
+        with self.lock:
+            for code in codes:
+                product = self.products.get(code)
+                if product is not None:
+                    self.hits += 1
+                    return product
+            self.misses += 1
+        try:
+            cursor = self.conn.cursor()
+            placeholders = ", ".join("?" for _ in codes)
+            cursor.execute(self._select(f"WHERE code IN ({placeholders})"), codes)
+            rows = {str(row[0]): row for row in cursor.fetchall()}
+            with self.lock:
+                self.products.update(rows)
+            return next((rows[code] for code in codes if code in rows), None)
+        except Exception as e:
+            print(f"Error reading products {codes} for cache: {e}")
+            return None
+
+    def refresh(self, codes):
+        """Re-read the given product codes so the cache matches the database"""
+        codes = [str(code) for code in codes]
+        if not codes:
+            return
+        try:
+            cursor = self.conn.cursor()
+            placeholders = ", ".join("?" for _ in codes)
+            cursor.execute(self._select(f"WHERE code IN ({placeholders})"), codes)
+            rows = {str(row[0]): row for row in cursor.fetchall()}
+            with self.lock:
+                for code in codes:
+                    if code in rows:
+                        self.products[code] = rows[code]
+                    else:
+                        self.products.pop(code, None)
+        except Exception as e:
+            print(f"Error refreshing product cache: {e}")
+            # في حالة الخطأ نحذف المنتجات حتى تقرأ من قاعدة البيانات مرة أخرى
+            with self.lock:
+                for code in codes:
+                    self.products.pop(code, None)
+
+    def stats(self):
+        """Return hit/miss counters and catalog size"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.products),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0
+            }
+
+class ScaleBarcodeDecoder:
+    """Decode variable-measure EAN-13 labels printed by store scales
+
+    Prefixes 20-29 are reserved for in-store codes. Each prefix has a
+    13-character layout mask: F prefix, I item code (PLU), W weight in
+    grams, P price in the smallest currency unit, X an ignored digit (such
+    as a price check digit) and C the EAN check digit. Layouts come from
+    the constructor or the POS_SCALE_LABELS environment variable, e.g.
+    "20-27=FFIIIIIWWWWWC,28-29=FFIIIIIPPPPPC".
+    """
+    DEFAULT_LAYOUTS = "20-29=FFIIIIIWWWWWC"
+    PRICE_DECIMALS = 2
+
+    def __init__(self, layouts=None, price_decimals=None):
+        spec = layouts or os.environ.get('POS_SCALE_LABELS') or self.DEFAULT_LAYOUTS
+        self.price_decimals = self.PRICE_DECIMALS if price_decimals is None else price_decimals
+        self.layouts = {}   # البادئة -> (النوع، موضع الصنف، موضع القيمة)
+        for part in spec.split(','):
+            if not part.strip():
+                continue
+            try:
+                prefixes, mask = part.split('=')
+                first, _, last = prefixes.strip().partition('-')
+                layout = self.parse_mask(mask.strip())
+                for prefix in range(int(first), int(last or first) + 1):
+                    if not 20 <= prefix <= 29:
+                        raise ValueError(f"البادئة {prefix} خارج المدى 20-29")
+                    self.layouts[str(prefix)] = layout
+            except ValueError as e:
+                print(f"Invalid scale label layout '{part}': {e}")
+
+    @staticmethod
+    def parse_mask(mask):
+        if len(mask) != 13 or not mask.startswith('FF') or not mask.endswith('C'):
+            raise ValueError("يجب أن يكون 13 خانة تبدأ بـ FF وتنتهي بـ C")
+        kinds = [kind for kind, letter in (('weight', 'W'), ('price', 'P')) if letter in mask]
+        if len(kinds) != 1 or 'I' not in mask:
+            raise ValueError("يجب أن يحتوي على I وعلى W أو P")
+        letter = 'W' if kinds[0] == 'weight' else 'P'
+        item = slice(mask.index('I'), mask.rindex('I') + 1)
+        value = slice(mask.index(letter), mask.rindex(letter) + 1)
+        if set(mask[item]) != {'I'} or set(mask[value]) != {letter}:
+            raise ValueError("خانات الصنف والقيمة يجب أن تكون متتالية")
+        return kinds[0], item, value
+
+    def decode(self, code):
+        """Return {'plu', 'kind', 'value'} for a scale label, or None
+
+        value is the weight in kilograms or the price in currency units.
+        """
+        code = str(code).strip()
+        if len(code) != 13 or not code.isdigit():
+            return None
+        layout = self.layouts.get(code[:2])
+        if layout is None or not gtin_check_digit_valid(code):
+            return None
+        kind, item, value = layout
+        raw = int(code[value])
+        measure = raw / 1000 if kind == 'weight' else raw / 10 ** self.price_decimals
+        return {'plu': code[item], 'kind': kind, 'value': measure}
+
+class InvoiceIdAllocator:
+    """توليد أرقام الفواتير بدون تكرار بين الأجهزة
+
+    الرقم بالشكل INV-<الوقت>-<الجهاز>-<التسلسل>، فيترتب حسب الوقت ولا
+    يتكرر حتى لو تمت عمليتا بيع في نفس الثانية على جهاز واحد أو جهازين.
+    التسلسل يُحجز من جدول invoice_sequences على دفعات (BLOCK_SIZE) فلا
+    يحتاج كل بيع لعملية كتابة إضافية في قاعدة البيانات. الأرقام غير
+    المستخدمة من الدفعة عند إغلاق البرنامج تُترك كفجوات.
+    """
+    BLOCK_SIZE = 50
+
+    def __init__(self, database, terminal=None, block_size=None):
+        self.database = database
+        # اسم الجهاز من متغير البيئة POS_TERMINAL_ID أو اسم الكمبيوتر
+        terminal = terminal or os.environ.get('POS_TERMINAL_ID') or socket.gethostname()
+        self.terminal = re.sub(r'[^A-Za-z0-9]', '', terminal).upper()[:12] or 'POS'
+        self.block_size = block_size or self.BLOCK_SIZE
+        self.next_value = 0
+        self.end_value = 0
+        self.lock = threading.Lock()
+
+    def next_id(self, moment=None):
+        """رقم الفاتورة التالي، بوقت البيع moment (datetime) أو الوقت الحالي"""
+        with self.lock:
+            if self.next_value >= self.end_value:
+                start = self.database.reserve_invoice_numbers(self.terminal, self.block_size)
+                if start is None:
+                    raise sqlite3.OperationalError("تعذر حجز أرقام فواتير جديدة")
+                self.next_value = start
+                self.end_value = start + self.block_size
+            value = self.next_value
+            self.next_value += 1
+        return f"INV-{(moment or datetime.now()).strftime('%Y%m%d%H%M%S')}-{self.terminal}-{value:06d}"
 
 class Database:
-    def __init__(self):
+    # إعدادات الاتصال بقاعدة البيانات (يمكن تعديلها حسب جهاز الكاشير)
+    # WAL يسمح للتقارير بالقراءة أثناء حفظ الفواتير دون أن يوقف أحدهما الآخر
+    CONNECTION_PROFILE = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,           # مللي ثانية
+        'cache_size': -16000,           # بالكيلوبايت عند القيمة السالبة (~16 ميجابايت)
+        'mmap_size': 64 * 1024 * 1024,  # بايت
+        'temp_store': 'MEMORY',
+    }
+
+    def __init__(self, profile=None, db_path=None):
+        self.profile = dict(self.CONNECTION_PROFILE)
+        if profile:
+            self.profile.update(profile)
         try:
             # تحديد المسار المطلق لقاعدة البيانات
             if getattr(sys, 'frozen', False):
@@ -15,8 +289,10 @@ class Database:
                 # إذا كان التطبيق يعمل من الكود المصدري
                 application_path = os.path.dirname(os.path.abspath(__file__))
             
-            db_path = os.path.join(application_path, 'sales_inventory.db')
-            backup_dir = os.path.join(application_path, 'backups')
+            if db_path is None:
+                db_path = os.path.join(application_path, 'sales_inventory.db')
+            self.db_path = db_path
+            backup_dir = os.path.join(os.path.dirname(os.path.abspath(db_path)), 'backups')
             
             # إنشاء مجلد النسخ الاحتياطية إذا لم يكن موجوداً
             if not os.path.exists(backup_dir):
@@ -37,16 +313,10 @@ class Database:
             
             # محاولة الاتصال بقاعدة البيانات
             print("محاولة الاتصال بقاعدة البيانات...")
-            self.conn = sqlite3.connect(db_path)
+            self.conn = self.connect(db_path)
             self.cursor = self.conn.cursor()
             print("تم الاتصال بقاعدة البيانات بنجاح")
             
-            # تفعيل دعم المفاتيح الخارجية
-            self.cursor.execute("PRAGMA foreign_keys = ON")
-            
-            # تعيين الترميز
-            self.conn.execute("PRAGMA encoding = 'UTF-8'")
-            
             # التحقق من الجداول الموجودة
             self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
             tables = self.cursor.fetchall()
@@ -54,6 +324,16 @@ class Database:
             
             self.create_tables()
             
+            # تحميل كتالوج المنتجات في الذاكرة لتسريع المسح الضوئي
+            self.product_cache = ProductCache(self.conn)
+            self.product_cache.reload()
+            
+            # أرقام الفواتير تُحجز على دفعات من جدول invoice_sequences
+            self.invoice_ids = InvoiceIdAllocator(self)
+
+            # ملصقات الميزان (باركود يبدأ بـ 20-29 يحتوي على الوزن أو السعر)
+            self.scale_barcodes = ScaleBarcodeDecoder()
+            
         except sqlite3.Error as e:
             print(f"خطأ في الاتصال بقاعدة البيانات: {str(e)}")
             print("يرجى التأكد من:")
@@ -71,6 +351,45 @@ class Database:
             print(f"نوع الخطأ: {type(e).__name__}")
             sys.exit(1)
 
+    def connect(self, db_path):
+        """فتح اتصال جديد بقاعدة البيانات وتطبيق إعدادات الاتصال عليه"""
+        conn = sqlite3.connect(db_path, timeout=self.profile['busy_timeout'] / 1000)
+        self.apply_connection_profile(conn)
+        return conn
+
+    def apply_connection_profile(self, conn):
+        """تطبيق إعدادات الأداء (PRAGMA) على اتصال مفتوح"""
+        profile = self.profile
+        # تعيين الترميز (يؤثر فقط على قاعدة بيانات جديدة)
+        conn.execute("PRAGMA encoding = 'UTF-8'")
+        # تفعيل دعم المفاتيح الخارجية
+        conn.execute("PRAGMA foreign_keys = ON")
+        journal_mode = conn.execute(f"PRAGMA journal_mode = {profile['journal_mode']}").fetchone()[0]
+        if journal_mode.upper() != str(profile['journal_mode']).upper():
+            print(f"تحذير: لم يتم تفعيل وضع {profile['journal_mode']}، الوضع الحالي: {journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {profile['synchronous']}")
+        conn.execute(f"PRAGMA busy_timeout = {int(profile['busy_timeout'])}")
+        conn.execute(f"PRAGMA cache_size = {int(profile['cache_size'])}")
+        conn.execute(f"PRAGMA mmap_size = {int(profile['mmap_size'])}")
+        conn.execute(f"PRAGMA temp_store = {profile['temp_store']}")
+        return conn
+
+    def open_reader(self):
+        """فتح اتصال قراءة فقط منفصل بنفس الإعدادات (لاستخدامه من خيط آخر)
+
+        الكائن الناتج يدعم نفس دوال الاستعلام في Database لكنه لا ينشئ نسخة
+        احتياطية ولا يعدل هيكل الجداول.
+        """
+        reader = Database.__new__(Database)
+        reader.profile = self.profile
+        reader.db_path = self.db_path
+        reader.product_cache = self.product_cache
+        reader.product_search_fts = self.product_search_fts
+        reader.conn = reader.connect(self.db_path)
+        reader.conn.execute("PRAGMA query_only = ON")
+        reader.cursor = reader.conn.cursor()
+        return reader
+
     def backup_database(self, db_path):
         """إنشاء نسخة احتياطية من قاعدة البيانات"""
         try:
@@ -84,8 +403,15 @@ class Database:
                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                 backup_path = os.path.join(backup_dir, f'sales_inventory_{timestamp}.db')
                 
-                # نسخ قاعدة البيانات
-                shutil.copy2(db_path, backup_path)
+                # نسخ قاعدة البيانات عبر واجهة النسخ في SQLite حتى تشمل
+                # التغييرات الموجودة في ملف WAL ولم تُدمج بعد في الملف الرئيسي
+                source = sqlite3.connect(db_path)
+                target = sqlite3.connect(backup_path)
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                    source.close()
                 print(f"تم إنشاء نسخة احتياطية في: {backup_path}")
                 
                 # الاحتفاظ فقط بآخر 5 نسخ احتياطية
@@ -102,7 +428,7 @@ class Database:
         try:
             if not backup_path:
                 # البحث عن أحدث نسخة احتياطية
-                backup_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backups')
+                backup_dir = os.path.join(os.path.dirname(os.path.abspath(self.db_path)), 'backups')
                 if not os.path.exists(backup_dir):
                     print("لم يتم العثور على مجلد النسخ الاحتياطية")
                     return False
@@ -114,17 +440,23 @@ class Database:
                 
                 backup_path = os.path.join(backup_dir, backups[-1])
             
-            # إغلاق الاتصال الحالي
-            if self.conn:
-                self.conn.close()
-            
-            # نسخ النسخة الاحتياطية إلى قاعدة البيانات الحالية
-            db_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sales_inventory.db')
-            shutil.copy2(backup_path, db_path)
+            # نسخ النسخة الاحتياطية فوق قاعدة البيانات الحالية عبر واجهة النسخ في
+            # SQLite بدلاً من استبدال الملف: تتم تحت أقفال SQLite فلا تُحذف ملفات
+            # WAL من تحت اتصالات القراءة المفتوحة (open_reader) وتبقى صالحة وترى
+            # البيانات المستعادة في استعلامها التالي
+            self.conn.commit()
+            source = sqlite3.connect(backup_path)
+            try:
+                source.backup(self.conn)
+            finally:
+                source.close()
+            # دمج ملف WAL في الملف الرئيسي حتى يكون الملف على القرص هو النسخة المستعادة
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
             
-            # إعادة الاتصال بقاعدة البيانات
-            self.conn = sqlite3.connect(db_path)
-            self.cursor = self.conn.cursor()
+            # النسخة المستعادة قد تكون أقدم من الجداول والفهارس الحالية
+            self.create_tables()
+            # نفس الذاكرة المؤقتة مشتركة مع اتصالات القراءة فتُحدث ولا تُستبدل
+            self.product_cache.reload()
             
             print(f"تم استعادة قاعدة البيانات من: {backup_path}")
             return True
@@ -176,6 +508,7 @@ class Database:
             total REAL NOT NULL,
             discount REAL DEFAULT 0,
             net_total REAL NOT NULL,
+            sale_day TEXT,
             created_at TEXT DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (cashier_username) REFERENCES users (username)
         )
@@ -187,10 +520,12 @@ class Database:
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             invoice_id TEXT NOT NULL,
             product_code TEXT NOT NULL,
+            product_name TEXT,
             price REAL NOT NULL,
             quantity REAL,
             weight REAL,
             total_price REAL NOT NULL,
+            unit_cost REAL,
             created_at TEXT DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (invoice_id) REFERENCES invoices (invoice_id),
             FOREIGN KEY (product_code) REFERENCES products (code)
@@ -228,7 +563,31 @@ class Database:
         )
         """)
         
+        # تسلسل أرقام الفواتير لكل جهاز كاشير
+        self.cursor.execute("""
+        CREATE TABLE IF NOT EXISTS invoice_sequences (
+            terminal TEXT PRIMARY KEY,
+            next_value INTEGER NOT NULL DEFAULT 1
+        )
+        """)
+        
+        # أجهزة المسح المستخدمة (كاميرا الماسح تحفظ بالشكل camera:<رقم>)
+        self.cursor.execute("""
+        CREATE TABLE IF NOT EXISTS scanner_config (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_path TEXT,
+            is_active BOOLEAN DEFAULT 1,
+            vendor_id TEXT,
+            product_id TEXT,
+            last_used TEXT
+        )
+        """)
+        
         self.update_user_table_structure()
+        self.update_products_table_structure()
+        self.update_invoices_table_structure()
+        self.update_sales_rollup_structure()
+        self.update_product_search_structure()
         
         # إضافة مستخدم admin افتراضي إذا لم يكن موجوداً
         self.cursor.execute("SELECT COUNT(*) FROM users WHERE username = 'admin'")
@@ -281,19 +640,310 @@ class Database:
             self.conn.rollback()
             return False
 
+    def update_products_table_structure(self):
+        """إضافة عمود مفتاح الباركود الموحد وتعبئته للمنتجات الحالية"""
+        try:
+            self.cursor.execute("PRAGMA table_info(products)")
+            columns = [column[1] for column in self.cursor.fetchall()]
+            
+            if 'barcode_key' not in columns:
+                print("إضافة عمود barcode_key إلى جدول المنتجات...")
+                self.cursor.execute("ALTER TABLE products ADD COLUMN barcode_key TEXT")
+            
+            # تعبئة المفتاح الموحد للمنتجات التي لا تحتوي عليه (مرة واحدة)
+            self.cursor.execute("SELECT code FROM products WHERE barcode_key IS NULL ORDER BY code")
+            missing = [row[0] for row in self.cursor.fetchall()]
+            if missing:
+                self.cursor.execute("SELECT barcode_key FROM products WHERE barcode_key IS NOT NULL")
+                used_keys = {row[0] for row in self.cursor.fetchall()}
+                updates = []
+                for code in missing:
+                    key = normalize_barcode(code)
+                    if key in used_keys:
+                        # منتجان بنفس الكود بعد حذف الأصفار، يبقى الثاني بالبحث المباشر فقط
+                        print(f"تحذير: الكود {code} يتعارض مع منتج آخر بعد التوحيد ({key})")
+                        continue
+                    used_keys.add(key)
+                    updates.append((key, code))
+                self.cursor.executemany("UPDATE products SET barcode_key = ? WHERE code = ?", updates)
+                print(f"تم توحيد باركود {len(updates)} منتج")
+            
+            self.cursor.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_products_barcode_key
+                ON products (barcode_key)
+            """)
+            self.conn.commit()
+            return True
+        except Exception as e:
+            print(f"خطأ في تحديث هيكل جدول المنتجات: {str(e)}")
+            self.conn.rollback()
+            return False
+
+    def update_invoices_table_structure(self):
+        """إضافة عمود يوم البيع وفهارس تقارير الفواتير"""
+        try:
+            self.cursor.execute("PRAGMA table_info(invoices)")
+            columns = [column[1] for column in self.cursor.fetchall()]
+            
+            # عمود sale_day (YYYY-MM-DD) يسمح باستخدام فهرس في تقارير الفترات
+            # بدلاً من date(substr(date, 1, 10)) الذي يتطلب قراءة كل الفواتير
+            if 'sale_day' not in columns:
+                print("إضافة عمود sale_day إلى جدول الفواتير...")
+                self.cursor.execute("ALTER TABLE invoices ADD COLUMN sale_day TEXT")
+            
+            self.cursor.execute("UPDATE invoices SET sale_day = substr(date, 1, 10) WHERE sale_day IS NULL")
+            
+            # اسم المنتج يُحفظ مع عنصر الفاتورة
+            cost_snapshot_added = False
+            self.cursor.execute("PRAGMA table_info(invoice_items)")
+            item_columns = [column[1] for column in self.cursor.fetchall()]
+            if 'product_name' not in item_columns:
+                print("إضافة عمود product_name إلى جدول عناصر الفواتير...")
+                self.cursor.execute("ALTER TABLE invoice_items ADD COLUMN product_name TEXT")
+            
+            # تكلفة الوحدة وقت البيع، حتى لا يتغير ربح الفواتير القديمة عند تعديل سعر الشراء
+            if 'unit_cost' not in item_columns:
+                print("إضافة عمود unit_cost إلى جدول عناصر الفواتير...")
+                self.cursor.execute("ALTER TABLE invoice_items ADD COLUMN unit_cost REAL")
+                # تعبئة الفواتير السابقة بسعر الشراء الحالي (مرة واحدة فقط)
+                self.cursor.execute("""
+                    UPDATE invoice_items
+                    SET unit_cost = (SELECT purchase_price FROM products WHERE code = invoice_items.product_code)
+                """)
+                cost_snapshot_added = True
+            
+            # أي إضافة أو تعديل للفاتورة بدون sale_day يتم تعبئته تلقائياً
+            self.cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_invoices_sale_day_insert
+                AFTER INSERT ON invoices
+                WHEN NEW.sale_day IS NULL
+                BEGIN
+                    UPDATE invoices SET sale_day = substr(NEW.date, 1, 10)
+                    WHERE invoice_id = NEW.invoice_id;
+                END
+            """)
+            self.cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_invoices_sale_day_update
+                AFTER UPDATE OF date ON invoices
+                BEGIN
+                    UPDATE invoices SET sale_day = substr(NEW.date, 1, 10)
+                    WHERE invoice_id = NEW.invoice_id;
+                END
+            """)
+            
+            # الفهرس يخدم فلترة الفترة وترتيب صفحات تقرير المبيعات (sale_day, date, invoice_id)
+            self.cursor.execute("DROP INDEX IF EXISTS idx_invoices_sale_day")
+            self.cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_invoices_sale_day_date ON invoices (sale_day, date, invoice_id)"
+            )
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice_id ON invoice_items (invoice_id)")
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_invoice_items_product_code ON invoice_items (product_code)")
+            self.conn.commit()
+            
+            # ملخص المبيعات الحالي محسوب بسعر الشراء الحالي، يعاد بناؤه من التكلفة المحفوظة
+            self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='daily_product_sales'")
+            if cost_snapshot_added and self.cursor.fetchone():
+                self.rebuild_sales_rollup()
+            return True
+        except Exception as e:
+            print(f"خطأ في تحديث هيكل جدول الفواتير: {str(e)}")
+            self.conn.rollback()
+            return False
+
+    # تكلفة سطر الفاتورة: سعر الشراء وقت البيع × الكمية (أو الوزن للمنتجات الموزونة)
+    ITEM_COST = "ii.unit_cost * (CASE WHEN ii.quantity > 0 THEN ii.quantity ELSE COALESCE(ii.weight, 0) END)"
+
+    # تجميع مبيعات كل منتج في كل يوم (يستخدم في تقارير الفترات الطويلة)
+    ROLLUP_SELECT = f"""
+        SELECT 
+            i.sale_day,
+            ii.product_code,
+            COALESCE(SUM(ii.quantity), 0),
+            COALESCE(SUM(ii.weight), 0),
+            COALESCE(SUM(ii.total_price), 0),
+            COALESCE(SUM(
+                CASE WHEN ii.unit_cost > 0 THEN {ITEM_COST} ELSE 0 END
+            ), 0),
+            COALESCE(SUM(
+                CASE 
+                    WHEN ii.unit_cost > 0 
+                    THEN (ii.total_price - {ITEM_COST})
+                    ELSE 0 
+                END
+            ), 0),
+            COUNT(DISTINCT ii.invoice_id)
+        FROM invoice_items ii
+        JOIN invoices i ON ii.invoice_id = i.invoice_id
+        WHERE {{where}}
+        GROUP BY i.sale_day, ii.product_code
+    """
+
+    def update_product_search_structure(self):
+        """إنشاء فهرس FTS5 لأسماء المنتجات بعد توحيد الكتابة العربية"""
+        self.product_search_fts = False
+        try:
+            self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='products_fts'")
+            exists = self.cursor.fetchone() is not None
+            
+            # الاسم مخزن بعد التوحيد؛ code يستخدم لربط السجل بالمنتج لأن rowid
+            # جدول المنتجات قد يتغير بعد VACUUM
+            self.cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                code, name, tokenize = 'unicode61', prefix = '1 2 3'
+            )
+            """)
+            
+            new_name = normalize_arabic_sql("new.name")
+            delete_old = """
+                DELETE FROM products_fts WHERE rowid IN (
+                    SELECT rowid FROM products_fts
+                    WHERE products_fts MATCH 'code : "' || replace(old.code, '"', '""') || '"'
+                      AND code = old.code
+                );
+            """
+            self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_products_fts_insert
+            AFTER INSERT ON products
+            BEGIN
+                INSERT INTO products_fts (code, name) VALUES (new.code, {new_name});
+            END
+            """)
+            self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_products_fts_update
+            AFTER UPDATE OF code, name ON products
+            BEGIN
+                {delete_old}
+                INSERT INTO products_fts (code, name) VALUES (new.code, {new_name});
+            END
+            """)
+            self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_products_fts_delete
+            AFTER DELETE ON products
+            BEGIN
+                {delete_old}
+            END
+            """)
+            self.conn.commit()
+            self.product_search_fts = True
+            
+            if not exists:
+                print("إنشاء فهرس البحث في أسماء المنتجات...")
+                self.rebuild_product_search()
+            return True
+        except sqlite3.OperationalError as e:
+            # نسخة SQLite بدون FTS5: البحث يعمل بدون فهرس
+            print(f"فهرس البحث FTS5 غير متاح: {str(e)}")
+            self.conn.rollback()
+            return False
+
+    def rebuild_product_search(self):
+        """إعادة بناء فهرس البحث في أسماء المنتجات بالكامل"""
+        try:
+            self.cursor.execute("DELETE FROM products_fts")
+            self.cursor.execute(
+                f"INSERT INTO products_fts (code, name) SELECT code, {normalize_arabic_sql('name')} FROM products"
+            )
+            self.conn.commit()
+            return True
+        except Exception as e:
+            print(f"خطأ في بناء فهرس البحث: {str(e)}")
+            self.conn.rollback()
+            return False
+
+    def update_sales_rollup_structure(self):
+        """إنشاء جدول ملخص المبيعات اليومية وتعبئته من الفواتير السابقة"""
+        try:
+            self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='daily_product_sales'")
+            exists = self.cursor.fetchone() is not None
+            
+            self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS daily_product_sales (
+                sale_day TEXT NOT NULL,
+                product_code TEXT NOT NULL,
+                quantity REAL DEFAULT 0,
+                weight REAL DEFAULT 0,
+                revenue REAL DEFAULT 0,
+                cost REAL DEFAULT 0,
+                profit REAL DEFAULT 0,
+                invoice_count INTEGER DEFAULT 0,
+                PRIMARY KEY (sale_day, product_code)
+            ) WITHOUT ROWID
+            """)
+            self.conn.commit()
+            
+            if not exists:
+                print("إنشاء ملخص المبيعات اليومية من الفواتير السابقة...")
+                self.rebuild_sales_rollup()
+            return True
+        except Exception as e:
+            print(f"خطأ في إنشاء جدول ملخص المبيعات: {str(e)}")
+            self.conn.rollback()
+            return False
+
+    def rebuild_sales_rollup(self):
+        """إعادة بناء ملخص المبيعات اليومية بالكامل من عناصر الفواتير"""
+        try:
+            self.cursor.execute("DELETE FROM daily_product_sales")
+            self.cursor.execute(
+                "INSERT INTO daily_product_sales "
+                "(sale_day, product_code, quantity, weight, revenue, cost, profit, invoice_count) "
+                + self.ROLLUP_SELECT.format(where="ii.product_code IS NOT NULL")
+            )
+            self.conn.commit()
+            self.cursor.execute("SELECT COUNT(*) FROM daily_product_sales")
+            print(f"تم بناء ملخص المبيعات اليومية: {self.cursor.fetchone()[0]} سجل")
+            return True
+        except Exception as e:
+            print(f"خطأ في إعادة بناء ملخص المبيعات: {str(e)}")
+            self.conn.rollback()
+            return False
+
+    def add_invoice_to_sales_rollup(self, invoice_id):
+        """إضافة عناصر فاتورة إلى ملخص المبيعات اليومية (داخل معاملة الفاتورة بدون commit)"""
+        self.cursor.execute(
+            "INSERT INTO daily_product_sales "
+            "(sale_day, product_code, quantity, weight, revenue, cost, profit, invoice_count) "
+            + self.ROLLUP_SELECT.format(where="ii.invoice_id = ? AND ii.product_code IS NOT NULL")
+            + """
+            ON CONFLICT (sale_day, product_code) DO UPDATE SET
+                quantity = quantity + excluded.quantity,
+                weight = weight + excluded.weight,
+                revenue = revenue + excluded.revenue,
+                cost = cost + excluded.cost,
+                profit = profit + excluded.profit,
+                invoice_count = invoice_count + excluded.invoice_count
+            """,
+            (invoice_id,)
+        )
+
     # Product operations
     def add_product(self, code, name, price, purchase_price, quantity, weight=0, sell_by='quantity', price_type='السعر للقطعة', safe_limit=0):
-        """إضافة منتج جديد"""
+        """إضافة منتج جديد؛ يرجع (نجاح، رسالة)"""
         try:
+            code = str(code)
+            self.cursor.execute("SELECT code, name FROM products WHERE code = ?", (code,))
+            existing = self.cursor.fetchone()
+            if existing:
+                return False, f"الكود {code} مسجل بالفعل للمنتج: {existing[1]}"
+            # نفس الباركود بأصفار بادئة مختلفة يقرأه الماسح كمنتج واحد
+            key = normalize_barcode(code)
+            self.cursor.execute("SELECT code, name FROM products WHERE barcode_key = ?", (key,))
+            existing = self.cursor.fetchone()
+            if existing:
+                return False, (f"الكود {code} هو نفس باركود المنتج {existing[1]} ({existing[0]}) "
+                               f"بعد حذف الأصفار البادئة")
+
             self.cursor.execute('''INSERT INTO products 
-                               (code, name, price, purchase_price, quantity, weight, sell_by, price_type, safe_limit)
-                               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                              (code, name, price, purchase_price, quantity, weight, sell_by, price_type, safe_limit))
+                               (code, name, price, purchase_price, quantity, weight, sell_by, price_type, safe_limit, barcode_key)
+                               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                              (code, name, price, purchase_price, quantity, weight, sell_by, price_type, safe_limit, key))
             self.conn.commit()
-            return True
+            self.product_cache.refresh([code])
+            return True, "تمت إضافة المنتج بنجاح"
         except sqlite3.Error as e:
             print(f"خطأ في إضافة المنتج: {str(e)}")
-            return False
+            self.conn.rollback()
+            return False, f"خطأ في إضافة المنتج: {str(e)}"
 
     def get_product(self, code):
         """Get a product by its code"""
@@ -305,30 +955,81 @@ class Database:
             return None
 
     def get_product_by_barcode(self, barcode):
-        """Get a product using its barcode from scanner"""
+        """Get a product using its barcode from scanner
+
+        Any scanner variant of a code (with or without leading zeros) resolves
+        through the normalized barcode_key index in a single query. A code
+        with a wrong EAN/UPC check digit is a misread and returns None.
+        """
         try:
-            # First try exact match (primary method)
-            self.cursor.execute("SELECT * FROM products WHERE code = ?", (barcode,))
-            product = self.cursor.fetchone()
-            
-            # If product not found and barcode is numeric, try with leading zeros or without them
-            if not product and barcode.isdigit():
-                # Try adding leading zeros (some scanners might strip them)
-                padded_code = barcode.zfill(13)  # EAN-13 standard length
-                self.cursor.execute("SELECT * FROM products WHERE code = ?", (padded_code,))
-                product = self.cursor.fetchone()
-                
-                # If still not found, try removing leading zeros
-                if not product:
-                    stripped_code = barcode.lstrip('0')
-                    self.cursor.execute("SELECT * FROM products WHERE code = ?", (stripped_code,))
-                    product = self.cursor.fetchone()
-            
-            return product
+            barcode = str(barcode).strip()
+            if barcode_misread(barcode):
+                print(f"Rejected barcode {barcode}: invalid check digit")
+                return None
+            
+            self.cursor.execute('''SELECT * FROM products
+                                WHERE barcode_key = ? OR code = ?
+                                ORDER BY code = ? DESC
+                                LIMIT 1''',
+                                (normalize_barcode(barcode), barcode, barcode))
+            return self.cursor.fetchone()
         except Exception as e:
             print(f"Error getting product by barcode: {e}")
             return None
 
+    def get_scale_product(self, plu):
+        """Get the product of a scale label PLU, stored with or without leading zeros"""
+        product = self.product_cache.get_any((plu, normalize_barcode(plu)))
+        if product is None:
+            match = self.get_product_by_barcode(plu)
+            if match:
+                product = self.product_cache.get(match[0])
+        return product
+
+    def search_products(self, query, limit=50):
+        """Search products by name, names starting with the query first
+
+        Every word of the query must match the start of a word in the
+        product name, after the same Arabic normalization used for the
+        index. Returns (code, name, price, quantity, weight, sell_by) rows.
+        """
+        words = normalize_arabic(query).split()
+        if not words:
+            return []
+        try:
+            if not self.product_search_fts:
+                conditions = " AND ".join(f"{normalize_arabic_sql('name')} LIKE ?" for _ in words)
+                self.cursor.execute(f"""
+                    SELECT code, name, price, quantity, weight, sell_by
+                    FROM products
+                    WHERE {conditions}
+                    ORDER BY name
+                    LIMIT ?
+                """, [f"%{word}%" for word in words] + [limit])
+                return self.cursor.fetchall()
+
+            # الترتيب بـ bm25 يحسب درجة كل النتائج قبل LIMIT، وهذا بطيء مع الكلمات
+            # الشائعة؛ بدلاً منه نعرض أولاً الأسماء التي تبدأ بأول كلمة ثم الباقي
+            terms = " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+            results = []
+            seen = set()
+            for match in (f"name : (^{terms})", f"name : ({terms})"):
+                self.cursor.execute("""
+                    SELECT p.code, p.name, p.price, p.quantity, p.weight, p.sell_by
+                    FROM (SELECT code FROM products_fts WHERE products_fts MATCH ? LIMIT ?) f
+                    JOIN products p ON p.code = f.code
+                """, (match, limit + len(results)))
+                for row in self.cursor.fetchall():
+                    if row[0] not in seen and len(results) < limit:
+                        seen.add(row[0])
+                        results.append(row)
+                if len(results) >= limit:
+                    break
+            return results
+        except Exception as e:
+            print(f"Error searching products: {e}")
+            return []
+
     def get_all_products(self):
         """Get all products ordered by name"""
         try:
@@ -360,6 +1061,7 @@ class Database:
                                WHERE code = ?''',
                               (name, price, purchase_price, quantity, weight, sell_by, price_type, safe_limit, code))
             self.conn.commit()
+            self.product_cache.refresh([code])
             return True
         except sqlite3.Error as e:
             print(f"خطأ في تحديث المنتج: {str(e)}")
@@ -384,6 +1086,7 @@ class Database:
             self.cursor.execute("UPDATE products SET quantity = ? WHERE code = ?",
                               (new_qty, code))
             self.conn.commit()
+            self.product_cache.refresh([code])
             return True
         except Exception as e:
             print(f"Error updating product quantity: {e}")
@@ -392,38 +1095,123 @@ class Database:
 
     # Invoice operations
     def save_invoice(self, invoice_id, date, customer_id, total, discount, net_total, items, cashier_username=None):
-        """Save invoice and update product quantities in a transaction"""
+        """Save invoice and update product stock in a transaction"""
+        success, _ = self.commit_sale(invoice_id, date, customer_id, total, discount, net_total, items, cashier_username)
+        return success
+
+    def reserve_invoice_numbers(self, terminal, count):
+        """Reserve count invoice sequence numbers for a terminal, returns the first one"""
+        try:
+            self.cursor.execute("INSERT OR IGNORE INTO invoice_sequences (terminal, next_value) VALUES (?, 1)",
+                                (terminal,))
+            # UPDATE يحجز قفل الكتابة، فلا يحصل جهازان على نفس الدفعة
+            self.cursor.execute("UPDATE invoice_sequences SET next_value = next_value + ? WHERE terminal = ?",
+                                (count, terminal))
+            self.cursor.execute("SELECT next_value FROM invoice_sequences WHERE terminal = ?", (terminal,))
+            start = self.cursor.fetchone()[0] - count
+            self.conn.commit()
+            return start
+        except Exception as e:
+            print(f"Error reserving invoice numbers: {e}")
+            self.conn.rollback()
+            return None
+
+    def commit_sale(self, invoice_id, date, customer_id, total, discount, net_total, items, cashier_username=None):
+        """Write a complete sale (invoice, line items, stock) in one transaction
+
+        Line items are written with one executemany and stock is decremented
+        with one set-based UPDATE per distinct product code: quantity for
+        items sold by piece, weight for items sold by weight. The UPDATE only
+        matches rows with enough stock, so an oversold product rolls back the
+        whole sale. Everything is committed once.
+
+        When invoice_id is None a number is allocated here, stamped with the
+        sale date, so invoice numbers follow the order sales were completed.
+        It is reserved before the transaction starts because reserving a new
+        block commits on its own.
+
+        Returns (True, metrics) with timings in milliseconds and the
+        invoice_id used, or (False, error message).
+        """
+        start = time.perf_counter()
+        try:
+            if invoice_id is None:
+                try:
+                    moment = datetime.strptime(str(date)[:19], "%Y-%m-%d %H:%M:%S")
+                except ValueError:
+                    moment = None
+                invoice_id = self.invoice_ids.next_id(moment)
+        except Exception as e:
+            print(f"Error allocating invoice id: {e}")
+            return False, str(e)
         try:
             self.conn.execute("BEGIN TRANSACTION")
             
             # Save invoice
             self.cursor.execute('''INSERT INTO invoices 
-                                (invoice_id, date, customer_id, cashier_username, total, discount, net_total)
-                                VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                              (invoice_id, date, customer_id, cashier_username, total, discount, net_total))
-            
-            # Save invoice items and update quantities
+                                (invoice_id, date, sale_day, customer_id, cashier_username, total, discount, net_total)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                              (invoice_id, date, str(date)[:10], customer_id, cashier_username, total, discount, net_total))
+            
+            # Save invoice items with a snapshot of the product's purchase price
+            self.cursor.executemany('''INSERT INTO invoice_items 
+                                    (invoice_id, product_code, product_name, price, quantity, weight, total_price, unit_cost)
+                                    VALUES (?, ?, ?, ?, ?, ?, ?,
+                                            (SELECT purchase_price FROM products WHERE code = ?))''',
+                                  [(invoice_id, item['code'], item['name'], item['price'],
+                                    item.get('quantity') or 0, item.get('weight') or 0, item['total_price'],
+                                    item['code'])
+                                   for item in items])
+            self.add_invoice_to_sales_rollup(invoice_id)
+            inserted = time.perf_counter()
+            
+            # Total sold per product so repeated lines cost one UPDATE
+            quantities = {}
+            weights = {}
             for item in items:
-                # Get weight value if exists, otherwise use 0
-                weight = item.get('weight', 0)
-                
-                # Save invoice item
-                self.cursor.execute('''INSERT INTO invoice_items 
-                                    (invoice_id, product_code, product_name, price, quantity, weight, total_price)
-                                    VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                                  (invoice_id, item['code'], item['name'], 
-                                   item['price'], item['quantity'], weight, item['total_price']))
-                
-                # Update product quantity
-                if not self.update_product_quantity(item['code'], -item['quantity']):
-                    raise Exception(f"Failed to update quantity for product {item['code']}")
+                sell_by = item.get('sell_by')
+                quantity = item.get('quantity') or 0
+                weight = item.get('weight') or 0
+                if sell_by != 'weight' and quantity:
+                    quantities[item['code']] = quantities.get(item['code'], 0) + quantity
+                elif sell_by != 'quantity' and weight:
+                    weights[item['code']] = weights.get(item['code'], 0) + weight
+            
+            # Update stock; the WHERE clause keeps it from going negative
+            quantity_updates = [(amount, code, amount) for code, amount in quantities.items()]
+            if quantity_updates:
+                self.cursor.executemany('''UPDATE products SET quantity = quantity - ?
+                                        WHERE code = ? AND quantity >= ?''', quantity_updates)
+                if self.cursor.rowcount != len(quantity_updates):
+                    raise Exception("الكمية غير متوفرة في المخزون لأحد المنتجات")
+            
+            # الأوزان تقرب لثلاثة أرقام عشرية (جرام) لتجنب أخطاء جمع الكسور
+            weight_updates = [(round(amount, 3), code, round(amount, 3)) for code, amount in weights.items()]
+            if weight_updates:
+                self.cursor.executemany('''UPDATE products SET weight = ROUND(weight - ?, 3)
+                                        WHERE code = ? AND weight >= ?''', weight_updates)
+                if self.cursor.rowcount != len(weight_updates):
+                    raise Exception("الوزن غير متوفر في المخزون لأحد المنتجات")
+            updated = time.perf_counter()
             
             self.conn.commit()
-            return True
+            committed = time.perf_counter()
+            self.product_cache.refresh(set(quantities) | set(weights))
+            
+            metrics = {
+                'lines': len(items),
+                'products': len(set(quantities) | set(weights)),
+                'insert_ms': (inserted - start) * 1000,
+                'update_ms': (updated - inserted) * 1000,
+                'commit_ms': (committed - updated) * 1000,
+                'total_ms': (committed - start) * 1000,
+                'invoice_id': invoice_id
+            }
+            return True, metrics
         except Exception as e:
             print(f"Error saving invoice: {e}")
             self.conn.rollback()
-            return False
+            return False, str(e)
 
     def get_invoices_by_date(self, date):
         """Get invoices for a specific date"""
@@ -445,29 +1233,24 @@ class Database:
             print(f"Fetching invoices from DB between {start_date} and {end_date}")
             
             # أولاً نحسب إجمالي المبيعات والربح للفترة المحددة
+            # المبيعات من جدول الفواتير فقط حتى لا يتكرر صافي الفاتورة مع كل عنصر
             total_query = """
                 SELECT 
-                    COALESCE(SUM(i.net_total), 0) as total_sales,
-                    COALESCE(SUM(
-                        CASE 
-                            WHEN p.purchase_price > 0 
-                            THEN (ii.total_price - (p.purchase_price * ii.quantity))
-                            ELSE 0 
-                        END
-                    ), 0) as total_profit
-                FROM invoices i
-                LEFT JOIN invoice_items ii ON i.invoice_id = ii.invoice_id
-                LEFT JOIN products p ON ii.product_code = p.code
-                WHERE date(substr(i.date, 1, 10)) BETWEEN date(?) AND date(?)
+                    (SELECT COALESCE(SUM(net_total), 0)
+                     FROM invoices
+                     WHERE sale_day BETWEEN date(?) AND date(?)) as total_sales,
+                    (SELECT COALESCE(SUM(profit), 0)
+                     FROM daily_product_sales
+                     WHERE sale_day BETWEEN date(?) AND date(?)) as total_profit
             """
             
-            self.cursor.execute(total_query, (start_date, end_date))
+            self.cursor.execute(total_query, (start_date, end_date, start_date, end_date))
             total_result = self.cursor.fetchone()
             total_sales, total_profit = total_result if total_result else (0, 0)
             print(f"Total sales: {total_sales}, Total profit: {total_profit}")
             
             # ثم نجلب تفاصيل الفواتير
-            invoice_query = """
+            invoice_query = f"""
                 SELECT 
                     i.invoice_id,
                     i.date,
@@ -478,15 +1261,14 @@ class Database:
                     i.net_total,
                     COALESCE(SUM(
                         CASE 
-                            WHEN p.purchase_price > 0 
-                            THEN (ii.total_price - (p.purchase_price * ii.quantity))
+                            WHEN ii.unit_cost > 0 
+                            THEN (ii.total_price - {self.ITEM_COST})
                             ELSE 0 
                         END
                     ), 0) as invoice_profit
                 FROM invoices i
                 LEFT JOIN invoice_items ii ON i.invoice_id = ii.invoice_id
-                LEFT JOIN products p ON ii.product_code = p.code
-                WHERE date(substr(i.date, 1, 10)) BETWEEN date(?) AND date(?)
+                WHERE i.sale_day BETWEEN date(?) AND date(?)
                 GROUP BY i.invoice_id, i.date, i.customer_id, i.cashier_username, i.total, i.discount, i.net_total
                 ORDER BY i.date DESC
             """
@@ -508,6 +1290,74 @@ class Database:
             print(f"Error getting invoices by date range: {e}")
             return {'total_sales': 0, 'total_profit': 0, 'invoices': []}
 
+    def get_sales_summary(self, start_date, end_date):
+        """Get invoice count, total sales and total profit for a date range"""
+        try:
+            self.cursor.execute("""
+                SELECT 
+                    (SELECT COUNT(*)
+                     FROM invoices
+                     WHERE sale_day BETWEEN date(?) AND date(?)) as invoice_count,
+                    (SELECT COALESCE(SUM(net_total), 0)
+                     FROM invoices
+                     WHERE sale_day BETWEEN date(?) AND date(?)) as total_sales,
+                    (SELECT COALESCE(SUM(profit), 0)
+                     FROM daily_product_sales
+                     WHERE sale_day BETWEEN date(?) AND date(?)) as total_profit
+            """, (start_date, end_date) * 3)
+            invoice_count, total_sales, total_profit = self.cursor.fetchone()
+            return {
+                'invoice_count': invoice_count,
+                'total_sales': total_sales,
+                'total_profit': total_profit
+            }
+        except Exception as e:
+            print(f"Error getting sales summary: {e}")
+            return {'invoice_count': 0, 'total_sales': 0, 'total_profit': 0}
+
+    def get_invoices_page(self, start_date, end_date, after=None, limit=200):
+        """Get one page of invoices in a date range, newest first, with profit
+
+        Pages use keyset pagination: after is the (sale_day, date, invoice_id)
+        of the last row of the previous page, so every page is an index range
+        scan no matter how deep the user has scrolled.
+        """
+        try:
+            query = f"""
+                SELECT 
+                    i.invoice_id,
+                    i.date,
+                    i.customer_id,
+                    i.cashier_username,
+                    i.total,
+                    i.discount,
+                    i.net_total,
+                    (SELECT COALESCE(SUM(
+                        CASE 
+                            WHEN ii.unit_cost > 0 
+                            THEN (ii.total_price - {self.ITEM_COST})
+                            ELSE 0 
+                        END
+                     ), 0)
+                     FROM invoice_items ii
+                     WHERE ii.invoice_id = i.invoice_id) as invoice_profit,
+                    i.sale_day
+                FROM invoices i
+                WHERE i.sale_day BETWEEN date(?) AND date(?)
+            """
+            params = [start_date, end_date]
+            if after:
+                query += " AND (i.sale_day, i.date, i.invoice_id) < (?, ?, ?)"
+                params.extend(after)
+            query += " ORDER BY i.sale_day DESC, i.date DESC, i.invoice_id DESC LIMIT ?"
+            params.append(limit)
+            
+            self.cursor.execute(query, params)
+            return self.cursor.fetchall()
+        except Exception as e:
+            print(f"Error getting invoices page: {e}")
+            return []
+
     def get_invoice_items(self, invoice_id):
         """Get all items for a specific invoice"""
         try:
@@ -522,19 +1372,19 @@ class Database:
     def get_daily_sales(self, date):
         """Get sales details for a specific date with profit information"""
         try:
-            query = '''
+            query = f'''
                 SELECT 
                     i.invoice_id,
                     i.date,
-                    p.name,
+                    COALESCE(ii.product_name, p.name),
                     ii.quantity,
                     ii.weight,
                     ii.price,
                     ii.total_price,
-                    (ii.total_price - (p.purchase_price * ii.quantity)) as profit
+                    (ii.total_price - COALESCE({self.ITEM_COST}, 0)) as profit
                 FROM invoice_items ii
                 JOIN invoices i ON ii.invoice_id = i.invoice_id
-                JOIN products p ON ii.product_code = p.code
+                LEFT JOIN products p ON p.code = ii.product_code
                 WHERE i.date LIKE ?
                 ORDER BY i.date DESC
             '''
@@ -549,26 +1399,28 @@ class Database:
         """الحصول على المنتجات الأكثر مبيعاً مع تطبيق معايير التصفية"""
         try:
             query = """
-                WITH sales_data AS (
+                WITH item_sales AS (
+                    SELECT 
+                        product_code,
+                        SUM(quantity) as quantity_sold,
+                        SUM(weight) as weight_sold,
+                        SUM(revenue) as total_sales,
+                        SUM(profit) as total_profit
+                    FROM daily_product_sales
+                    WHERE sale_day BETWEEN date(?) AND date(?)
+                    GROUP BY product_code
+                ),
+                sales_data AS (
                     SELECT 
                         p.code as product_code,
                         p.name,
                         p.sell_by,
-                        COALESCE(SUM(ii.quantity), 0) as quantity_sold,
-                        COALESCE(SUM(ii.weight), 0) as weight_sold,
-                        COALESCE(SUM(ii.total_price), 0) as total_sales,
-                        COALESCE(SUM(
-                            CASE 
-                                WHEN p.purchase_price > 0 
-                                THEN (ii.total_price - (p.purchase_price * ii.quantity))
-                                ELSE 0 
-                            END
-                        ), 0) as total_profit
+                        COALESCE(s.quantity_sold, 0) as quantity_sold,
+                        COALESCE(s.weight_sold, 0) as weight_sold,
+                        COALESCE(s.total_sales, 0) as total_sales,
+                        COALESCE(s.total_profit, 0) as total_profit
                     FROM products p
-                    LEFT JOIN invoice_items ii ON p.code = ii.product_code
-                    LEFT JOIN invoices i ON ii.invoice_id = i.invoice_id 
-                        AND date(substr(i.date, 1, 10)) BETWEEN date(?) AND date(?)
-                    GROUP BY p.code, p.name, p.sell_by
+                    LEFT JOIN item_sales s ON s.product_code = p.code
                 )
                 SELECT *
                 FROM sales_data
@@ -590,27 +1442,30 @@ class Database:
         """الحصول على المنتجات الأقل مبيعاً حسب الشروط الجديدة"""
         try:
             query = """
-                WITH sales_data AS (
+                WITH item_sales AS (
+                    SELECT 
+                        product_code,
+                        SUM(quantity) as quantity_sold,
+                        SUM(weight) as weight_sold,
+                        SUM(revenue) as total_sales,
+                        SUM(profit) as total_profit,
+                        SUM(invoice_count) as sales_count
+                    FROM daily_product_sales
+                    WHERE sale_day BETWEEN date(?) AND date(?)
+                    GROUP BY product_code
+                ),
+                sales_data AS (
                     SELECT 
                         p.code as product_code,
                         p.name,
                         p.sell_by,
-                        COALESCE(SUM(ii.quantity), 0) as quantity_sold,
-                        COALESCE(SUM(ii.weight), 0) as weight_sold,
-                        COALESCE(SUM(ii.total_price), 0) as total_sales,
-                        COALESCE(SUM(
-                            CASE 
-                                WHEN p.purchase_price > 0 
-                                THEN (ii.total_price - (p.purchase_price * ii.quantity))
-                                ELSE 0 
-                            END
-                        ), 0) as total_profit,
-                        COUNT(DISTINCT i.invoice_id) as sales_count
+                        COALESCE(s.quantity_sold, 0) as quantity_sold,
+                        COALESCE(s.weight_sold, 0) as weight_sold,
+                        COALESCE(s.total_sales, 0) as total_sales,
+                        COALESCE(s.total_profit, 0) as total_profit,
+                        COALESCE(s.sales_count, 0) as sales_count
                     FROM products p
-                    LEFT JOIN invoice_items ii ON p.code = ii.product_code
-                    LEFT JOIN invoices i ON ii.invoice_id = i.invoice_id 
-                        AND date(substr(i.date, 1, 10)) BETWEEN date(?) AND date(?)
-                    GROUP BY p.code, p.name, p.sell_by
+                    LEFT JOIN item_sales s ON s.product_code = p.code
                 )
                 SELECT product_code, name, sell_by, quantity_sold, weight_sold, total_sales, total_profit, sales_count
                 FROM sales_data
@@ -628,6 +1483,19 @@ class Database:
             print(f"Error in get_low_selling_products: {str(e)}")
             return []
 
+    def get_stock_products(self):
+        """Get all products with stock columns for the stock report"""
+        try:
+            self.cursor.execute("""
+                SELECT code, name, price, purchase_price, quantity, weight, sell_by, price_type, safe_limit 
+                FROM products
+                ORDER BY name
+            """)
+            return self.cursor.fetchall()
+        except Exception as e:
+            print(f"Error getting stock products: {e}")
+            return []
+
     def get_low_stock_products(self, threshold=5):
         """Get products with low stock"""
         try:
@@ -671,17 +1539,34 @@ class Database:
             return False
     
     def get_active_scanner(self):
-        """Get the active scanner configuration"""
+        """Get the active scanner configuration (camera preferences excluded)"""
         try:
             self.cursor.execute('''SELECT device_path, vendor_id, product_id
                                 FROM scanner_config 
-                                WHERE is_active = 1
+                                WHERE is_active = 1 AND device_path NOT LIKE 'camera:%'
                                 ORDER BY last_used DESC
                                 LIMIT 1''')
             return self.cursor.fetchone()
         except Exception as e:
             print(f"Error getting active scanner: {e}")
             return None
+
+    def save_camera_preference(self, index):
+        """حفظ رقم آخر كاميرا عملت بنجاح (كسطر camera:N في scanner_config)"""
+        return self.save_scanner_config(f"camera:{index}")
+
+    def get_camera_preference(self):
+        """رقم آخر كاميرا عملت بنجاح أو None"""
+        try:
+            self.cursor.execute('''SELECT device_path FROM scanner_config
+                                WHERE device_path LIKE 'camera:%'
+                                ORDER BY last_used DESC
+                                LIMIT 1''')
+            row = self.cursor.fetchone()
+            return int(row[0].split(':', 1)[1]) if row else None
+        except Exception as e:
+            print(f"Error getting camera preference: {e}")
+            return None
     
     def get_all_scanners(self):
         """Get all configured scanners"""
@@ -706,7 +1591,7 @@ class Database:
                 FROM invoice_items ii
                 JOIN invoices i ON ii.invoice_id = i.invoice_id
                 JOIN products p ON ii.product_code = p.code
-                WHERE substr(i.date, 1, 10) >= ? AND substr(i.date, 1, 10) <= ?
+                WHERE i.sale_day >= ? AND i.sale_day <= ?
                 GROUP BY ii.product_code
                 ORDER BY total_sold DESC
                 LIMIT ?
@@ -720,7 +1605,7 @@ class Database:
     def get_low_demand_products(self, start_date, end_date, threshold=5, limit=50):
         """Get products with low demand within a date range with profit information"""
         try:
-            query = """
+            query = f"""
                 SELECT 
                     p.code, 
                     p.name,
@@ -729,10 +1614,10 @@ class Database:
                     MAX(i.date) as last_sale_date,
                     p.weight,
                     COALESCE(SUM(ii.total_price), 0) as total_sales,
-                    COALESCE(SUM(ii.total_price - (p.purchase_price * ii.quantity)), 0) as total_profit
+                    COALESCE(SUM(ii.total_price - COALESCE({self.ITEM_COST}, 0)), 0) as total_profit
                 FROM products p
                 LEFT JOIN invoice_items ii ON p.code = ii.product_code
-                LEFT JOIN invoices i ON ii.invoice_id = i.invoice_id AND substr(i.date, 1, 10) >= ? AND substr(i.date, 1, 10) <= ?
+                LEFT JOIN invoices i ON ii.invoice_id = i.invoice_id AND i.sale_day >= ? AND i.sale_day <= ?
                 GROUP BY p.code
                 HAVING total_sold < ? OR total_sold IS NULL
                 ORDER BY total_sold ASC, last_sale_date ASC
@@ -786,6 +1671,17 @@ class Database:
             foreign_keys = self.cursor.fetchone()[0]
             print(f"✅ دعم المفاتيح الخارجية: {'مفعل' if foreign_keys else 'معطل'}")
             
+            # التحقق من إعدادات الاتصال
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size', 'temp_store'):
+                self.cursor.execute(f"PRAGMA {pragma}")
+                row = self.cursor.fetchone()
+                print(f"✅ {pragma}: {row[0] if row else '-'}")
+            
+            # إحصائيات الذاكرة المؤقتة للمنتجات
+            cache_stats = self.product_cache.stats()
+            print(f"✅ ذاكرة المنتجات: {cache_stats['size']} منتج "
+                  f"(إصابات: {cache_stats['hits']}, إخفاقات: {cache_stats['misses']})")
+            
             print("========================\n")
             return True
             
@@ -1168,6 +2064,17 @@ class Database:
         return datetime.now().strftime("%H:%M:%S")
 
 # Global database instance
-db = Database()
-# التحقق من حالة قاعدة البيانات عند بدء التشغيل
-db.check_database_status()
\ No newline at end of file
+# تنشأ عند أول استخدام (from database import db) وليس عند استيراد الوحدة،
+# فالأدوات التي تستخدم Database فقط (مثل benchmark_reports) لا تفتح قاعدة
+# البيانات الحقيقية ولا تنسخها احتياطياً ولا تعدل هيكلها
+_db = None
+
+def __getattr__(name):
+    global _db
+    if name == 'db':
+        if _db is None:
+            _db = Database()
+            # التحقق من حالة قاعدة البيانات عند بدء التشغيل
+            _db.check_database_status()
+        return _db
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,218 @@
+from PyQt5.QtCore import Qt, QObject, QThread, pyqtSignal, pyqtSlot
+from PyQt5.QtGui import QTextDocument
+from PyQt5.QtPrintSupport import QPrinter
+import json
+import os
+import threading
+import time
+from receipt import ReceiptRenderer, EscPosReceipt, invoice_html
+
+class SystemPrintBridge(QObject):
+    """طباعة فاتورة HTML على طابعة النظام من خيط الواجهة
+
+    QTextDocument و QPrinter لا يُستخدمان خارج خيط الواجهة، فيرسل خيط
+    الطباعة الفاتورة لهذا الكائن (ينشأ في خيط الواجهة) وينتظر النتيجة.
+    """
+    def __init__(self, printer, parent=None):
+        super().__init__(parent)
+        self.printer = printer
+        self.error = None
+
+    @pyqtSlot(str)
+    def print_html(self, html):
+        self.error = None
+        if self.printer is None or not self.printer.printerName():
+            self.error = "لا توجد طابعة متاحة"
+            return
+        doc = QTextDocument()
+        doc.setHtml(html)
+        self.printer.setPageSize(QPrinter.A5)
+        self.printer.setFullPage(True)
+        # print_ لا يرفع استثناء عند الفشل، فنتحقق من حالة الطابعة
+        doc.print_(self.printer)
+        if self.printer.printerState() == QPrinter.Error:
+            self.error = "فشل إرسال الفاتورة للطابعة"
+
+class PrintSpooler(QThread):
+    """خيط خلفي لطباعة الفواتير حتى لا تنتظر نافذة البيع الطابعة
+
+    كل فاتورة تُحفظ أولاً كملف JSON في مجلد الطابور ثم تُطبع بالترتيب.
+    الملف لا يُحذف إلا بعد نجاح الطباعة، فإذا كانت الطابعة غير متصلة يعيد
+    الخيط المحاولة على فترات متزايدة، والفواتير التي لم تُطبع قبل إغلاق
+    البرنامج تُطبع عند تشغيله مرة أخرى. الفاتورة التي تفشل MAX_ATTEMPTS
+    مرة أو يمر عليها MAX_AGE تُنقل لمجلد failed حتى لا تعطل ما بعدها.
+    """
+    queue_changed = pyqtSignal(int)      # عدد الفواتير في انتظار الطباعة
+    job_printed = pyqtSignal(str)        # رقم الفاتورة
+    job_failed = pyqtSignal(str, str)    # رقم الفاتورة، رسالة الخطأ
+    job_dropped = pyqtSignal(str, str)   # رقم الفاتورة، رسالة الخطأ (نُقلت لمجلد failed)
+    system_print = pyqtSignal(str)       # HTML الفاتورة لـ SystemPrintBridge
+
+    # الانتظار (بالثواني) قبل كل إعادة محاولة؛ الأخيرة تتكرر
+    RETRY_DELAYS = (2, 5, 10, 30)
+    # عدد المحاولات لكل فاتورة، وأقصى عمر لها (بالثواني) قبل نقلها لمجلد failed
+    MAX_ATTEMPTS = 8
+    MAX_AGE = 24 * 60 * 60
+    # أقصى انتظار (مللي ثانية) لانتهاء الخيط عند الإغلاق
+    STOP_TIMEOUT_MS = 3000
+
+    def __init__(self, spool_dir, thermal_printer=None, system_printer=None, parent=None,
+                 text_mode=True, logo_path=None):
+        super().__init__(parent)
+        self.spool_dir = spool_dir
+        self.failed_dir = os.path.join(spool_dir, 'failed')
+        os.makedirs(spool_dir, exist_ok=True)
+        self.thermal_printer = thermal_printer
+        self.system_printer = system_printer
+        # الطابعة الحرارية تستقبل الفاتورة كنص بصفحة الحروف العربية، والصورة
+        # الكاملة (ReceiptRenderer) فقط للطابعات التي لا تدعم ذلك
+        self.text_mode = text_mode
+        self.text_receipt = EscPosReceipt(logo_path)
+        # ينشأ مرة واحدة ويستخدم لكل الفواتير (الخطوط ورأس وذيل الفاتورة جاهزة)
+        self.renderer = ReceiptRenderer()
+        # الطباعة العادية تتم في خيط الواجهة، وخيط الطباعة ينتظر انتهاءها
+        self.system_bridge = SystemPrintBridge(system_printer, self)
+        self.system_print.connect(self.system_bridge.print_html, Qt.BlockingQueuedConnection)
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.running = True
+        # فواتير متبقية من تشغيل سابق
+        self.jobs = sorted(name for name in os.listdir(spool_dir) if name.endswith('.json'))
+
+    def has_printer(self):
+        return bool(self.thermal_printer
+                    or (self.system_printer is not None and self.system_printer.printerName()))
+
+    def pending(self):
+        with self.lock:
+            return len(self.jobs)
+
+    def submit(self, receipt):
+        """إضافة فاتورة (من receipt.build_receipt) لطابور الطباعة
+
+        ترجع False بدون حفظ الفاتورة إذا لم تكن هناك طابعة معدة.
+        """
+        if not self.has_printer():
+            return False
+        name = f"{time.time_ns()}-{receipt['invoice_id']}.json"
+        path = os.path.join(self.spool_dir, name)
+        # الكتابة في ملف مؤقت ثم إعادة التسمية حتى لا يبقى ملف نصف مكتوب
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(receipt, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+        with self.lock:
+            self.jobs.append(name)
+            depth = len(self.jobs)
+        self.queue_changed.emit(depth)
+        self.wake.set()
+        if not self.isRunning():
+            self.start()
+        return True
+
+    def stop(self):
+        """إيقاف الخيط؛ الفواتير غير المطبوعة تبقى في المجلد
+
+        الانتظار محدود بـ STOP_TIMEOUT_MS حتى لا تتجمد النافذة إذا كانت
+        الطابعة معلقة؛ الفاتورة الجاري طباعتها تبقى في المجلد وتُعاد لاحقاً.
+        """
+        self.running = False
+        self.wake.set()
+        if not self.wait(self.STOP_TIMEOUT_MS):
+            print("تحذير: خيط الطباعة لم ينته في الوقت المحدد")
+
+    def print_thermal(self, receipt):
+        """طباعة فاتورة على الطابعة الحرارية (نص ESC/POS أو صورة)"""
+        if self.text_mode:
+            self.text_receipt.print_receipt(self.thermal_printer, receipt)
+            return
+        image = self.renderer.render(receipt)
+        self.thermal_printer.image(image)
+        self.thermal_printer.cut()
+
+    def print_receipt(self, receipt):
+        if self.thermal_printer:
+            self.print_thermal(receipt)
+            return
+
+        # HTML يُجهز هنا، والطباعة نفسها في خيط الواجهة (SystemPrintBridge)
+        self.system_print.emit(invoice_html(receipt))
+        if self.system_bridge.error:
+            raise RuntimeError(self.system_bridge.error)
+
+    def finish(self, name):
+        try:
+            os.remove(os.path.join(self.spool_dir, name))
+        except OSError as e:
+            print(f"خطأ في حذف ملف الطباعة {name}: {str(e)}")
+        with self.lock:
+            self.jobs.remove(name)
+            depth = len(self.jobs)
+        self.queue_changed.emit(depth)
+
+    def move_aside(self, name):
+        """نقل فاتورة فشلت طباعتها لمجلد failed (لإعادة طباعتها يدوياً)"""
+        try:
+            os.makedirs(self.failed_dir, exist_ok=True)
+            os.replace(os.path.join(self.spool_dir, name), os.path.join(self.failed_dir, name))
+        except OSError as e:
+            print(f"خطأ في نقل ملف الطباعة {name}: {str(e)}")
+        with self.lock:
+            self.jobs.remove(name)
+            depth = len(self.jobs)
+        self.queue_changed.emit(depth)
+
+    def job_age(self, name):
+        """عمر الفاتورة بالثواني من الوقت في بداية اسم الملف"""
+        try:
+            return time.time() - int(name.split('-', 1)[0]) / 1e9
+        except ValueError:
+            return 0
+
+    def run(self):
+        attempts = 0
+        retry_at = None   # وقت إعادة محاولة الفاتورة الأولى بعد فشلها
+        while self.running:
+            if retry_at is not None:
+                # فاتورة جديدة توقظ الخيط لكنها لا تقصر مدة الانتظار؛ الإيقاف فقط يقطعها
+                remaining = retry_at - time.monotonic()
+                if remaining > 0:
+                    self.wake.wait(remaining)
+                    self.wake.clear()
+                    continue
+                retry_at = None
+
+            with self.lock:
+                name = self.jobs[0] if self.jobs else None
+            if name is None:
+                self.wake.wait()
+                self.wake.clear()
+                continue
+
+            try:
+                with open(os.path.join(self.spool_dir, name), encoding='utf-8') as f:
+                    receipt = json.load(f)
+            except (OSError, ValueError) as e:
+                # ملف تالف أو محذوف: لا فائدة من إعادة المحاولة
+                print(f"تخطي ملف الطباعة {name}: {str(e)}")
+                self.finish(name)
+                continue
+
+            try:
+                self.print_receipt(receipt)
+            except Exception as e:
+                attempts += 1
+                if attempts >= self.MAX_ATTEMPTS or self.job_age(name) > self.MAX_AGE:
+                    print(f"نقل الفاتورة {name} لمجلد failed بعد {attempts} محاولة: {str(e)}")
+                    attempts = 0
+                    self.move_aside(name)
+                    self.job_dropped.emit(receipt.get('invoice_id', name), str(e))
+                    continue
+                self.job_failed.emit(receipt.get('invoice_id', name), str(e))
+                delay = self.RETRY_DELAYS[min(attempts - 1, len(self.RETRY_DELAYS) - 1)]
+                retry_at = time.monotonic() + delay
+                continue
+
+            attempts = 0
+            self.finish(name)
+            self.job_printed.emit(receipt['invoice_id'])
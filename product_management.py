@@ -442,7 +442,11 @@ class ProductManagementWindow(QWidget):
 
             # إضافة المنتج إلى قاعدة البيانات مع نوع البيع
             try:
-                db.add_product(code, name, price, purchase_price, quantity, weight, sell_type[0], price_info[0], safe_limit)
+                success, message = db.add_product(code, name, price, purchase_price, quantity, weight,
+                                                  sell_type[0], price_info[0], safe_limit)
+                if not success:
+                    QMessageBox.warning(self, "خطأ", message)
+                    return
                 
                 # عرض الباركود المنشأ للمنتج
                 self.show_barcode(code, name)
@@ -793,6 +797,7 @@ class ProductManagementWindow(QWidget):
                         WHERE code = ?
                     """, (name, price, quantity, weight, sell_type[0], price_info[0], code))
                     db.conn.commit()
+                    db.product_cache.refresh([code])
                     
                     QMessageBox.information(self, "نجاح", "تم تعديل المنتج بنجاح!")
                     self.show_all_products()
@@ -848,6 +853,7 @@ class ProductManagementWindow(QWidget):
                 if confirm == QMessageBox.Yes:
                     db.cursor.execute("DELETE FROM products WHERE code = ?", (code,))
                     db.conn.commit()
+                    db.product_cache.refresh([code])
                     QMessageBox.information(self, "تم", "تم حذف المنتج بنجاح.")
                     
                     # تحديث الجدول بعد الحذف
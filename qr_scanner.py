@@ -3,12 +3,494 @@ from PyQt5.QtWidgets import (
     QTableWidgetItem, QHBoxLayout, QMessageBox, QComboBox,
     QApplication
 )
-from PyQt5.QtCore import Qt, QTimer, pyqtSignal, pyqtSlot
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, pyqtSlot
 from PyQt5.QtGui import QImage, QPixmap
+from collections import deque, namedtuple
 import cv2
 import numpy as np
 from pyzbar.pyzbar import decode
+# قاعدة البيانات تُفتح عند أول استخدام لـ database.db في نافذة الماسح فقط، حتى
+# لا يفتحها استيراد FrameDecoder و DetectionFilter (مثل benchmark_scanner)
+import database
+import os
+import queue
+import re
 import sys
+import threading
+import time
+
+# كود واحد تم التعرف عليه: النص، المستطيل (left, top, width, height) ونقاط الحدود
+Detection = namedtuple('Detection', 'data rect polygon')
+
+class FrameQueue:
+    """Bounded frame queue that drops the oldest frame when full
+
+    The decoder always works on the newest frames instead of falling
+    further behind the camera. Frame buffers the decoder is done with
+    (and dropped ones) are kept as spares so the camera can read into
+    them instead of allocating a new array for every frame.
+    """
+    def __init__(self, maxsize=2):
+        self.items = deque(maxlen=maxsize)
+        self.spares = []
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        """Queue an item; returns the dropped oldest item, if any"""
+        with self.condition:
+            dropped = None
+            if len(self.items) == self.items.maxlen:
+                dropped = self.items.popleft()
+                self.dropped += 1
+            self.items.append(item)
+            self.condition.notify()
+        return dropped
+
+    def recycle(self, buffer):
+        """Return a frame buffer that is no longer used"""
+        with self.condition:
+            # إطار في الطابور، وإطار قيد فك الكود، وإطار قيد القراءة
+            if len(self.spares) < self.items.maxlen + 2:
+                self.spares.append(buffer)
+
+    def take_spare(self):
+        with self.condition:
+            return self.spares.pop() if self.spares else None
+
+    def get(self, timeout=None):
+        """Return the oldest queued item, or None on timeout or close"""
+        with self.condition:
+            if not self.items and not self.closed:
+                self.condition.wait(timeout)
+            return self.items.popleft() if self.items else None
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+class FrameDecoder:
+    """Find barcodes and QR codes in a BGR camera frame
+
+    With adaptive=True most frames avoid a full-resolution decode:
+
+    1. If the frame barely changed from the last decoded one (less than
+       MOTION_THRESHOLD of the thumbnail cells changed by more than
+       MOTION_PIXEL_DELTA), the previous result is reused, at most
+       MAX_SKIPPED_FRAMES times in a row.
+    2. While a code was seen in the last ROI_TTL_FRAMES frames, only its
+       rect plus ROI_MARGIN is decoded first.
+    3. Otherwise a frame downscaled by DOWNSCALE is decoded.
+    4. A full-resolution decode runs only every FULL_FRAME_EVERY frames,
+       for small or distant codes the downscaled frame misses.
+
+    Intervals are counted in frames so recorded videos give the same
+    results as the live camera.
+    """
+    MOTION_PIXEL_DELTA = 12     # فرق الإضاءة الذي يعتبر تغييراً في خلية الصورة المصغرة
+    MOTION_THRESHOLD = 0.002    # نسبة الخلايا المتغيرة (كود صغير يدخل الصورة يكفي)
+    MAX_SKIPPED_FRAMES = 10
+    ROI_TTL_FRAMES = 15
+    ROI_MARGIN = 0.5            # نسبة من عرض وارتفاع الكود
+    DOWNSCALE = 0.5
+    FULL_FRAME_EVERY = 5
+    THUMBNAIL_SIZE = (80, 60)
+
+    def __init__(self, adaptive=True):
+        self.adaptive = adaptive
+        self.gray = None   # مصفوفة التدرج الرمادي تستخدم لكل الإطارات
+        self.reset()
+
+    def reset(self):
+        self.frame_number = 0
+        self.previous_thumbnail = None
+        self.last_result = []
+        self.skipped_in_row = 0
+        self.last_seen_frame = None
+        self.last_seen_rects = []
+        self.last_full_frame = None
+        self.scene_checked = False
+        # عدد الإطارات حسب الطريقة التي انتهى بها فك الكود
+        self.counters = {'frames': 0, 'skipped': 0, 'roi': 0, 'downscaled': 0, 'full': 0}
+
+    def decode(self, frame):
+        """Decode a BGR frame, or a grayscale plane as it is"""
+        if frame.ndim == 2:
+            gray = frame
+        else:
+            if self.gray is None or self.gray.shape != frame.shape[:2]:
+                self.gray = np.empty(frame.shape[:2], np.uint8)
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        self.counters['frames'] += 1
+        if not self.adaptive:
+            self.counters['full'] += 1
+            return self.decode_region(gray)
+        self.frame_number += 1
+
+        if self.is_still(gray):
+            self.counters['skipped'] += 1
+            return self.last_result
+        self.skipped_in_row = 0
+
+        detections, method = self.decode_adaptive(gray)
+        self.counters[method] += 1
+        # المشهد تغير: لم يفحص بعد بالدقة الكاملة إلا إذا كان هذا الإطار نفسه
+        self.scene_checked = method == 'full'
+        if detections:
+            self.last_seen_frame = self.frame_number
+            self.last_seen_rects = [detection.rect for detection in detections]
+        self.last_result = detections
+        return detections
+
+    def is_still(self, gray):
+        thumbnail = cv2.resize(gray, self.THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+        previous, self.previous_thumbnail = self.previous_thumbnail, thumbnail
+        if previous is None or self.skipped_in_row >= self.MAX_SKIPPED_FRAMES:
+            return False
+        if not self.last_result and not self.scene_checked and self.full_frame_due():
+            # كود صغير لم يظهر في الإطار المصغر: لا نؤجل الفحص الكامل بسبب ثبات الصورة
+            return False
+        changed = (cv2.absdiff(thumbnail, previous) > self.MOTION_PIXEL_DELTA).mean()
+        if changed >= self.MOTION_THRESHOLD:
+            return False
+        # الإطار المقارن القادم هو آخر إطار تم فك كوده وليس هذا الإطار،
+        # حتى لا تمر حركة بطيئة دون فك الكود
+        self.previous_thumbnail = previous
+        self.skipped_in_row += 1
+        return True
+
+    def decode_adaptive(self, gray):
+        recent = (self.last_seen_frame is not None
+                  and self.frame_number - self.last_seen_frame <= self.ROI_TTL_FRAMES)
+        if recent:
+            detections = self.decode_roi(gray)
+            if detections:
+                return detections, 'roi'
+
+        small = cv2.resize(gray, None, fx=self.DOWNSCALE, fy=self.DOWNSCALE, interpolation=cv2.INTER_AREA)
+        detections = self.decode_region(small, scale=1 / self.DOWNSCALE)
+        if detections or not self.full_frame_due():
+            return detections, 'downscaled'
+
+        self.last_full_frame = self.frame_number
+        return self.decode_region(gray), 'full'
+
+    def full_frame_due(self):
+        return (self.last_full_frame is None
+                or self.frame_number - self.last_full_frame >= self.FULL_FRAME_EVERY)
+
+    def decode_roi(self, gray):
+        height, width = gray.shape[:2]
+        left = min(rect[0] for rect in self.last_seen_rects)
+        top = min(rect[1] for rect in self.last_seen_rects)
+        right = max(rect[0] + rect[2] for rect in self.last_seen_rects)
+        bottom = max(rect[1] + rect[3] for rect in self.last_seen_rects)
+        margin_x = int((right - left) * self.ROI_MARGIN) + 16
+        margin_y = int((bottom - top) * self.ROI_MARGIN) + 16
+        left, top = max(0, left - margin_x), max(0, top - margin_y)
+        right, bottom = min(width, right + margin_x), min(height, bottom + margin_y)
+        if right - left < 8 or bottom - top < 8:
+            return []
+        return self.decode_region(gray[top:bottom, left:right], offset=(left, top))
+
+    @staticmethod
+    def decode_region(gray, scale=1.0, offset=(0, 0)):
+        """Decode a grayscale image and map results back to frame coordinates"""
+        ox, oy = offset
+        detections = []
+        for result in decode(gray):
+            left, top, width, height = result.rect
+            detections.append(Detection(
+                result.data.decode('utf-8', 'replace'),
+                (int(left * scale) + ox, int(top * scale) + oy, int(width * scale), int(height * scale)),
+                [(int(x * scale) + ox, int(y * scale) + oy) for x, y in result.polygon]))
+        return detections
+
+class DetectionFilter:
+    """Emit a code once while it stays in view
+
+    The same code is emitted again only after HOLD_SECONDS, so a product
+    held in front of the camera is not added on every frame.
+    """
+    HOLD_SECONDS = 2
+
+    def __init__(self, hold_seconds=None):
+        self.hold_seconds = self.HOLD_SECONDS if hold_seconds is None else hold_seconds
+        self.last_code = ""
+        self.last_time = 0
+
+    def accept(self, code, now):
+        """Return True if code seen at time now (seconds) should be emitted"""
+        if code != self.last_code or (now - self.last_time) > self.hold_seconds:
+            self.last_code = code
+            self.last_time = now
+            return True
+        return False
+
+def draw_detections(image, detections):
+    """Draw the outline and text of each detection on an RGB/BGR image"""
+    for detection in detections:
+        points = np.array(detection.polygon, dtype=np.int32)
+        if len(points) > 4:
+            points = cv2.convexHull(points)
+        cv2.polylines(image, [points], True, (0, 255, 0), 3)
+        left, top = detection.rect[0], detection.rect[1]
+        cv2.putText(image, detection.data, (left, top - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+
+def camera_candidates(max_index=10):
+    """Camera indexes worth probing: the /dev/video* nodes on Linux, else 0-9"""
+    try:
+        nodes = [int(match.group(1)) for match in
+                 (re.fullmatch(r'video(\d+)', name) for name in os.listdir('/dev')) if match]
+        if nodes:
+            return sorted(nodes)
+    except OSError:
+        pass
+    return list(range(max_index))
+
+def probe_camera(index):
+    """Return True if the camera opens and delivers a frame"""
+    cap = cv2.VideoCapture(index)
+    try:
+        if not cap.isOpened():
+            return False
+        ret, _ = cap.read()
+        return bool(ret)
+    finally:
+        cap.release()
+
+class CameraDiscovery(QThread):
+    """Probe camera indexes in parallel without blocking the window
+
+    Each index is opened in its own daemon thread, because a missing or
+    busy device can block cv2.VideoCapture for seconds and cannot be
+    interrupted. Probes still running after PROBE_TIMEOUT are ignored but
+    remembered in `lingering`; the next discovery (or opening that camera)
+    waits for them first, and skips an index whose probe still hangs. The
+    camera already open for scanning (active) is reported without being
+    probed. The preferred (last used) camera is probed first and reported
+    as soon as it answers.
+    """
+    camera_found = pyqtSignal(int)
+    discovery_finished = pyqtSignal(list)
+
+    PROBE_TIMEOUT = 3.0  # ثانية
+
+    # فحوصات تجاوزت المهلة وقد تحمل VideoCapture مفتوحاً (رقم الكاميرا -> الخيط)
+    lingering = {}
+    lingering_lock = threading.Lock()
+
+    def __init__(self, preferred=None, candidates=None, parent=None, active=None):
+        super().__init__(parent)
+        self.preferred = preferred
+        self.candidates = candidates
+        self.active = active
+        self.running = True
+
+    @classmethod
+    def wait_for_probes(cls, indexes, timeout):
+        """Wait for earlier timed-out probes of these indexes; return those still busy"""
+        deadline = time.monotonic() + timeout
+        with cls.lingering_lock:
+            threads = [(index, thread) for index, thread in cls.lingering.items() if index in indexes]
+        busy = set()
+        for index, thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+            if thread.is_alive():
+                busy.add(index)
+                continue
+            with cls.lingering_lock:
+                if cls.lingering.get(index) is thread:
+                    del cls.lingering[index]
+        return busy
+
+    def stop(self):
+        self.running = False
+        self.wait()
+
+    def run(self):
+        candidates = list(self.candidates if self.candidates is not None else camera_candidates())
+        found = []
+        if self.active is not None:
+            # الكاميرا المفتوحة حالياً للمسح لا تُفحص مرة أخرى
+            if self.active in candidates:
+                candidates.remove(self.active)
+            found.append(self.active)
+            self.camera_found.emit(self.active)
+        busy = self.wait_for_probes(set(candidates), self.PROBE_TIMEOUT)
+        if busy:
+            print(f"فحص سابق للكاميرات ما زال معلقاً: {sorted(busy)}")
+            candidates = [index for index in candidates if index not in busy]
+        if self.preferred in candidates:
+            candidates.remove(self.preferred)
+            candidates.insert(0, self.preferred)
+
+        results = queue.Queue()
+
+        def probe(index):
+            try:
+                ok = probe_camera(index)
+            except Exception as e:
+                print(f"خطأ في فحص الكاميرا {index}: {str(e)}")
+                ok = False
+            results.put((index, ok))
+
+        threads = {}
+        for index in candidates:
+            threads[index] = threading.Thread(target=probe, args=(index,), daemon=True)
+            threads[index].start()
+
+        pending = set(candidates)
+        deadline = time.monotonic() + self.PROBE_TIMEOUT
+        while pending and self.running:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                index, ok = results.get(timeout=min(remaining, 0.2))
+            except queue.Empty:
+                continue
+            pending.discard(index)
+            if ok:
+                found.append(index)
+                self.camera_found.emit(index)
+        if pending:
+            print(f"لم تستجب الكاميرات: {sorted(pending)}")
+            with self.lingering_lock:
+                for index in pending:
+                    self.lingering[index] = threads[index]
+        self.discovery_finished.emit(sorted(found))
+
+class CaptureThread(QThread):
+    """Read camera frames, queue them for decoding and emit preview images
+
+    Frames are read into recycled buffers and go to the decoder without a
+    copy. The preview is limited to PREVIEW_FPS, independently of the
+    decode rate. It is one copy into a preallocated buffer, wrapped by a
+    QImage in the camera's BGR order when Qt supports Format_BGR888. A
+    new preview is prepared only after the window has displayed the
+    previous one, so the buffer is never written while it is in use.
+    """
+    frame_ready = pyqtSignal(QImage)
+    failed = pyqtSignal(str)
+
+    # عدد مرات فشل القراءة المتتالية قبل اعتبار الكاميرا مفصولة
+    MAX_READ_FAILURES = 30
+    PREVIEW_FPS = 15
+
+    def __init__(self, cap, frames, parent=None):
+        super().__init__(parent)
+        self.cap = cap
+        self.frames = frames
+        self.running = True
+        self.overlays = []   # آخر نتائج فك الكود، يحدثها DecodeWorker
+        self.preview = None
+        self.preview_free = threading.Event()
+        self.preview_free.set()
+        self.last_preview = 0.0
+
+    def stop(self):
+        self.running = False
+        self.wait()
+
+    def preview_shown(self):
+        """Called by the window after it has copied the preview QImage"""
+        self.preview_free.set()
+
+    def run(self):
+        failures = 0
+        while self.running:
+            buffer = self.frames.take_spare()
+            ret, frame = self.cap.read(buffer) if buffer is not None else self.cap.read()
+            if not ret:
+                if buffer is not None:
+                    self.frames.recycle(buffer)
+                failures += 1
+                if failures >= self.MAX_READ_FAILURES:
+                    self.failed.emit("خطأ في قراءة إطار الكاميرا!")
+                    break
+                time.sleep(0.01)
+                continue
+            failures = 0
+            now = time.perf_counter()
+            dropped = self.frames.put((now, frame))
+            if dropped is not None:
+                self.frames.recycle(dropped[1])
+
+            if now - self.last_preview >= 1 / self.PREVIEW_FPS and self.preview_free.is_set():
+                self.last_preview = now
+                self.preview_free.clear()
+                self.frame_ready.emit(self.preview_image(frame))
+
+    def preview_image(self, frame):
+        if self.preview is None or self.preview.shape != frame.shape:
+            self.preview = np.empty_like(frame)
+        # الرسم على نسخة العرض فقط حتى لا يتغير الإطار المرسل لفك الكود
+        if hasattr(QImage, 'Format_BGR888'):
+            np.copyto(self.preview, frame)
+            image_format = QImage.Format_BGR888
+        else:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.preview)
+            image_format = QImage.Format_RGB888
+        draw_detections(self.preview, self.overlays)
+        h, w, ch = self.preview.shape
+        return QImage(self.preview.data, w, h, ch * w, image_format)
+
+class DecodeWorker(QThread):
+    """Decode queued frames off the GUI thread and report throughput"""
+    codes_detected = pyqtSignal(list)            # قائمة Detection
+    stats_updated = pyqtSignal(float, float, int)  # إطار/ثانية، التأخير (ms)، الإطارات المتروكة
+
+    STATS_INTERVAL = 1.0  # ثانية
+
+    def __init__(self, frames, capture=None, decoder=None, parent=None):
+        super().__init__(parent)
+        self.frames = frames
+        self.capture = capture
+        self.decoder = decoder or FrameDecoder()
+        self.running = True
+
+    def stop(self):
+        self.running = False
+        self.frames.close()
+        self.wait()
+
+    def run(self):
+        window_start = time.perf_counter()
+        decoded = 0
+        latency_total = 0.0
+        while self.running:
+            item = self.frames.get(timeout=0.5)
+            if item is None:
+                continue
+            captured_at, frame = item
+            try:
+                detections = self.decoder.decode(frame)
+            except Exception as e:
+                print(f"خطأ في فك الكود: {str(e)}")
+                self.frames.recycle(frame)
+                continue
+            now = time.perf_counter()
+            decoded += 1
+            latency_total += now - captured_at
+
+            # انتهى استخدام الإطار، تقرأ الكاميرا فيه إطاراً جديداً
+            self.frames.recycle(frame)
+            if self.capture is not None:
+                self.capture.overlays = detections
+            if detections:
+                self.codes_detected.emit(detections)
+
+            if now - window_start >= self.STATS_INTERVAL:
+                self.stats_updated.emit(decoded / (now - window_start),
+                                        latency_total / decoded * 1000, self.frames.dropped)
+                window_start = now
+                decoded = 0
+                latency_total = 0.0
+
 
 class QRCodeScanner(QWidget):
     code_detected = pyqtSignal(str)
@@ -19,12 +501,15 @@ class QRCodeScanner(QWidget):
         self.setGeometry(100, 100, 640, 520)
         self.initUI()
         
-        self.last_code = ""
-        self.last_detection_time = 0
+        self.detection_filter = DetectionFilter()
         self.available_cameras = []
         self.current_camera_index = 0
         self.is_scanning = False
         self.cap = None
+        self.capture_thread = None
+        self.decode_worker = None
+        self.discovery = None
+        self.preferred_camera = None
         
         # Scan for available cameras
         self.scan_for_cameras()
@@ -58,6 +543,11 @@ class QRCodeScanner(QWidget):
         self.status_label.setStyleSheet("font-weight: bold;")
         status_layout.addWidget(self.status_label)
         
+        # سرعة فك الكود والتأخير من لحظة التقاط الإطار
+        self.stats_label = QLabel("")
+        self.stats_label.setStyleSheet("color: #7f8c8d;")
+        status_layout.addWidget(self.stats_label)
+        
         self.start_btn = QPushButton("بدء المسح")
         self.start_btn.clicked.connect(self.toggle_scanning)
         self.start_btn.setStyleSheet("background-color: #2ecc71; color: white;")
@@ -66,33 +556,43 @@ class QRCodeScanner(QWidget):
         layout.addLayout(status_layout)
         
         self.setLayout(layout)
-        
-        # Timer for video processing
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_frame)
-        self.timer.setInterval(100)  # Update at 10 FPS to not overwhelm the system
     
     def scan_for_cameras(self):
-        """Scan for available cameras including USB devices"""
+        """Search for cameras in the background, last used camera first"""
+        if self.discovery is not None and self.discovery.isRunning():
+            return
         self.available_cameras = []
         self.camera_combo.clear()
-        
-        # Start from -1 to include default camera devices
-        # Go up to 10 to catch USB cameras which may be assigned higher numbers
-        for i in range(-1, 10):
-            cap = cv2.VideoCapture(i)
-            if cap.isOpened():
-                ret, frame = cap.read()
-                if ret:
-                    camera_name = f"Camera {i}" if i >= 0 else "Default Camera"
-                    self.available_cameras.append(i)
-                    self.camera_combo.addItem(camera_name, i)
-                cap.release()
-        
+        self.refresh_btn.setEnabled(False)
+        # لا يبدأ المسح قبل انتهاء البحث حتى لا تُفتح كاميرا أثناء تجربتها
+        if not self.is_scanning:
+            self.start_btn.setEnabled(False)
+        self.status_label.setText("جاري البحث عن الكاميرات...")
+        
+        # آخر كاميرا عملت بنجاح محفوظة في scanner_config
+        self.preferred_camera = database.db.get_camera_preference()
+        
+        active = self.current_camera_index if self.is_scanning else None
+        self.discovery = CameraDiscovery(self.preferred_camera, parent=self, active=active)
+        self.discovery.camera_found.connect(self.on_camera_found)
+        self.discovery.discovery_finished.connect(self.on_discovery_finished)
+        self.discovery.start()
+    
+    def on_camera_found(self, index):
+        """Add a camera to the list as soon as its probe succeeds"""
+        self.available_cameras.append(index)
+        position = sum(1 for i in range(self.camera_combo.count()) if self.camera_combo.itemData(i) < index)
+        self.camera_combo.insertItem(position, f"Camera {index}", index)
+        if index == self.preferred_camera or self.camera_combo.count() == 1:
+            self.camera_combo.setCurrentIndex(self.camera_combo.findData(index))
+        self.status_label.setText(f"تم العثور على {self.camera_combo.count()} كاميرا")
+    
+    def on_discovery_finished(self, cameras):
+        self.refresh_btn.setEnabled(True)
+        self.start_btn.setEnabled(True)
+        if self.preferred_camera in cameras:
+            self.camera_combo.setCurrentIndex(self.camera_combo.findData(self.preferred_camera))
         if self.camera_combo.count() > 0:
-            # Select the first non-default camera if available
-            if self.camera_combo.count() > 1:
-                self.camera_combo.setCurrentIndex(1)
             self.status_label.setText(f"تم العثور على {self.camera_combo.count()} كاميرا")
         else:
             self.status_label.setText("لم يتم العثور على كاميرات")
@@ -111,6 +611,10 @@ class QRCodeScanner(QWidget):
             return
         
         self.current_camera_index = self.camera_combo.currentData()
+        # فحص سابق لهذه الكاميرا تجاوز المهلة قد يكون ما زال يحملها
+        if CameraDiscovery.wait_for_probes({self.current_camera_index}, CameraDiscovery.PROBE_TIMEOUT):
+            QMessageBox.critical(self, "خطأ", f"الكاميرا {self.current_camera_index} مشغولة، حاول مرة أخرى!")
+            return
         
         # Initialize video capture
         self.cap = cv2.VideoCapture(self.current_camera_index)
@@ -123,16 +627,33 @@ class QRCodeScanner(QWidget):
         if not self.cap.isOpened():
             QMessageBox.critical(self, "خطأ", f"لا يمكن فتح الكاميرا {self.current_camera_index}!")
             return
+        # تجربة هذه الكاميرا أولاً في المرة القادمة
+        database.db.save_camera_preference(self.current_camera_index)
+        
+        # القراءة من الكاميرا وفك الكود في خيطين منفصلين عن الواجهة
+        frames = FrameQueue()
+        self.capture_thread = CaptureThread(self.cap, frames, self)
+        self.capture_thread.frame_ready.connect(self.show_frame)
+        self.capture_thread.failed.connect(self.on_capture_failed)
+        self.decode_worker = DecodeWorker(frames, self.capture_thread, parent=self)
+        self.decode_worker.codes_detected.connect(self.on_codes_detected)
+        self.decode_worker.stats_updated.connect(self.on_stats_updated)
+        self.decode_worker.start()
+        self.capture_thread.start()
         
         self.is_scanning = True
-        self.timer.start()
         self.start_btn.setText("إيقاف المسح")
         self.start_btn.setStyleSheet("background-color: #e74c3c; color: white;")
         self.status_label.setText("جاري المسح...")
     
     def stop_scanner(self):
         """Stop the QR code scanner"""
-        self.timer.stop()
+        if self.capture_thread is not None:
+            self.capture_thread.stop()
+            self.capture_thread = None
+        if self.decode_worker is not None:
+            self.decode_worker.stop()
+            self.decode_worker = None
         if self.cap is not None:
             self.cap.release()
             self.cap = None
@@ -141,64 +662,40 @@ class QRCodeScanner(QWidget):
         self.start_btn.setText("بدء المسح")
         self.start_btn.setStyleSheet("background-color: #2ecc71; color: white;")
         self.status_label.setText("تم إيقاف المسح")
+        self.stats_label.setText("")
         
         # Clear the camera view
         blank_image = QImage(640, 480, QImage.Format_RGB888)
         blank_image.fill(Qt.black)
         self.camera_label.setPixmap(QPixmap.fromImage(blank_image))
     
-    def update_frame(self):
-        """Update the camera frame and scan for QR codes"""
-        if not self.cap or not self.cap.isOpened():
-            self.stop_scanner()
-            return
-        
-        ret, frame = self.cap.read()
-        if not ret:
-            self.status_label.setText("خطأ في قراءة إطار الكاميرا!")
-            return
-        
-        # Convert the frame to grayscale for QR detection
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Scan for QR codes
-        qr_codes = decode(gray)
-        
-        # Draw rectangles around detected QR codes
-        for qr in qr_codes:
-            points = qr.polygon
-            if len(points) > 4:
-                hull = cv2.convexHull(np.array([point for point in points], dtype=np.float32))
-                cv2.polylines(frame, [hull], True, (0, 255, 0), 3)
-            else:
-                cv2.polylines(frame, [np.array(points)], True, (0, 255, 0), 3)
-            
-            # Draw QR code data
-            code_data = qr.data.decode('utf-8')
-            cv2.putText(frame, code_data, (qr.rect.left, qr.rect.top - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-            
-            # Emit signal with the QR code data
-            import time
-            current_time = time.time()
+    def show_frame(self, image):
+        """Display a preview frame from the capture thread"""
+        self.camera_label.setPixmap(QPixmap.fromImage(image))
+        if self.capture_thread is not None:
+            self.capture_thread.preview_shown()
+    
+    def on_codes_detected(self, detections):
+        """Emit codes found by the decode worker"""
+        current_time = time.time()
+        for detection in detections:
+            code_data = detection.data
             # Only emit if it's a new code or more than 2 seconds have passed
-            if code_data != self.last_code or (current_time - self.last_detection_time) > 2:
+            if self.detection_filter.accept(code_data, current_time):
                 self.code_detected.emit(code_data)
-                self.last_code = code_data
-                self.last_detection_time = current_time
                 self.status_label.setText(f"تم المسح: {code_data}")
-        
-        # Convert the frame to RGB for Qt display
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w, ch = rgb_frame.shape
-        bytes_per_line = ch * w
-        
-        # Convert to QImage and display
-        image = QImage(rgb_frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
-        self.camera_label.setPixmap(QPixmap.fromImage(image))
+    
+    def on_stats_updated(self, fps, latency_ms, dropped):
+        self.stats_label.setText(f"فك الكود: {fps:.1f} إطار/ث | التأخير: {latency_ms:.0f} ms | متروك: {dropped}")
+    
+    def on_capture_failed(self, message):
+        self.stop_scanner()
+        self.status_label.setText(message)
     
     def closeEvent(self, event):
         """Clean up resources when the window is closed"""
+        if self.discovery is not None:
+            self.discovery.stop()
         self.stop_scanner()
         event.accept()
 
@@ -0,0 +1,122 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+import queue
+import threading
+import sqlite3
+import traceback
+
+class QueryExecutor(QThread):
+    """خيط خلفي لتنفيذ استعلامات التقارير باتصال قراءة مستقل
+
+    كل طلب له مفتاح (مثل 'sales'). إرسال طلب جديد بنفس المفتاح يلغي الطلب
+    السابق، سواء كان في الانتظار أو قيد التنفيذ. النتائج والتقدم ترسل كإشارات
+    Qt فتصل إلى الدوال المتصلة بها في خيط الواجهة.
+    """
+    result_ready = pyqtSignal(str, object)   # المفتاح، النتيجة
+    query_failed = pyqtSignal(str, str)      # المفتاح، رسالة الخطأ
+    progress = pyqtSignal(str, int)          # المفتاح، عدد خطوات التنفيذ حتى الآن
+    busy_changed = pyqtSignal(bool)
+
+    # عدد تعليمات SQLite بين كل فحص للإلغاء وإرسال للتقدم
+    PROGRESS_STEPS = 20000
+
+    def __init__(self, database, parent=None):
+        super().__init__(parent)
+        self.database = database
+        self.tasks = queue.Queue()
+        self.lock = threading.Lock()
+        self.latest = {}       # المفتاح -> رقم آخر طلب
+        self.sequence = 0
+        self.current = None    # (المفتاح، رقم الطلب) للطلب الجاري تنفيذه
+        self.reader = None
+        self.running = True
+
+    def submit(self, key, func, *args):
+        """إضافة استعلام للتنفيذ؛ func تستدعى بالشكل func(reader, *args)"""
+        with self.lock:
+            self.sequence += 1
+            request_id = self.sequence
+            self.latest[key] = request_id
+            self.interrupt_if_current(key)
+        self.tasks.put((key, request_id, func, args))
+        if not self.isRunning():
+            self.start()
+        return request_id
+
+    def cancel(self, key):
+        """إلغاء الطلب الخاص بالمفتاح (في الانتظار أو قيد التنفيذ)"""
+        with self.lock:
+            self.latest.pop(key, None)
+            self.interrupt_if_current(key)
+
+    def cancel_all(self):
+        """إلغاء كل الطلبات، مثلاً عند الانتقال لتقرير آخر"""
+        with self.lock:
+            self.latest.clear()
+            if self.current and self.reader:
+                self.reader.conn.interrupt()
+
+    def interrupt_if_current(self, key):
+        # يستدعى مع self.lock
+        if self.current and self.current[0] == key and self.reader:
+            self.reader.conn.interrupt()
+
+    def is_cancelled(self, key, request_id):
+        with self.lock:
+            return self.latest.get(key) != request_id
+
+    def stop(self):
+        """إيقاف الخيط وإغلاق اتصال القراءة"""
+        self.running = False
+        self.cancel_all()
+        self.tasks.put(None)
+        self.wait()
+
+    def run(self):
+        try:
+            self.reader = self.database.open_reader()
+        except Exception as e:
+            print(f"خطأ في فتح اتصال القراءة للتقارير: {str(e)}")
+            return
+
+        while self.running:
+            task = self.tasks.get()
+            if task is None:
+                break
+            key, request_id, func, args = task
+            if self.is_cancelled(key, request_id):
+                continue
+
+            with self.lock:
+                self.current = (key, request_id)
+            self.busy_changed.emit(True)
+            steps = [0]
+
+            def on_progress():
+                # الإرجاع بقيمة غير صفرية يوقف الاستعلام الحالي
+                if self.is_cancelled(key, request_id):
+                    return 1
+                steps[0] += 1
+                self.progress.emit(key, steps[0] * self.PROGRESS_STEPS)
+                return 0
+
+            self.reader.conn.set_progress_handler(on_progress, self.PROGRESS_STEPS)
+            try:
+                result = func(self.reader, *args)
+                if not self.is_cancelled(key, request_id):
+                    self.result_ready.emit(key, result)
+            except sqlite3.OperationalError as e:
+                if not self.is_cancelled(key, request_id):
+                    self.query_failed.emit(key, str(e))
+            except Exception as e:
+                print(traceback.format_exc())
+                if not self.is_cancelled(key, request_id):
+                    self.query_failed.emit(key, str(e))
+            finally:
+                self.reader.conn.set_progress_handler(None, 0)
+                with self.lock:
+                    self.current = None
+                if self.tasks.empty():
+                    self.busy_changed.emit(False)
+
+        self.reader.close()
+        self.reader = None
@@ -0,0 +1,12 @@
+# اسم الملف: rebuild_sales_rollup.py
+# إعادة بناء جدول ملخص المبيعات اليومية (daily_product_sales) من كل الفواتير السابقة
+# يستخدم بعد استيراد فواتير قديمة أو تعديلها يدوياً في قاعدة البيانات
+
+from database import db
+
+if __name__ == "__main__":
+    if db.rebuild_sales_rollup():
+        print("تمت إعادة بناء ملخص المبيعات بنجاح")
+    else:
+        print("فشل في إعادة بناء ملخص المبيعات")
+    db.close()
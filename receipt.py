@@ -0,0 +1,392 @@
+# اسم الملف: receipt.py
+# تجهيز بيانات الفاتورة للطباعة: نص ESC/POS أو صورة للطابعة الحرارية، أو HTML للطابعة العادية
+#
+# الدوال هنا لا تعتمد على نافذة البيع، فتعمل من خيط الطباعة الخلفي على
+# نسخة ثابتة من الفاتورة حتى بعد مسح السلة وبدء عملية بيع جديدة.
+
+import textwrap
+import threading
+import time
+import unicodedata
+import arabic_reshaper
+from bidi.algorithm import get_display
+from PIL import Image, ImageDraw, ImageFont
+
+def build_receipt(invoice_id, date, cashier, member, items, total, discount, net_total):
+    """نسخة من بيانات الفاتورة قابلة للحفظ كـ JSON"""
+    return {
+        'invoice_id': invoice_id,
+        'date': date,
+        'cashier': cashier,
+        'member': member or '',
+        'items': [
+            {
+                'code': item['code'],
+                'name': item['name'],
+                'price': item['price'],
+                'quantity': item.get('quantity'),
+                'weight': item.get('weight'),
+                'total_price': item['total_price']
+            }
+            for item in items
+        ],
+        'total': total,
+        'discount': discount,
+        'net_total': net_total
+    }
+
+class ReceiptRenderer:
+    """رسم فواتير الطابعة الحرارية
+
+    ينشأ مرة واحدة في الجلسة: الخطوط تُحمّل مرة واحدة، ورأس الفاتورة (اسم
+    المتجر) وذيلها (رسالة الشكر) يُرسمان مرة واحدة ويُلصقان في كل فاتورة.
+    الصورة بنظام "1" (أبيض وأسود) مثل مخرج الطابعة، وارتفاعها محسوب من
+    عدد الأصناف فلا تُقص الفواتير الطويلة.
+    """
+    WIDTH = 384  # مناسب للطابعات 80mm
+    MARGIN = 10
+    LINE_HEIGHT = 30
+    FONT_PATH = "/usr/share/fonts/truetype/noto/NotoNaskhArabic-Regular.ttf"
+    STORE_NAME = "منفذ الشهداء"
+
+    def __init__(self, font_path=None):
+        # تحميل خط عربي (يجب تثبيت الخط في النظام)
+        try:
+            path = font_path or self.FONT_PATH
+            self.font = ImageFont.truetype(path, 20)
+            self.bold_font = ImageFont.truetype(path, 24)
+            self.title_font = ImageFont.truetype(path, 28)
+        except OSError:
+            # إذا لم يتم العثور على الخط العربي، نستخدم خط افتراضي (قد لا يدعم العربية جيداً)
+            self.font = ImageFont.load_default()
+            self.bold_font = ImageFont.load_default()
+            self.title_font = ImageFont.load_default()
+
+        self.header = self.render_header()
+        self.footer = self.render_footer()
+        # رسم الخطوط من خيطين في نفس الوقت غير مضمون في PIL
+        self.lock = threading.Lock()
+        self.render_count = 0
+        self.last_render_ms = 0.0
+        self.total_render_ms = 0.0
+
+    def new_canvas(self, height):
+        image = Image.new('1', (self.WIDTH, height), 1)
+        return image, ImageDraw.Draw(image)
+
+    def render_header(self):
+        image, draw = self.new_canvas(self.LINE_HEIGHT + 20)
+        draw.text((self.WIDTH - self.MARGIN, 10), self.STORE_NAME, font=self.title_font, fill=0, anchor="ra")
+        return image
+
+    def render_footer(self):
+        image, draw = self.new_canvas(2 * self.LINE_HEIGHT + 10)
+        draw.text((self.WIDTH // 2, 0), "شكراً لزيارتكم", font=self.bold_font, fill=0, anchor="ma")
+        draw.text((self.WIDTH // 2, self.LINE_HEIGHT), "نرجو زيارة متجرنا مرة أخرى", font=self.font, fill=0, anchor="ma")
+        return image
+
+    def render(self, receipt):
+        """رسم الفاتورة كصورة للطابعة الحرارية"""
+        with self.lock:
+            start = time.perf_counter()
+            image = self.draw_receipt(receipt)
+            self.last_render_ms = (time.perf_counter() - start) * 1000
+            self.total_render_ms += self.last_render_ms
+            self.render_count += 1
+            return image
+
+    def stats(self):
+        return {
+            'receipts': self.render_count,
+            'last_ms': self.last_render_ms,
+            'avg_ms': self.total_render_ms / self.render_count if self.render_count else 0.0
+        }
+
+    def draw_receipt(self, receipt):
+        right = self.WIDTH - self.MARGIN
+        line_height = self.LINE_HEIGHT
+        items = receipt['items']
+        info_lines = 4 if receipt['member'] else 3
+
+        # الارتفاع: الرأس + المعلومات + الفواصل + الأصناف + المجاميع + الذيل
+        body_height = (info_lines * line_height + 20 + line_height + 10
+                       + len(items) * line_height + 20 + 3 * line_height + 10)
+        height = self.header.height + body_height + self.footer.height
+        image, draw = self.new_canvas(height)
+        image.paste(self.header, (0, 0))
+        y = self.header.height
+
+        # معلومات الفاتورة
+        draw.text((right, y), f"فاتورة رقم: {receipt['invoice_id']}", font=self.bold_font, fill=0, anchor="ra")
+        y += line_height
+        draw.text((right, y), f"التاريخ: {receipt['date']}", font=self.font, fill=0, anchor="ra")
+        y += line_height
+        draw.text((right, y), f"الكاشير: {receipt['cashier']}", font=self.font, fill=0, anchor="ra")
+        y += line_height
+
+        # معلومات العضو
+        if receipt['member']:
+            draw.text((right, y), f"رقم العضوية: {receipt['member']}", font=self.font, fill=0, anchor="ra")
+            y += line_height
+
+        # خط فاصل
+        draw.line((self.MARGIN, y, right, y), fill=0, width=2)
+        y += 20
+
+        # عناوين الأعمدة
+        headers = ["المنتج", "الكمية", "السعر", "الوزن", "الإجمالي"]
+        draw.text((right, y), "  ".join(headers), font=self.bold_font, fill=0, anchor="ra")
+        y += line_height
+        draw.line((self.MARGIN, y, right, y), fill=0)
+        y += 10
+
+        # تفاصيل المنتجات
+        for item in items:
+            # اسم المنتج (مع تقصير إذا كان طويلاً)
+            product_name = item['name'][:15] + "..." if len(item['name']) > 15 else item['name']
+
+            # تحضير عرض الكمية والوزن
+            quantity_display = str(item['quantity']) if item['quantity'] is not None else "-"
+            weight_display = f"{item['weight']:.3f}" if item.get('weight') is not None else "-"
+
+            # كتابة بيانات المنتج في سطر واحد
+            line = f"{item['total_price']:.2f} ج  {item['price']:.2f} ج  {quantity_display}  {weight_display}  {product_name}"
+            draw.text((right, y), line, font=self.font, fill=0, anchor="ra")
+            y += line_height
+
+        # خط فاصل
+        draw.line((self.MARGIN, y, right, y), fill=0, width=2)
+        y += 20
+
+        # المجاميع (كل قيمة في سطر مستقل)
+        draw.text((right, y), f"المجموع: {receipt['total']:.2f} ج", font=self.bold_font, fill=0, anchor="ra")
+        y += line_height
+        draw.text((right, y), f"الخصم: {receipt['discount']:.2f} ج", font=self.bold_font, fill=0, anchor="ra")
+        y += line_height
+        draw.text((right, y), f"الصافي: {receipt['net_total']:.2f} ج", font=self.title_font, fill=0, anchor="ra")
+        y += line_height + 10
+
+        image.paste(self.footer, (0, y))
+        return image
+
+ESC = b'\x1b'
+GS = b'\x1d'
+
+class EscPosReceipt:
+    """طباعة الفاتورة كنص ESC/POS بصفحة الحروف العربية بدلاً من صورة كاملة
+
+    النص يُشكّل (arabic_reshaper) ويُرتب للعرض من اليمين لليسار (bidi) ثم
+    يُحوّل لترميز صفحة الحروف في الطابعة، فتُرسل الفاتورة كبضعة مئات من
+    البايتات بدلاً من صورة. الصورة تُستخدم فقط للشعار إن وُجد.
+    """
+    CODE_PAGE = 0x13      # ESC t 0x13 كما في fix_printer.py
+    ENCODING = 'cp864'    # ترميز الحروف العربية المشكّلة في صفحة الطابعة
+    COLUMNS = 32          # عدد الحروف في السطر (384 نقطة بالخط A)
+    STORE_NAME = "منفذ الشهداء"
+
+    # أشكال الحرف البديلة عند عدم وجود الشكل المطلوب في صفحة الحروف
+    FORM_FALLBACKS = {
+        '<final>': ('<isolated>',),
+        '<medial>': ('<initial>', '<isolated>'),
+        '<initial>': ('<isolated>',),
+        '<isolated>': (),
+    }
+
+    def __init__(self, logo_path=None, columns=None, encoding=None, code_page=None):
+        self.columns = columns or self.COLUMNS
+        self.encoding = encoding or self.ENCODING
+        self.code_page = self.CODE_PAGE if code_page is None else code_page
+        self.forms = self.presentation_forms()
+        self.encoded = {}
+        self.logo = None
+        if logo_path:
+            # الشعار يُجهز مرة واحدة بعرض الورق وبنظام "1"
+            logo = Image.open(logo_path)
+            if logo.width > ReceiptRenderer.WIDTH:
+                height = logo.height * ReceiptRenderer.WIDTH // logo.width
+                logo = logo.resize((ReceiptRenderer.WIDTH, height))
+            self.logo = logo.convert('1')
+        self.last_bytes = 0
+        self.last_ms = 0.0
+
+    @staticmethod
+    def presentation_forms():
+        """(الحروف الأساسية) -> {الشكل: الحرف} لأشكال العرض العربية"""
+        forms = {}
+        for code in range(0xFE70, 0xFF00):
+            char = chr(code)
+            decomposition = unicodedata.decomposition(char)
+            if decomposition.startswith('<'):
+                tag, *base = decomposition.split()
+                forms.setdefault(tuple(base), {})[tag] = char
+        return forms
+
+    def encode_char(self, char):
+        cached = self.encoded.get(char)
+        if cached is not None:
+            return cached
+        try:
+            data = char.encode(self.encoding)
+        except UnicodeEncodeError:
+            data = b'?'
+            decomposition = unicodedata.decomposition(char)
+            if decomposition.startswith('<'):
+                tag, *base = decomposition.split()
+                candidates = [self.forms.get(tuple(base), {}).get(alt)
+                              for alt in self.FORM_FALLBACKS.get(tag, ())]
+                if len(base) == 2 and base[0] == '0644':
+                    # لام ألف بهمزة أو مد: نكتفي بلام ألف
+                    candidates.append(self.forms.get(('0644', '0627'), {}).get(tag))
+                candidates.append(unicodedata.normalize('NFKC', char))
+                for candidate in candidates:
+                    try:
+                        if candidate:
+                            data = candidate.encode(self.encoding)
+                            break
+                    except UnicodeEncodeError:
+                        continue
+        self.encoded[char] = data
+        return data
+
+    def visual(self, text):
+        """النص بترتيب العرض بعد تشكيل الحروف العربية"""
+        return get_display(arabic_reshaper.reshape(text))
+
+    def encode(self, text):
+        return b''.join(self.encode_char(char) for char in self.visual(text))
+
+    def line(self, text):
+        return self.encode(text[:self.columns]) + b'\n'
+
+    def row(self, label, value):
+        """سطر بعنوان على اليمين وقيمة على اليسار"""
+        label = self.visual(label)
+        if len(label) + 1 + len(value) > self.columns:
+            # القيمة الطويلة (مثل رقم الفاتورة) تنزل تحت العنوان وتُقسم عند "-"
+            lines = [label] + textwrap.wrap(value, self.columns)
+            return b''.join(b''.join(self.encode_char(c) for c in text.rjust(self.columns)) + b'\n'
+                            for text in lines)
+        space = self.columns - len(label) - len(value)
+        return b''.join(self.encode_char(c) for c in value + ' ' * space + label) + b'\n'
+
+    def build(self, receipt):
+        """بايتات ESC/POS للفاتورة كاملة (بدون الشعار والقص)"""
+        separator = b'-' * self.columns + b'\n'
+        out = bytearray(ESC + b'@' + ESC + b't' + bytes([self.code_page]))
+
+        # اسم المتجر في المنتصف بحجم مضاعف
+        out += ESC + b'a\x01' + GS + b'!\x11' + self.line(self.STORE_NAME) + GS + b'!\x00'
+
+        # معلومات الفاتورة (القيم خارج bidi حتى لا يُعكس ترتيب التاريخ)
+        out += ESC + b'a\x02'
+        out += self.row("فاتورة رقم:", str(receipt['invoice_id']))
+        out += self.row("التاريخ:", str(receipt['date']))
+        out += self.line(f"الكاشير: {receipt['cashier']}")
+        if receipt['member']:
+            out += self.row("رقم العضوية:", str(receipt['member']))
+        out += separator
+
+        # الأصناف: الاسم في سطر، ثم الكمية أو الوزن × السعر والإجمالي
+        for item in receipt['items']:
+            out += self.line(item['name'])
+            if item.get('weight') and not item.get('quantity'):
+                amount = f"{item['weight']:.3f} x {item['price']:.2f}"
+            else:
+                amount = f"{item.get('quantity') or 0} x {item['price']:.2f}"
+            out += self.row(amount, f"{item['total_price']:.2f}")
+        out += separator
+
+        # المجاميع
+        out += self.row("المجموع:", f"{receipt['total']:.2f}")
+        out += self.row("الخصم:", f"{receipt['discount']:.2f}")
+        out += ESC + b'E\x01' + self.row("الصافي:", f"{receipt['net_total']:.2f}") + ESC + b'E\x00'
+        out += separator
+
+        # رسالة الشكر
+        out += ESC + b'a\x01'
+        out += self.line("شكراً لزيارتكم")
+        out += self.line("نرجو زيارة متجرنا مرة أخرى")
+        out += ESC + b'd\x03'
+        return bytes(out)
+
+    def print_receipt(self, printer, receipt):
+        """إرسال الفاتورة للطابعة الحرارية (كائن escpos)"""
+        start = time.perf_counter()
+        if self.logo is not None:
+            printer.image(self.logo)
+        data = self.build(receipt)
+        printer._raw(data)
+        printer.cut()
+        self.last_bytes = len(data)
+        self.last_ms = (time.perf_counter() - start) * 1000
+
+def invoice_html(receipt):
+    """الفاتورة بصيغة HTML للطابعة العادية أو للحفظ كصورة"""
+    items_html = ""
+    for idx, item in enumerate(receipt['items'], 1):
+        quantity_display = str(item.get('quantity', '-'))
+        weight_display = f"{item.get('weight', 0):.3f}" if item.get('weight') is not None else "-"
+        items_html += f"""
+        <tr>
+            <td style="border: 1px solid #ddd; padding: 8px; text-align: center;">{idx}</td>
+            <td style="border: 1px solid #ddd; padding: 8px; text-align: right;">{item.get('name', '')}</td>
+            <td style="border: 1px solid #ddd; padding: 8px; text-align: center;">{item.get('code', '')}</td>
+            <td style="border: 1px solid #ddd; padding: 8px; text-align: center;">{quantity_display}</td>
+            <td style="border: 1px solid #ddd; padding: 8px; text-align: center;">{weight_display}</td>
+            <td style="border: 1px solid #ddd; padding: 8px; text-align: center;">{item.get('price', 0):.2f} ج</td>
+            <td style="border: 1px solid #ddd; padding: 8px; text-align: center;">{item.get('total_price', 0):.2f} ج</td>
+        </tr>
+        """
+
+    return f"""
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <style>
+            body {{ font-family: Arial; direction: rtl; }}
+            .header {{ text-align: center; margin-bottom: 15px; }}
+            .info {{ margin-bottom: 10px; }}
+            table {{ width: 100%; border-collapse: collapse; margin: 10px 0; }}
+            th {{ background-color: #f2f2f2; padding: 6px; text-align: center; }}
+            .total {{ font-weight: bold; margin-top: 8px; }}
+            .footer {{ margin-top: 15px; text-align: center; font-style: italic; }}
+            .cashier-info {{ text-align: right; margin-top: 10px; color: #444; }}
+        </style>
+    </head>
+    <body>
+        <div class="header">
+            <h1>منفذ الشهداء</h1>
+            <h2>فاتورة بيع</h2>
+        </div>
+
+        <div class="info">
+            <p><strong>رقم الفاتورة:</strong> {receipt['invoice_id']}</p>
+            <p><strong>التاريخ:</strong> {receipt['date']}</p>
+            <p><strong>رقم العضوية:</strong> {receipt['member'] or '-----'}</p>
+            <p><strong>الكاشير:</strong> {receipt['cashier']}</p>
+        </div>
+
+        <table border="1">
+            <tr>
+                <th>م</th>
+                <th>اسم المنتج</th>
+                <th>الكود</th>
+                <th>الكمية</th>
+                <th>الوزن (كجم)</th>
+                <th>سعر الوحدة</th>
+                <th>الإجمالي</th>
+            </tr>
+            {items_html}
+        </table>
+        <div class="total">
+            <p>المجموع: {receipt['total']:.2f} ج</p>
+            <p>الخصم (0%): {receipt['discount']:.2f} ج</p>
+            <p>الإجمالي النهائي: {receipt['net_total']:.2f} ج</p>
+        </div>
+
+        <div class="footer">
+            <p>شكراً لزيارتكم - نرجو زيارة متجرنا مرة أخرى</p>
+        </div>
+    </body>
+    </html>
+    """
@@ -2,10 +2,153 @@ from PyQt5.QtWidgets import (
     QWidget, QLabel, QPushButton, QVBoxLayout, QTableWidget,
     QTableWidgetItem, QDateEdit, QHBoxLayout, QMessageBox,
     QTabWidget, QSpinBox, QLineEdit, QDialog, QStackedWidget,
-    QHeaderView
+    QHeaderView, QTableView
 )
-from PyQt5.QtCore import Qt, QDate, pyqtSignal
-from database import db
+from PyQt5.QtCore import Qt, QDate, pyqtSignal, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QFont
+from database import db, Database
+from query_executor import QueryExecutor
+
+class SalesTableModel(QAbstractTableModel):
+    """نموذج جدول المبيعات يحمل الفواتير صفحة بصفحة عند التمرير
+
+    بدلاً من إنشاء QTableWidgetItem لكل خلية، يحتفظ النموذج بالصفوف كما
+    جاءت من قاعدة البيانات ويحمّل الصفحة التالية فقط عندما يصل المستخدم
+    لنهاية الجدول (canFetchMore/fetchMore) باستخدام keyset pagination.
+    الصفحات تُقرأ في QueryExecutor (المفتاح 'sales_page') وتضاف بـ add_page.
+    """
+    HEADERS = ["رقم الفاتورة", "التاريخ", "رقم العميل", "الإجمالي", "الخصم", "الصافي", "الربح"]
+    PAGE_SIZE = 200
+
+    def __init__(self, executor, parent=None):
+        super().__init__(parent)
+        self.executor = executor
+        self.rows = []
+        self.start_date = None
+        self.end_date = None
+        self.has_more = False
+        self.pending = None    # رقم طلب الصفحة الجاري تحميلها في QueryExecutor
+        self.font = QFont()
+        self.font.setPointSize(12)
+
+    def set_range(self, start_date, end_date, first_page=None):
+        """بدء عرض فترة جديدة؛ first_page صفحة أولى جاهزة (من الخيط الخلفي)"""
+        self.beginResetModel()
+        self.executor.cancel('sales_page')
+        self.pending = None
+        self.start_date = start_date
+        self.end_date = end_date
+        self.rows = []
+        self.has_more = True
+        if first_page is not None:
+            self.rows = list(first_page)
+            self.has_more = len(first_page) >= self.PAGE_SIZE
+        self.endResetModel()
+
+    def clear(self):
+        self.executor.cancel('sales_page')
+        self.pending = None
+        self.beginResetModel()
+        self.rows = []
+        self.has_more = False
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.has_more and not self.fetching()
+
+    def fetching(self):
+        # الطلب الملغي (مثلاً بـ cancel_all عند تغيير التقرير) لا يمنع طلباً جديداً
+        return self.pending is not None and not self.executor.is_cancelled('sales_page', self.pending)
+
+    def next_page_key(self):
+        if not self.rows:
+            return None
+        last = self.rows[-1]
+        return (last[8], last[1], last[0])  # sale_day, date, invoice_id
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or not self.has_more or self.fetching():
+            return
+        self.pending = self.executor.submit('sales_page', SalesTableModel.fetch_page,
+                                            self.start_date, self.end_date, self.next_page_key())
+
+    def add_page(self, result):
+        """إضافة صفحة وصلت من QueryExecutor (تُتجاهل إذا تغيرت الفترة بعد طلبها)"""
+        if (result['start_date'], result['end_date'], result['after']) != \
+                (self.start_date, self.end_date, self.next_page_key()):
+            return
+        self.pending = None
+        page = result['page']
+        self.has_more = len(page) >= self.PAGE_SIZE
+        if not page:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(page) - 1)
+        self.rows.extend(page)
+        self.endInsertRows()
+
+    def page_failed(self):
+        self.pending = None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = index.column()
+        if role == Qt.DisplayRole:
+            invoice_id, date, customer_id, cashier, total, discount, net_total, profit = self.rows[index.row()][:8]
+            if column == 0:
+                return str(invoice_id)
+            if column == 1:
+                return str(date)
+            if column == 2:
+                return str(customer_id) if customer_id else "-"
+            value = (total, discount, net_total, profit)[column - 3]
+            try:
+                return f"{float(value or 0):.2f}"
+            except (ValueError, TypeError):
+                return "0.00"
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if role == Qt.ForegroundRole and column == 6:
+            # تلوين خلية الربح باللون الأخضر
+            return Qt.darkGreen
+        if role == Qt.FontRole:
+            return self.font
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def invoice_id(self, row):
+        if 0 <= row < len(self.rows):
+            return self.rows[row][0]
+        return None
+
+    @staticmethod
+    def fetch_first_page(reader, start_date, end_date):
+        """الملخص والصفحة الأولى معاً، للتنفيذ في QueryExecutor"""
+        summary = reader.get_sales_summary(start_date, end_date)
+        summary['start_date'] = start_date
+        summary['end_date'] = end_date
+        summary['first_page'] = reader.get_invoices_page(start_date, end_date, None, SalesTableModel.PAGE_SIZE)
+        return summary
+
+    @staticmethod
+    def fetch_page(reader, start_date, end_date, after):
+        """الصفحة التالية بعد after، للتنفيذ في QueryExecutor"""
+        return {
+            'start_date': start_date,
+            'end_date': end_date,
+            'after': after,
+            'page': reader.get_invoices_page(start_date, end_date, after, SalesTableModel.PAGE_SIZE)
+        }
 
 class ReportsWindow(QWidget):
     closed_signal = pyqtSignal()
@@ -23,6 +166,23 @@ class ReportsWindow(QWidget):
         self.default_start_date = current_date.toString("yyyy-MM-dd")
         self.default_end_date = current_date.toString("yyyy-MM-dd")
         
+        # تنفيذ استعلامات التقارير في خيط خلفي حتى لا تتجمد الواجهة
+        self.query_executor = QueryExecutor(db, self)
+        self.query_executor.result_ready.connect(self.on_query_result)
+        self.query_executor.query_failed.connect(self.on_query_failed)
+        self.query_executor.progress.connect(self.on_query_progress)
+        self.query_executor.busy_changed.connect(self.on_query_busy_changed)
+        self.result_handlers = {
+            'sales': self.fill_sales_table,
+            'sales_page': self.append_sales_page,
+            'stock': self.fill_stock_table,
+            'popular': self.fill_popular_products,
+            'low_demand': self.fill_low_demand_products,
+            'cash_drawer': self.fill_cash_drawer_table,
+            'users': self.fill_users_table,
+            'attendance': self.fill_attendance_table
+        }
+        
         self.initUI()
         
         # تحميل البيانات تلقائياً عند فتح النافذة
@@ -109,6 +269,13 @@ class ReportsWindow(QWidget):
 
         main_layout.addLayout(buttons_layout)
 
+        # مؤشر تحميل التقرير
+        self.loading_label = QLabel("⏳ جاري تحميل البيانات...")
+        self.loading_label.setStyleSheet("color: #7f8c8d; font-size: 14px;")
+        self.loading_label.setAlignment(Qt.AlignCenter)
+        self.loading_label.hide()
+        main_layout.addWidget(self.loading_label)
+
         # إضافة مساحة لعرض التقارير
         self.stacked_widget = QStackedWidget()
         self.stacked_widget.addWidget(self.create_sales_report())
@@ -126,6 +293,9 @@ class ReportsWindow(QWidget):
         """عرض التقرير المحدد"""
         self.stacked_widget.setCurrentIndex(index)
         
+        # إلغاء تحميل التقرير السابق إذا لم ينته بعد
+        self.query_executor.cancel_all()
+        
         # تحميل البيانات عند تغيير التقرير
         if index == 0:  # تقرير المبيعات
             if not self.start_date_text.text() or not self.end_date_text.text():
@@ -247,14 +417,14 @@ class ReportsWindow(QWidget):
         
         layout.addLayout(summary_layout)
 
-        self.sales_table = QTableWidget()
-        self.sales_table.setColumnCount(7)  # إضافة عمود الربح
-        self.sales_table.setHorizontalHeaderLabels([
-            "رقم الفاتورة", "التاريخ", "رقم العميل",
-            "الإجمالي", "الخصم", "الصافي", "الربح"
-        ])
+        # جدول افتراضي: الصفوف تُقرأ من النموذج وتُحمّل صفحة بصفحة عند التمرير
+        self.sales_model = SalesTableModel(self.query_executor, self)
+        self.sales_table = QTableView()
+        self.sales_table.setModel(self.sales_model)
         self.style_table(self.sales_table)
-        self.sales_table.cellDoubleClicked.connect(self.show_invoice_details)
+        # الترتيب ثابت (الأحدث أولاً) لأن التحميل بالصفحات يعتمد عليه
+        self.sales_table.setSortingEnabled(False)
+        self.sales_table.doubleClicked.connect(self.show_invoice_details)
         
         layout.addWidget(self.sales_table)
         
@@ -856,65 +1026,42 @@ class ReportsWindow(QWidget):
                 QMessageBox.warning(self, "تنبيه", "برجاء إدخال التاريخ")
                 return
             
-            # تحميل البيانات من قاعدة البيانات
-            self.sales_table.setRowCount(0)  # مسح البيانات القديمة
-            
-            result = db.get_invoices_by_date_range(start_date, end_date)
-            if not result['invoices']:
-                self.sales_summary.setText("إجمالي المبيعات: 0.00 ج")
-                self.profit_summary.setText("إجمالي الربح: 0.00 ج")
-                return
-                
-            self.sales_table.setRowCount(len(result['invoices']))
+            # تحميل البيانات من قاعدة البيانات في الخيط الخلفي
+            self.query_executor.submit('sales', SalesTableModel.fetch_first_page, start_date, end_date)
             
-            for row, invoice in enumerate(result['invoices']):
-                invoice_id, date, customer_id, cashier, total, discount, net_total, profit = invoice
-                
-                # تحويل القيم إلى أرقام
-                try:
-                    total = float(total or 0)
-                    discount = float(discount or 0)
-                    net_total = float(net_total or 0)
-                    profit = float(profit or 0)
-                except (ValueError, TypeError):
-                    continue
-                
-                # إضافة البيانات للجدول
-                self.sales_table.setItem(row, 0, self.create_table_item(str(invoice_id)))
-                self.sales_table.setItem(row, 1, self.create_table_item(str(date)))
-                self.sales_table.setItem(row, 2, self.create_table_item(str(customer_id) if customer_id else "-"))
-                self.sales_table.setItem(row, 3, self.create_table_item(f"{total:.2f}"))
-                self.sales_table.setItem(row, 4, self.create_table_item(f"{discount:.2f}"))
-                self.sales_table.setItem(row, 5, self.create_table_item(f"{net_total:.2f}"))
-                self.sales_table.setItem(row, 6, self.create_table_item(f"{profit:.2f}"))
-                
-                # تلوين خلية الربح باللون الأخضر
-                profit_item = self.sales_table.item(row, 6)
-                if profit_item:
-                    profit_item.setForeground(Qt.darkGreen)
+        except Exception as e:
+            print(f"Error in load_sales_data: {str(e)}")  # للتشخيص
+            QMessageBox.critical(self, "خطأ", f"حدث خطأ أثناء تحميل البيانات: {str(e)}")
+
+    def fill_sales_table(self, result):
+        """عرض بيانات المبيعات في الجدول"""
+        try:
+            # الجدول يعرض الصفحة الأولى فقط ويحمّل الباقي عند التمرير
+            self.sales_model.set_range(result['start_date'], result['end_date'], result['first_page'])
             
             # تحديث ملخص المبيعات والأرباح
-            self.sales_summary.setText(f"إجمالي المبيعات: {result['total_sales']:.2f} ج")
-            self.profit_summary.setText(f"إجمالي الربح: {result['total_profit']:.2f} ج")
+            self.sales_summary.setText(f"إجمالي المبيعات: {float(result['total_sales'] or 0):.2f} ج")
+            self.profit_summary.setText(f"إجمالي الربح: {float(result['total_profit'] or 0):.2f} ج")
             
         except Exception as e:
-            print(f"Error in load_sales_data: {str(e)}")  # للتشخيص
+            print(f"Error in fill_sales_table: {str(e)}")  # للتشخيص
             QMessageBox.critical(self, "خطأ", f"حدث خطأ أثناء تحميل البيانات: {str(e)}")
-            self.sales_table.setRowCount(0)
+            self.sales_model.clear()
             self.sales_summary.setText("إجمالي المبيعات: 0.00 ج")
             self.profit_summary.setText("إجمالي الربح: 0.00 ج")
 
+    def append_sales_page(self, result):
+        """صفحة إضافية من الفواتير وصلت أثناء التمرير"""
+        self.sales_model.add_page(result)
+
     def load_stock_data(self):
         """تحميل بيانات المخزون مع مراعاة نوع البيع (كمية/وزن/كلاهما)"""
+        # الحصول على المنتجات من قاعدة البيانات في الخيط الخلفي
+        self.query_executor.submit('stock', Database.get_stock_products)
+
+    def fill_stock_table(self, products):
+        """عرض بيانات المخزون في الجدول"""
         try:
-            # الحصول على المنتجات من قاعدة البيانات
-            db.cursor.execute("""
-                SELECT code, name, price, purchase_price, quantity, weight, sell_by, price_type, safe_limit 
-                FROM products
-                ORDER BY name
-            """)
-            products = db.cursor.fetchall()
-            
             if not products:
                 QMessageBox.warning(self, "تنبيه", "لا توجد منتجات في المخزون")
                 return
@@ -1009,23 +1156,38 @@ class ReportsWindow(QWidget):
                 QMessageBox.warning(self, "تنبيه", "الرجاء إدخال التاريخ")
                 return
             
-            # تحميل المنتجات الأكثر مبيعاً
-            top_products = db.get_top_products(
-                start_date=start_date,
-                end_date=end_date,
-                min_quantity=50,    # الحد الأدنى للكمية
-                min_weight=100,     # الحد الأدنى للوزن
-                min_sales=500       # الحد الأدنى لإجمالي المبيعات
-            )
+            self.query_executor.submit('popular', self.fetch_popular_products, start_date, end_date)
             
-            # تحميل المنتجات الأقل مبيعاً
-            low_products = db.get_low_selling_products(
-                start_date=start_date,
-                end_date=end_date,
-                min_quantity=50,
-                min_weight=100,
-                min_sales=500
-            )
+        except Exception as e:
+            print(f"Error in load_popular_products: {str(e)}")
+            QMessageBox.critical(self, "خطأ", f"حدث خطأ أثناء تحميل البيانات: {str(e)}")
+
+    @staticmethod
+    def fetch_popular_products(reader, start_date, end_date):
+        """تحميل المنتجات الأكثر والأقل مبيعاً (ينفذ في الخيط الخلفي)"""
+        # تحميل المنتجات الأكثر مبيعاً
+        top_products = reader.get_top_products(
+            start_date=start_date,
+            end_date=end_date,
+            min_quantity=50,    # الحد الأدنى للكمية
+            min_weight=100,     # الحد الأدنى للوزن
+            min_sales=500       # الحد الأدنى لإجمالي المبيعات
+        )
+        
+        # تحميل المنتجات الأقل مبيعاً
+        low_products = reader.get_low_selling_products(
+            start_date=start_date,
+            end_date=end_date,
+            min_quantity=50,
+            min_weight=100,
+            min_sales=500
+        )
+        return top_products, low_products
+
+    def fill_popular_products(self, result):
+        """عرض المنتجات الأكثر والأقل مبيعاً"""
+        try:
+            top_products, low_products = result
             
             # عرض المنتجات الأكثر مبيعاً
             self.popular_products_table.setRowCount(len(top_products))
@@ -1073,7 +1235,7 @@ class ReportsWindow(QWidget):
                     avg_profit_item.setForeground(Qt.red)
                 
         except Exception as e:
-            print(f"Error in load_popular_products: {str(e)}")
+            print(f"Error in fill_popular_products: {str(e)}")
             QMessageBox.critical(self, "خطأ", f"حدث خطأ أثناء تحميل البيانات: {str(e)}")
             self.popular_products_table.setRowCount(0)
             self.low_demand_table.setRowCount(0)
@@ -1089,14 +1251,21 @@ class ReportsWindow(QWidget):
                 return
             
             # تحميل المنتجات الأقل مبيعاً
-            low_products = db.get_low_selling_products(
-                start_date=start_date,
-                end_date=end_date,
-                min_quantity=50,    # الحد الأدنى للكمية
-                min_weight=100,     # الحد الأدنى للوزن
-                min_sales=500       # الحد الأدنى لإجمالي المبيعات
+            self.query_executor.submit(
+                'low_demand', Database.get_low_selling_products,
+                start_date, end_date,
+                50,     # الحد الأدنى للكمية
+                100,    # الحد الأدنى للوزن
+                500     # الحد الأدنى لإجمالي المبيعات
             )
             
+        except Exception as e:
+            print(f"Error in load_low_demand_products: {str(e)}")
+            QMessageBox.critical(self, "خطأ", f"حدث خطأ أثناء تحميل البيانات: {str(e)}")
+
+    def fill_low_demand_products(self, low_products):
+        """عرض المنتجات الأقل مبيعاً"""
+        try:
             self.low_demand_table.setRowCount(len(low_products))
             
             for row, product in enumerate(low_products):
@@ -1122,7 +1291,7 @@ class ReportsWindow(QWidget):
                     avg_profit_item.setForeground(Qt.red)
                 
         except Exception as e:
-            print(f"Error in load_low_demand_products: {str(e)}")
+            print(f"Error in fill_low_demand_products: {str(e)}")
             QMessageBox.critical(self, "خطأ", f"حدث خطأ أثناء تحميل البيانات: {str(e)}")
             self.low_demand_table.setRowCount(0)
 
@@ -1139,8 +1308,14 @@ class ReportsWindow(QWidget):
                 return
                 
             # الحصول على بيانات تسليم الدرج
-            handovers = db.get_cash_drawer_handovers(start_date, end_date)
+            self.query_executor.submit('cash_drawer', Database.get_cash_drawer_handovers, start_date, end_date)
             
+        except Exception as e:
+            QMessageBox.critical(self, "خطأ", f"حدث خطأ أثناء تحميل بيانات تسليم الدرج: {str(e)}")
+
+    def fill_cash_drawer_table(self, handovers):
+        """عرض سجل تسليم وتسلم الدرج"""
+        try:
             # عرض عدد العمليات
             self.cash_drawer_summary.setText(f"إجمالي عمليات التسليم: {len(handovers)}")
             
@@ -1175,9 +1350,11 @@ class ReportsWindow(QWidget):
 
     def load_users_report(self):
         """تحميل بيانات المستخدمين"""
+        self.query_executor.submit('users', Database.get_all_users)
+
+    def fill_users_table(self, users):
+        """عرض بيانات المستخدمين"""
         try:
-            users = db.get_all_users()
-            
             self.users_table.setRowCount(len(users))
             
             for row, user in enumerate(users):
@@ -1225,7 +1402,23 @@ class ReportsWindow(QWidget):
                 return
                 
             # الحصول على بيانات الحضور والانصراف
-            attendance_records = db.get_attendance_report(start_date, end_date)
+            self.query_executor.submit('attendance', self.fetch_attendance, start_date, end_date)
+            
+        except Exception as e:
+            QMessageBox.critical(self, "خطأ", f"حدث خطأ أثناء تحميل بيانات الحضور والانصراف: {str(e)}")
+
+    @staticmethod
+    def fetch_attendance(reader, start_date, end_date):
+        """تحميل سجل الحضور وأوقات عمل المستخدمين (ينفذ في الخيط الخلفي)"""
+        attendance_records = reader.get_attendance_report(start_date, end_date)
+        # أوقات العمل لكل المستخدمين في استعلام واحد بدلاً من استعلام لكل صف
+        schedules = {user[0]: (user[4], user[5]) for user in reader.get_all_users()}
+        return attendance_records, schedules
+
+    def fill_attendance_table(self, result):
+        """عرض سجل الحضور والانصراف"""
+        try:
+            attendance_records, schedules = result
             
             # تحديث الجدول
             self.attendance_table.setRowCount(0)
@@ -1242,8 +1435,8 @@ class ReportsWindow(QWidget):
                 role = record[7]
                 
                 # الحصول على أوقات العمل المحددة للمستخدم
-                user_data = db.get_user_schedule(username)
-                if user_data:
+                user_data = schedules.get(username)
+                if user_data and user_data[0] and user_data[1]:
                     expected_start_hour = user_data[0]
                     expected_end_hour = user_data[1]
                 else:
@@ -1350,7 +1543,7 @@ class ReportsWindow(QWidget):
         """تنسيق الجدول بشكل موحد ومتناسق"""
         # تنسيق الجدول الرئيسي
         table.setStyleSheet("""
-            QTableWidget {
+            QTableView {
                 font-size: 14px;
                 alternate-background-color: #f8f9fa;
                 gridline-color: #dcdde1;
@@ -1358,7 +1551,7 @@ class ReportsWindow(QWidget):
                 border-radius: 4px;
                 padding: 5px;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 8px;
                 border-bottom: 1px solid #dcdde1;
             }
@@ -1374,7 +1567,7 @@ class ReportsWindow(QWidget):
             QHeaderView::section:last {
                 border-right: none;
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #3498db;
                 color: white;
             }
@@ -1393,12 +1586,12 @@ class ReportsWindow(QWidget):
         table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
         
         # تعيين الحد الأدنى لعرض الأعمدة
-        for i in range(table.columnCount()):
+        for i in range(table.model().columnCount()):
             table.setColumnWidth(i, 150)
         
         # تمكين اختيار الصفوف كاملة
-        table.setSelectionBehavior(QTableWidget.SelectRows)
-        table.setSelectionMode(QTableWidget.SingleSelection)
+        table.setSelectionBehavior(QTableView.SelectRows)
+        table.setSelectionMode(QTableView.SingleSelection)
         
         # تمكين الفرز بالنقر على رأس العمود
         table.setSortingEnabled(True)
@@ -1420,16 +1613,11 @@ class ReportsWindow(QWidget):
         item.setFont(font)
         return item
         
-    def show_invoice_details(self, row, column):
+    def show_invoice_details(self, index):
         """عرض تفاصيل الفاتورة"""
         try:
-            # التحقق من وجود عنصر في الصف المحدد
-            item = self.sales_table.item(row, 0)
-            if not item:
-                QMessageBox.warning(self, "تنبيه", "لا توجد تفاصيل لهذه الفاتورة")
-                return
-                
-            invoice_id = item.text()
+            # رقم الفاتورة من صف النموذج المحدد
+            invoice_id = self.sales_model.invoice_id(index.row())
             if not invoice_id:
                 QMessageBox.warning(self, "تنبيه", "رقم الفاتورة غير صحيح")
                 return
@@ -1561,6 +1749,26 @@ class ReportsWindow(QWidget):
             print(f"خطأ في عرض تفاصيل الفاتورة: {str(e)}")
             QMessageBox.critical(self, "خطأ", "حدث خطأ أثناء عرض تفاصيل الفاتورة")
 
+    def on_query_result(self, key, result):
+        """استقبال نتيجة استعلام من الخيط الخلفي وعرضها"""
+        handler = self.result_handlers.get(key)
+        if handler:
+            handler(result)
+
+    def on_query_failed(self, key, message):
+        print(f"خطأ في تحميل التقرير {key}: {message}")
+        if key == 'sales_page':
+            self.sales_model.page_failed()
+        QMessageBox.critical(self, "خطأ", f"حدث خطأ أثناء تحميل البيانات: {message}")
+
+    def on_query_progress(self, key, steps):
+        self.loading_label.setText(f"⏳ جاري تحميل البيانات... ({steps // 1000}K)")
+
+    def on_query_busy_changed(self, busy):
+        self.loading_label.setText("⏳ جاري تحميل البيانات...")
+        self.loading_label.setVisible(busy)
+
     def closeEvent(self, event):
+        self.query_executor.stop()
         self.closed_signal.emit()
         super().closeEvent(event)
\ No newline at end of file
@@ -1,16 +1,27 @@
 from PyQt5.QtWidgets import (QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout, 
-                            QLineEdit, QTableWidget, QTableWidgetItem, QInputDialog, 
+                            QLineEdit, QInputDialog, 
                             QFileDialog, QMessageBox, QComboBox, QGroupBox, QRadioButton,
-                            QCheckBox, QSpinBox, QDoubleSpinBox, QFrame)
-from PyQt5.QtCore import Qt, QTimer, pyqtSignal, QEvent
+                            QCheckBox, QSpinBox, QDoubleSpinBox, QFrame, QTableView,
+                            QShortcut, QListWidget, QListWidgetItem, QApplication)
+from PyQt5.QtCore import (Qt, QTimer, pyqtSignal, QEvent, QAbstractTableModel, QModelIndex,
+                          QObject)
 from PyQt5.QtPrintSupport import QPrinter, QPrintDialog, QPrinterInfo
-from PyQt5.QtGui import QTextDocument, QImage, QPixmap, QFocusEvent, QPainter, QFont
+from PyQt5.QtGui import (QTextDocument, QImage, QPixmap, QFocusEvent, QPainter, QFont, QKeySequence,
+                         QKeyEvent)
+from PyQt5 import sip
 from datetime import datetime
-from database import db
+from collections import OrderedDict, deque
+from database import db, normalize_arabic, barcode_misread
 import os
+import re
 import sys
-from PIL import Image, ImageDraw, ImageFont
+import time
 from escpos.printer import Usb
+from receipt import build_receipt, invoice_html
+from print_spooler import PrintSpooler
+
+# يظهر مكان رقم الفاتورة قبل إتمام البيع
+PENDING_INVOICE_LABEL = "يحدد عند إتمام البيع"
 
 class ExternalScannerInput(QLineEdit):
     """مربع نص معدل لاستقبال مدخلات من الماسح الخارجي"""
@@ -32,10 +43,6 @@ class ExternalScannerInput(QLineEdit):
                 border: 2px solid #2ecc71;
             }
         """)
-        self.last_scanned = ""
-        self.scan_timer = QTimer()
-        self.scan_timer.setInterval(100)  # 100ms delay between scans
-        self.scan_timer.timeout.connect(self.reset_last_scanned)
         self.installEventFilter(self)
     
     def eventFilter(self, obj, event):
@@ -45,19 +52,435 @@ class ExternalScannerInput(QLineEdit):
         return super().eventFilter(obj, event)
     
     def on_return_pressed(self):
-        """تنفذ عند الضغط على Enter (معظم الماسحات ترسل Enter تلقائياً بعد المسح)"""
+        """كود مكتوب يدوياً ثم Enter (مسح الماسح نفسه يصل عبر ScannerBurstFilter)"""
         scanned_text = self.text().strip()
-        if scanned_text and scanned_text != self.last_scanned:
-            self.last_scanned = scanned_text
+        if scanned_text:
             print(f"تم مسح الكود: {scanned_text}")
             self.scanComplete.emit(scanned_text)
-            self.scan_timer.start()
             self.clear()
-    
-    def reset_last_scanned(self):
-        """إعادة تعيين آخر مسح ضوئي للسماح بمسح نفس الكود مرة أخرى"""
-        self.scan_timer.stop()
-        self.last_scanned = ""
+
+class ScannerBurstFilter(QObject):
+    """تمييز مسح الماسح (لوحة مفاتيح سريعة) عن الكتابة اليدوية
+
+    الماسح يرسل حروف الكود متتالية بفاصل أقل من MAX_KEY_INTERVAL_MS ثم
+    Enter. المرشح يراقب كل ضغطات المفاتيح في نافذة البيع ونوافذها الحوارية:
+    كل حرف يُحجز لحظياً، فإذا تبعه حرف آخر بسرعة الماسح تُجمع الحروف ولا
+    تصل لأي مربع نص، وعند Enter يرسل الكود كاملاً بإشارة scanned. أما إذا
+    لم يتبعه حرف بسرعة (كتابة يدوية) فيُعاد إرساله للمكون الذي كان سيستقبله.
+    """
+    scanned = pyqtSignal(str)
+
+    MAX_KEY_INTERVAL_MS = 40
+    MIN_LENGTH = 4
+    TERMINATORS = (Qt.Key_Return, Qt.Key_Enter, Qt.Key_Tab)
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.window = window
+        self.buffer = []        # (المستقبل، المفتاح، التعديل، النص، التوقيت)
+        self.replaying = False
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(self.MAX_KEY_INTERVAL_MS)
+        self.flush_timer.timeout.connect(self.replay)
+
+    def watching(self):
+        """نافذة البيع أو نافذة حوار فتحتها (isAncestorOf يتوقف عند حدود النوافذ)"""
+        widget = QApplication.activeWindow()
+        while widget is not None:
+            if widget is self.window:
+                return True
+            widget = widget.parentWidget()
+        return False
+
+    @staticmethod
+    def event_time(event):
+        # توقيت الحدث من نظام التشغيل أدق من وقت معالجته إذا كانت الواجهة مشغولة
+        return event.timestamp() or int(time.monotonic() * 1000)
+
+    def eventFilter(self, obj, event):
+        if self.replaying or event.type() != QEvent.KeyPress or not obj.isWidgetType():
+            return False
+        if not self.watching():
+            return False
+
+        now = self.event_time(event)
+        in_burst = bool(self.buffer) and now - self.buffer[-1][4] <= self.MAX_KEY_INTERVAL_MS
+        if event.key() in self.TERMINATORS:
+            if in_burst and len(self.buffer) >= self.MIN_LENGTH:
+                self.flush_timer.stop()
+                code = "".join(entry[3] for entry in self.buffer)
+                self.buffer = []
+                print(f"تم مسح الكود: {code}")
+                self.scanned.emit(code)
+                return True
+            self.replay()
+            return False
+
+        text = event.text()
+        if (not text or not text.isprintable()
+                or event.modifiers() & (Qt.ControlModifier | Qt.AltModifier)):
+            self.replay()
+            return False
+
+        if self.buffer and not in_burst:
+            self.replay()
+        self.buffer.append((obj, event.key(), event.modifiers(), text, now))
+        self.flush_timer.start()
+        return True
+
+    def replay(self):
+        """إعادة الحروف المحجوزة لمستقبليها الأصليين بنفس الترتيب"""
+        self.flush_timer.stop()
+        buffer, self.buffer = self.buffer, []
+        self.replaying = True
+        try:
+            for receiver, key, modifiers, text, _ in buffer:
+                if sip.isdeleted(receiver):
+                    continue
+                QApplication.sendEvent(receiver, QKeyEvent(QEvent.KeyPress, key, modifiers, text))
+        finally:
+            self.replaying = False
+
+class ProductSearchBox(QWidget):
+    """بحث فوري عن المنتجات بالاسم أثناء الكتابة
+
+    الاستعلام يرسل بعد توقف الكتابة لفترة قصيرة فقط، وعدد النتائج محدود.
+    النتائج تحفظ لكل نص بحث، فإذا كانت نتائج البداية كاملة (أقل من الحد)
+    تُفلتر نتائج النص الأطول منها بدون الرجوع لقاعدة البيانات. هذا فقط
+    عندما تأتي النتائج من الفهرس (FTS) بمطابقة بداية الكلمات؛ البحث البديل
+    بـ LIKE يطابق أي جزء من الاسم فيعاد الاستعلام معه دائماً.
+    """
+    product_chosen = pyqtSignal(str)   # كود المنتج المختار
+
+    DEBOUNCE_MS = 150
+    RESULT_LIMIT = 20
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.cache = {}   # النص المُطبع -> (النتائج، هل هي كل النتائج)
+        self.queries = 0
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.input = QLineEdit()
+        self.input.setPlaceholderText("اكتب اسم المنتج للبحث...")
+        self.input.setStyleSheet("""
+            QLineEdit {
+                border: 2px solid #9b59b6;
+                border-radius: 5px;
+                padding: 6px;
+                font-size: 14px;
+            }
+        """)
+        self.input.textChanged.connect(self.on_text_changed)
+        self.input.returnPressed.connect(self.choose_current)
+        self.input.installEventFilter(self)
+        layout.addWidget(self.input)
+
+        self.results = QListWidget()
+        self.results.setMaximumHeight(180)
+        self.results.itemActivated.connect(self.choose_item)
+        self.results.hide()
+        layout.addWidget(self.results)
+        self.setLayout(layout)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.DEBOUNCE_MS)
+        self.timer.timeout.connect(self.run_search)
+
+    def eventFilter(self, obj, event):
+        """الأسهم تتنقل بين النتائج دون ترك مربع البحث"""
+        if obj == self.input and event.type() == QEvent.KeyPress and self.results.count():
+            if event.key() in (Qt.Key_Down, Qt.Key_Up):
+                step = 1 if event.key() == Qt.Key_Down else -1
+                row = max(0, min(self.results.count() - 1, self.results.currentRow() + step))
+                self.results.setCurrentRow(row)
+                return True
+            if event.key() == Qt.Key_Escape:
+                self.clear()
+                return True
+        return super().eventFilter(obj, event)
+
+    def setFocus(self):
+        self.input.setFocus()
+        self.input.selectAll()
+
+    def clear(self):
+        self.timer.stop()
+        self.input.clear()
+        self.results.clear()
+        self.results.hide()
+        self.cache.clear()   # المخزون يتغير بعد البيع
+
+    def on_text_changed(self, text):
+        if text.strip():
+            self.timer.start()
+        else:
+            self.timer.stop()
+            self.results.clear()
+            self.results.hide()
+
+    def cached_results(self, key):
+        """نتائج النص من الذاكرة إن أمكن، من أطول بداية لها نتائج كاملة"""
+        if key in self.cache:
+            return self.cache[key][0]
+        words = key.split()
+        if not all(re.fullmatch(r'[^\W_]+', word) for word in words):
+            # الفهرس يقسم الكلمة التي فيها رموز (مثل "أ-ب") لعدة كلمات
+            return None
+        for end in range(len(key) - 1, 0, -1):
+            entry = self.cache.get(key[:end])
+            if entry and entry[1]:
+                return [row for row in entry[0] if self.matches(row[1], words)]
+        return None
+
+    @staticmethod
+    def matches(name, words):
+        # نفس قاعدة البحث المفهرس (unicode61): كل كلمة بداية لكلمة في الاسم
+        name_words = re.split(r'[\W_]+', normalize_arabic(name).lower())
+        return all(any(part.startswith(word) for part in name_words) for word in words)
+
+    def run_search(self):
+        key = " ".join(normalize_arabic(self.input.text()).lower().split())
+        if not key:
+            return
+        results = self.cached_results(key)
+        if results is None:
+            self.queries += 1
+            results = db.search_products(key, limit=self.RESULT_LIMIT)
+            complete = bool(db.product_search_fts) and len(results) < self.RESULT_LIMIT
+            self.cache[key] = (results, complete)
+        elif key not in self.cache:
+            # مجموعة جزئية من نتائج كاملة فهي كاملة أيضاً
+            self.cache[key] = (results, True)
+        self.show_results(results)
+
+    def show_results(self, results):
+        self.results.clear()
+        for code, name, price, quantity, weight, sell_by in results:
+            stock = f"{weight} كجم" if sell_by == 'weight' else f"{quantity}"
+            item = QListWidgetItem(f"{name} - {price} ج (المخزون: {stock})")
+            item.setData(Qt.UserRole, code)
+            self.results.addItem(item)
+        if results:
+            self.results.setCurrentRow(0)
+        self.results.setVisible(bool(results))
+
+    def choose_current(self):
+        # Enter قبل انتهاء مهلة الكتابة يبحث فوراً
+        if self.timer.isActive():
+            self.timer.stop()
+            self.run_search()
+        item = self.results.currentItem()
+        if item:
+            self.choose_item(item)
+
+    def choose_item(self, item):
+        self.product_chosen.emit(item.data(Qt.UserRole))
+        self.clear()
+
+class CartLine:
+    """سطر واحد في السلة
+
+    يستخدم __slots__ لتقليل حجم كل سطر، ويدعم item['code'] و item.get()
+    مثل القاموس حتى تعمل دوال الحفظ والطباعة كما هي.
+    """
+    __slots__ = ('code', 'name', 'price', 'quantity', 'weight', 'sell_by', 'total_price',
+                 'fixed_price', 'key', 'row')
+
+    def __init__(self, code, name, price, quantity=None, weight=None, sell_by='quantity', fixed_price=None):
+        self.code = code
+        self.name = name
+        self.price = price
+        self.quantity = quantity
+        self.weight = weight
+        self.sell_by = sell_by
+        # السعر المطبوع على ملصق الميزان (إن وجد) هو إجمالي السطر دائماً
+        self.fixed_price = fixed_price
+        self.key = None
+        self.row = None
+        self.recalculate()
+
+    @property
+    def mode(self):
+        """طريقة بيع السطر فعلياً: بالقطعة أو بالوزن"""
+        return 'weight' if self.weight and not self.quantity else 'quantity'
+
+    def recalculate(self):
+        if self.fixed_price is not None:
+            self.total_price = self.fixed_price
+        elif self.mode == 'weight':
+            self.total_price = self.price * (self.weight or 0)
+        else:
+            self.total_price = self.price * (self.quantity or 0)
+
+    @property
+    def piasters(self):
+        """إجمالي السطر بالقرش (عدد صحيح) لحساب مجموع السلة بدون أخطاء كسور"""
+        return int(round((self.total_price or 0) * 100))
+
+    def merge(self, other):
+        """إضافة كمية (أو وزن) سطر آخر لنفس المنتج لهذا السطر"""
+        if self.mode == 'weight':
+            self.weight = round((self.weight or 0) + (other.weight or 0), 3)
+        else:
+            self.quantity = (self.quantity or 0) + (other.quantity or 0)
+        self.recalculate()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+class CartTableModel(QAbstractTableModel):
+    """نموذج جدول السلة يضيف ويعدل ويحذف صفاً واحداً في كل مرة
+
+    بدلاً من مسح الجدول وإعادة بناء كل الخلايا عند كل مسح، يبلّغ النموذج
+    الجدول بالصف الذي تغير فقط. المجموع يُحدّث بفرق السطر الذي تغير فقط،
+    ويُحفظ بالقرش (عدد صحيح) حتى لا تتراكم أخطاء الكسور العشرية مع الإضافة
+    والحذف، ويُحول للجنيه عند العرض فقط.
+
+    مسح نفس المنتج مرة أخرى يزيد كمية سطره بدلاً من إضافة سطر جديد. الأسطر
+    محفوظة في OrderedDict بمفتاح (الكود، طريقة البيع) للبحث السريع، وفي
+    قائمة items بترتيب الصفوف للعرض. الأصناف الموزونة لا تُدمج افتراضياً
+    (merge_weighed=False) لأن كل وزنة لها ملصق وسعر مستقل.
+    """
+    HEADERS = ["م", "المنتج", "الكود", "السعر", "الكمية", "الوزن (كجم)", "الإجمالي"]
+
+    # يرسل المجموع الجديد بعد كل تغيير في السلة
+    totals_changed = pyqtSignal(float)
+
+    def __init__(self, parent=None, merge_weighed=False):
+        super().__init__(parent)
+        self.items = []
+        self.lines = OrderedDict()
+        self.merge_weighed = merge_weighed
+        self.line_counter = 0
+        self.total_piasters = 0
+
+    @property
+    def total(self):
+        return self.total_piasters / 100
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.items)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            item = self.items[index.row()]
+            column = index.column()
+            if column == 0:
+                return str(index.row() + 1)
+            if column == 1:
+                return item.name
+            if column == 2:
+                return item.code
+            if column == 3:
+                return f"{item.price:.2f} ج"
+            if column == 4:
+                return str(item.quantity) if item.quantity is not None else "-"
+            if column == 5:
+                return f"{item.weight:.3f}" if item.weight is not None else "-"
+            return f"{item.total_price:.2f} ج"
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def line_key(self, line):
+        if line.fixed_price is not None:
+            # ملصق بسعر ثابت لا يُدمج مع غيره
+            self.line_counter += 1
+            return (line.code, 'fixed', self.line_counter)
+        if line.mode == 'weight' and not self.merge_weighed:
+            # كل وزنة في سطر مستقل
+            self.line_counter += 1
+            return (line.code, 'weight', self.line_counter)
+        return (line.code, line.mode)
+
+    def add_line(self, line):
+        """إضافة سطر للسلة أو دمجه مع سطر نفس المنتج؛ يرجع رقم الصف"""
+        key = self.line_key(line)
+        existing = self.lines.get(key)
+        if existing is not None:
+            before = existing.piasters
+            existing.merge(line)
+            self.dataChanged.emit(self.index(existing.row, 0), self.index(existing.row, len(self.HEADERS) - 1))
+            self.update_total(existing.piasters - before)
+            return existing.row
+
+        row = len(self.items)
+        line.key = key
+        line.row = row
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.items.append(line)
+        self.lines[key] = line
+        self.endInsertRows()
+        self.update_total(line.piasters)
+        return row
+
+    def update_item(self, row, **changes):
+        """تعديل بيانات صنف موجود وإعادة رسم صفه فقط"""
+        item = self.items[row]
+        before = item.piasters
+        for name, value in changes.items():
+            setattr(item, name, value)
+        if 'total_price' not in changes:
+            item.recalculate()
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.HEADERS) - 1))
+        self.update_total(item.piasters - before)
+
+    def remove_item(self, row):
+        """حذف صنف من السلة"""
+        if not 0 <= row < len(self.items):
+            return None
+        self.beginRemoveRows(QModelIndex(), row, row)
+        item = self.items.pop(row)
+        del self.lines[item.key]
+        for later in self.items[row:]:
+            later.row -= 1
+        self.endRemoveRows()
+        # أرقام المسلسل للصفوف التالية تتغير بعد الحذف
+        if row < len(self.items):
+            self.dataChanged.emit(self.index(row, 0), self.index(len(self.items) - 1, 0))
+        self.update_total(-item.piasters)
+        return item
+
+    def clear(self):
+        self.beginResetModel()
+        self.items = []
+        self.lines = OrderedDict()
+        self.endResetModel()
+        self.total_piasters = 0
+        self.update_total(0)
+
+    def in_cart(self, code, mode):
+        """الكمية (أو الوزن) المحجوزة في السلة من منتج معين"""
+        if mode == 'quantity':
+            line = self.lines.get((code, 'quantity'))
+            return line.quantity if line else 0
+        return sum(line.weight or 0 for key, line in self.lines.items()
+                   if key[0] == code and key[1] == 'weight')
+
+    def update_total(self, delta):
+        """إضافة فرق سطر واحد (بالقرش) للمجموع"""
+        self.total_piasters += delta
+        self.totals_changed.emit(self.total)
 
 class SalesWindow(QWidget):
     # تعريف إشارة الإغلاق
@@ -69,7 +492,7 @@ class SalesWindow(QWidget):
         self.setGeometry(150, 150, 800, 700)
         self.setWindowFlags(self.windowFlags() | Qt.WindowMaximizeButtonHint | Qt.WindowMinimizeButtonHint)
         self.showMaximized()  # جعل النافذة مكبرة افتراضياً
-        self.cart = []
+        self.cart_model = CartTableModel(self)
         self.total = 0.0
         self.discount = 0.0
         self.net_total = 0.0
@@ -78,9 +501,36 @@ class SalesWindow(QWidget):
         # تهيئة الطابعة
         self.setup_printer()
         
+        # طابور الطباعة في الخلفية حتى لا ينتظر البيع التالي الطابعة
+        spool_dir = os.path.join(os.path.dirname(os.path.abspath(db.db_path)), 'print_spool')
+        self.print_spooler = PrintSpooler(spool_dir, self.thermal_printer, self.system_printer, self)
+        
         self.initUI()
+        self.print_spooler.queue_changed.connect(self.update_print_queue_label)
+        self.print_spooler.job_printed.connect(self.on_receipt_printed)
+        self.print_spooler.job_failed.connect(self.on_receipt_print_failed)
+        self.print_spooler.job_dropped.connect(self.on_receipt_print_dropped)
+        self.update_print_queue_label(self.print_spooler.pending())
+        if self.print_spooler.pending() and self.print_spooler.has_printer():
+            # فواتير لم تُطبع في التشغيل السابق
+            self.print_spooler.start()
+
+        # كل الأكواد (من الماسح أو المكتوبة يدوياً) تمر بطابور واحد بالترتيب
+        self.scan_queue = deque()
+        self.processing_scan = False
+        self.scan_queue_timer = QTimer(self)
+        self.scan_queue_timer.setInterval(100)
+        self.scan_queue_timer.timeout.connect(self.process_scan_queue)
+        self.scanner_filter = ScannerBurstFilter(self)
+        self.scanner_filter.scanned.connect(self.enqueue_scan)
+        QApplication.instance().installEventFilter(self.scanner_filter)
         QTimer.singleShot(500, self.ensure_scanner_focus)
 
+    @property
+    def cart(self):
+        """أصناف السلة بالترتيب (قائمة القواميس داخل نموذج الجدول)"""
+        return self.cart_model.items
+
     def setup_printer(self):
         """تهيئة الطابعة الحرارية"""
         try:
@@ -133,7 +583,8 @@ class SalesWindow(QWidget):
         layout.addWidget(title)
 
         # Invoice info
-        self.invoice_id = f"INV-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        # رقم الفاتورة يُحجز عند إتمام البيع (commit_sale) حتى يحمل وقت البيع
+        self.invoice_id = None
         self.date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
         invoice_layout = QVBoxLayout()
@@ -154,8 +605,8 @@ class SalesWindow(QWidget):
         info_layout = QVBoxLayout(info_frame)
         
         # إضافة معلومات الفاتورة
-        invoice_label = QLabel(f"رقم الفاتورة: {self.invoice_id}")
-        date_label = QLabel(f"التاريخ: {self.date}")
+        self.invoice_label = QLabel(f"رقم الفاتورة: {PENDING_INVOICE_LABEL}")
+        self.date_label = QLabel(f"التاريخ: {self.date}")
         cashier_label = QLabel(f"اسم الكاشير: {self.username}")
         
         # تنسيق خاص للكاشير
@@ -169,8 +620,8 @@ class SalesWindow(QWidget):
             }
         """)
         
-        info_layout.addWidget(invoice_label)
-        info_layout.addWidget(date_label)
+        info_layout.addWidget(self.invoice_label)
+        info_layout.addWidget(self.date_label)
         info_layout.addWidget(cashier_label)
         
         invoice_layout.addWidget(info_frame)
@@ -200,12 +651,21 @@ class SalesWindow(QWidget):
         scanner_layout = QVBoxLayout()
         
         self.external_scanner_input = ExternalScannerInput()
-        self.external_scanner_input.scanComplete.connect(self.process_external_scan)
+        self.external_scanner_input.scanComplete.connect(self.enqueue_scan)
         scanner_layout.addWidget(self.external_scanner_input)
         
         scanner_group.setLayout(scanner_layout)
         layout.addWidget(scanner_group)
 
+        # البحث بالاسم للمنتجات التي ليس لها باركود
+        search_group = QGroupBox("البحث بالاسم")
+        search_layout = QVBoxLayout()
+        self.product_search_box = ProductSearchBox()
+        self.product_search_box.product_chosen.connect(self.enqueue_scan)
+        search_layout.addWidget(self.product_search_box)
+        search_group.setLayout(search_layout)
+        layout.addWidget(search_group)
+
         # Control buttons
         btn_layout = QHBoxLayout()
         buttons = [
@@ -234,11 +694,16 @@ class SalesWindow(QWidget):
         layout.addLayout(btn_layout)
 
         # Products table
-        self.product_table = QTableWidget()
-        self.product_table.setColumnCount(7)  # زيادة عدد الأعمدة
-        self.product_table.setHorizontalHeaderLabels(["م", "المنتج", "الكود", "السعر", "الكمية", "الوزن (كجم)", "الإجمالي"])
+        self.product_table = QTableView()
+        self.product_table.setModel(self.cart_model)
         self.product_table.horizontalHeader().setStretchLastSection(True)
-        self.product_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.product_table.setEditTriggers(QTableView.NoEditTriggers)
+        self.product_table.setSelectionBehavior(QTableView.SelectRows)
+        self.product_table.setSelectionMode(QTableView.SingleSelection)
+        self.cart_model.totals_changed.connect(self.calculate_totals)
+        # حذف الصنف المحدد من السلة بزر Delete
+        delete_shortcut = QShortcut(QKeySequence.Delete, self.product_table)
+        delete_shortcut.activated.connect(self.remove_selected_item)
         layout.addWidget(self.product_table)
 
         # Invoice summary
@@ -254,39 +719,108 @@ class SalesWindow(QWidget):
         layout.addLayout(summary_layout)
 
         # Print button
+        print_layout = QHBoxLayout()
         print_btn = QPushButton("🖨️ طباعة الفاتورة")
         print_btn.clicked.connect(self.print_invoice)
-        layout.addWidget(print_btn)
+        print_layout.addWidget(print_btn)
+        
+        # عدد الفواتير في انتظار الطباعة
+        self.print_queue_label = QLabel()
+        print_layout.addWidget(self.print_queue_label)
+        layout.addLayout(print_layout)
 
         self.setLayout(layout)
     
+    def update_print_queue_label(self, depth):
+        if depth:
+            self.print_queue_label.setText(f"🖨️ في انتظار الطباعة: {depth}")
+            self.print_queue_label.setStyleSheet("color: #e67e22; font-weight: bold;")
+        else:
+            self.print_queue_label.setText("🖨️ لا توجد فواتير في انتظار الطباعة")
+            self.print_queue_label.setStyleSheet("color: #27ae60;")
+
+    def on_receipt_printed(self, invoice_id):
+        if self.thermal_printer and self.print_spooler.text_mode:
+            text_receipt = self.print_spooler.text_receipt
+            print(f"تمت طباعة الفاتورة {invoice_id} ({text_receipt.last_bytes} بايت في {text_receipt.last_ms:.1f} مللي ثانية)")
+        elif self.thermal_printer:
+            print(f"تمت طباعة الفاتورة {invoice_id} (زمن الرسم: {self.print_spooler.renderer.last_render_ms:.1f} مللي ثانية)")
+        else:
+            print(f"تمت طباعة الفاتورة {invoice_id}")
+
+    def on_receipt_print_failed(self, invoice_id, message):
+        print(f"فشل طباعة الفاتورة {invoice_id}: {message} - ستتم إعادة المحاولة")
+        self.print_queue_label.setText(
+            f"⚠️ الطابعة غير متاحة، إعادة المحاولة... ({self.print_spooler.pending()} في الانتظار)"
+        )
+        self.print_queue_label.setStyleSheet("color: #e74c3c; font-weight: bold;")
+
+    def on_receipt_print_dropped(self, invoice_id, message):
+        print(f"تعذرت طباعة الفاتورة {invoice_id}: {message} - نُقلت لمجلد failed")
+        self.print_queue_label.setText(f"⚠️ تعذرت طباعة الفاتورة {invoice_id}")
+        self.print_queue_label.setStyleSheet("color: #e74c3c; font-weight: bold;")
+
+    def build_receipt(self):
+        """نسخة ثابتة من الفاتورة الحالية للطباعة"""
+        return build_receipt(
+            self.invoice_id or "-", self.date, self.username, self.member_input.text(),
+            self.cart, self.total, self.discount, self.net_total
+        )
+
     def ensure_scanner_focus(self):
         self.external_scanner_input.setFocus()
         print("تم إعادة تركيز الماسح الضوئي")
 
+    def enqueue_scan(self, code):
+        """إضافة كود لطابور المسح؛ يعالج فوراً إلا إذا كانت هناك نافذة حوار مفتوحة"""
+        self.scan_queue.append(code)
+        QTimer.singleShot(0, self.process_scan_queue)
+
+    def process_scan_queue(self):
+        if self.processing_scan:
+            # مسح أثناء نافذة كمية أو تحذير: يعالج بعد الكود الحالي
+            return
+        if QApplication.activeModalWidget() is not None:
+            # نافذة حوار من خارج المسح (مثل رسالة إتمام البيع)
+            self.scan_queue_timer.start()
+            return
+        self.scan_queue_timer.stop()
+        self.processing_scan = True
+        try:
+            while self.scan_queue:
+                self.process_external_scan(self.scan_queue.popleft())
+        finally:
+            self.processing_scan = False
+
     def process_external_scan(self, code):
         """معالجة مسح الكود - نسخة مبسطة"""
         if not code:
             return
             
         try:
-            # 1. جلب المنتج بشكل محدد
-            db.cursor.execute("""
-                SELECT 
-                    code,
-                    name,
-                    price,
-                    quantity,
-                    weight,
-                    sell_by,
-                    safe_limit
-                FROM products 
-                WHERE code = ?
-            """, (code,))
-            
-            product = db.cursor.fetchone()
+            # 1. ملصق ميزان (بادئة 2x معرفة): رقم الصنف والوزن (أو السعر) داخل
+            # الباركود، فلا داعي للبحث عن الكود الكامل في الذاكرة أو قاعدة البيانات
+            # (code, name, price, quantity, weight, sell_by, safe_limit, ...)
+            product = None
+            scale_label = db.scale_barcodes.decode(code)
+            if scale_label:
+                product = db.get_scale_product(scale_label['plu'])
+                if not product:
+                    # ليس صنفاً موزوناً معروفاً: نبحث عن الكود كما هو
+                    scale_label = None
+            if not product:
+                # جلب المنتج من الذاكرة المؤقتة للمنتجات
+                product = db.product_cache.get(code)
             if not product:
-                QMessageBox.warning(self, "خطأ", "لم يتم العثور على المنتج")
+                # محاولة مطابقة صيغة أخرى للباركود (بأصفار بادئة أو بدونها)
+                match = db.get_product_by_barcode(code)
+                if match:
+                    product = db.product_cache.get(match[0])
+            if not product:
+                if barcode_misread(code):
+                    QMessageBox.warning(self, "خطأ", "الباركود غير صحيح (رقم التحقق)، أعد المسح")
+                else:
+                    QMessageBox.warning(self, "خطأ", "لم يتم العثور على المنتج")
                 return
                 
             # 2. تحويل البيانات الأساسية
@@ -298,13 +832,34 @@ class SalesWindow(QWidget):
             sell_by = str(product[5]) if product[5] is not None else 'quantity'
             safe_limit = int(product[6]) if product[6] is not None else 0
             
+            # المتاح للبيع بعد خصم ما في السلة بالفعل من نفس المنتج
+            current_quantity -= self.cart_model.in_cart(code, 'quantity')
+            current_weight -= self.cart_model.in_cart(code, 'weight')
+            
             # 3. حساب السعر الإجمالي
             total = 0
             quantity = None
             weight = None
             
             # 4. طلب الكمية أو الوزن
-            if sell_by == 'quantity':
+            if scale_label:
+                # الوزن من الملصق مباشرة بدون إدخال يدوي
+                if sell_by == 'quantity' or price <= 0:
+                    QMessageBox.warning(self, "خطأ", f"المنتج {name} لا يباع بالوزن!")
+                    return
+                if scale_label['kind'] == 'weight':
+                    weight = round(scale_label['value'], 3)
+                else:
+                    weight = round(scale_label['value'] / price, 3)
+                if weight <= 0:
+                    QMessageBox.warning(self, "خطأ", "ملصق الميزان لا يحتوي على وزن!")
+                    return
+                if weight > current_weight:
+                    QMessageBox.warning(self, "خطأ", f"الوزن المتاح في المخزون: {current_weight:.3f} كجم فقط!")
+                    return
+                total = price * weight if scale_label['kind'] == 'weight' else scale_label['value']
+
+            elif sell_by == 'quantity':
                 # التحقق من وجود كمية متاحة للبيع
                 if current_quantity <= 0:
                     QMessageBox.warning(self, "خطأ", "لا توجد كمية متاحة من هذا المنتج في المخزون!")
@@ -471,21 +1026,14 @@ class SalesWindow(QWidget):
                     weight = w
                     total = price * w
             
-            # 5. إضافة للسلة
-            item = {
-                'code': code,
-                'name': name,
-                'price': price,
-                'quantity': quantity,
-                'weight': weight,
-                'sell_by': sell_by,
-                'total_price': total
-            }
-        
-            print(f"إضافة منتج للسلة: {item}")  # للتأكد من البيانات
-            self.cart.append(item)
-            self.update_cart_display()
-            QMessageBox.information(self, "تم", "تمت إضافة المنتج بنجاح")
+            # 5. إضافة للسلة (أو زيادة كمية سطر نفس المنتج)
+            # السعر المطبوع على الملصق هو المطلوب وليس الوزن المقرب × السعر
+            fixed_price = total if scale_label and scale_label['kind'] == 'price' else None
+            line = CartLine(code, name, price, quantity, weight, sell_by, fixed_price)
+            row = self.cart_model.add_line(line)
+            print(f"إضافة منتج للسلة: {code} {name} الإجمالي {total:.2f} (سطر {row + 1})")  # للتأكد من البيانات
+            if not scale_label:
+                QMessageBox.information(self, "تم", "تمت إضافة المنتج بنجاح")
             
         except Exception as e:
             print(f"خطأ: {str(e)}")
@@ -499,267 +1047,23 @@ class SalesWindow(QWidget):
             self.external_scanner_input.setFocus()
 
     def search_product(self):
-        """البحث عن منتج وإضافته للسلة"""
-        try:
-            name, ok = QInputDialog.getText(self, "بحث عن منتج", "أدخل اسم المنتج:")
-            if ok and name:
-                products = db.get_all_products()
-                matched = [p for p in products if name.lower() in p[1].lower()]
-                
-                if not matched:
-                    QMessageBox.warning(self, "تحذير", "لا يوجد منتج بهذا الاسم!")
-                    return
-                    
-                if len(matched) == 1:
-                    self.process_external_scan(matched[0][0])  # استخدام نفس دالة المسح الضوئي
-                else:
-                    # تحسين عرض المنتجات المتطابقة ليشمل المخزون المتاح
-                    items = [f"{p[1]} (كود: {p[0]}) - المخزون المتاح: {p[3]}" for p in matched]
-                    item, ok = QInputDialog.getItem(self, "اختر منتج", "المنتجات المتطابقة:", items, 0, False)
-                    if ok and item:
-                        code = item.split("كود: ")[1].split(")")[0]
-                        self.process_external_scan(code)  # استخدام نفس دالة المسح الضوئي
-                        
-        except Exception as e:
-            print(f"خطأ في البحث عن منتج: {str(e)}")
-            import traceback
-            print(traceback.format_exc())
-            QMessageBox.critical(self, "خطأ", f"حدث خطأ أثناء البحث عن المنتج: {str(e)}")
+        """الانتقال لمربع البحث بالاسم"""
+        self.product_search_box.setFocus()
 
-    def add_product_to_cart(self, code, quantity=None):
-        try:
-            # البحث عن المنتج في قاعدة البيانات
-            db.cursor.execute("""
-                SELECT name, price, quantity, weight, sell_by, price_type, safe_limit 
-                FROM products WHERE code = ?
-            """, (code,))
-            product = db.cursor.fetchone()
-            
-            if not product:
-                QMessageBox.warning(self, "خطأ", "لم يتم العثور على المنتج!")
-                return
-                
-            name, price, current_quantity, weight, sell_by, price_type, safe_limit = product
-            
-            # التحقق من طريقة البيع
-            if sell_by == 'quantity':
-                # التحقق من وجود كمية متاحة للبيع
-                if current_quantity <= 0:
-                    QMessageBox.warning(self, "خطأ", "لا توجد كمية متاحة من هذا المنتج في المخزون!")
-                    return
-                    
-                if quantity is None:
-                    quantity, ok = QInputDialog.getInt(self, "إدخال الكمية", "أدخل الكمية المطلوبة:", 1, 1)
-                    if not ok:
-                        return
-                        
-                if quantity > current_quantity:
-                    QMessageBox.warning(self, "خطأ", "الكمية المطلوبة غير متوفرة في المخزون!")
-                    return
-                    
-                # التحقق من الحد الأمن
-                remaining_quantity = current_quantity - quantity
-                if remaining_quantity <= safe_limit:
-                    warning_msg = f"تنبيه: الكمية المتبقية ({remaining_quantity}) وصلت إلى أو أقل من الحد الأمن ({safe_limit})"
-                    if remaining_quantity == 0:
-                        warning_msg += "\nلا يمكن بيع المزيد من هذا المنتج!"
-                    response = QMessageBox.warning(self, "تحذير المخزون", 
-                                                warning_msg + "\n\nهل تريد المتابعة؟",
-                                                QMessageBox.Yes | QMessageBox.No)
-                    if response == QMessageBox.No:
-                        return
-                
-                total_price = price * quantity
-                
-                # إضافة المنتج إلى السلة
-                self.cart.append({
-                    'code': code,
-                    'name': name,
-                    'price': price,
-                    'quantity': quantity,
-                    'weight': 0,
-                    'total': total_price
-                })
-                
-            elif sell_by == 'weight':
-                # التحقق من وجود وزن متاح للبيع
-                if weight <= 0:
-                    QMessageBox.warning(self, "خطأ", "لا يوجد وزن متاح من هذا المنتج في المخزون!")
-                    return
-                    
-                weight_input, ok = QInputDialog.getDouble(self, "إدخال الوزن", 
-                                                        "أدخل الوزن المطلوب (كجم):", 0.1, 0.001, 1000, 3)
-                if not ok:
-                    return
-                    
-                if weight_input > weight:
-                    QMessageBox.warning(self, "خطأ", "الوزن المطلوب غير متوفر في المخزون!")
-                    return
-                    
-                # التحقق من الحد الأمن للوزن
-                remaining_weight = weight - weight_input
-                if remaining_weight <= safe_limit:
-                    warning_msg = f"تنبيه: الوزن المتبقي ({remaining_weight:.3f} كجم) وصل إلى أو أقل من الحد الأمن ({safe_limit} كجم)"
-                    if remaining_weight == 0:
-                        warning_msg += "\nلا يمكن بيع المزيد من هذا المنتج!"
-                    response = QMessageBox.warning(self, "تحذير المخزون", 
-                                                warning_msg + "\n\nهل تريد المتابعة؟",
-                                                QMessageBox.Yes | QMessageBox.No)
-                    if response == QMessageBox.No:
-                        return
-                
-                total_price = price * weight_input
-                
-                # إضافة المنتج إلى السلة
-                self.cart.append({
-                    'code': code,
-                    'name': name,
-                    'price': price,
-                    'quantity': 0,
-                    'weight': weight_input,
-                    'total': total_price
-                })
-                
-            else:  # both
-                # التحقق من وجود كمية أو وزن متاح للبيع
-                if current_quantity <= 0 and weight <= 0:
-                    QMessageBox.warning(self, "خطأ", "لا توجد كمية أو وزن متاح من هذا المنتج في المخزون!")
-                    return
-                
-                # تحديد خيارات البيع المتاحة بناءً على المخزون
-                available_options = []
-                if current_quantity > 0:
-                    available_options.append("بالقطعة")
-                if weight > 0:
-                    available_options.append("بالوزن")
-                
-                if len(available_options) == 1:
-                    # إذا كان هناك خيار واحد فقط متاح
-                    choice = 0 if available_options[0] == "بالقطعة" else 1
-                else:
-                    # السماح للمستخدم باختيار طريقة البيع
-                    options = "|".join(available_options)
-                    choice = QMessageBox.question(self, "اختيار طريقة البيع",
-                                               "كيف تريد بيع هذا المنتج؟",
-                                               options, 0, 1)
-                
-                if (choice == 0 and "بالقطعة" in available_options) or (available_options[0] == "بالقطعة" and len(available_options) == 1):  # بالقطعة
-                    quantity, ok = QInputDialog.getInt(self, "إدخال الكمية", "أدخل الكمية المطلوبة:", 1, 1)
-                    if not ok:
-                        return
-                        
-                    if quantity > current_quantity:
-                        QMessageBox.warning(self, "خطأ", "الكمية المطلوبة غير متوفرة في المخزون!")
-                        return
-                        
-                    # التحقق من الحد الأمن
-                    remaining_quantity = current_quantity - quantity
-                    if remaining_quantity <= safe_limit:
-                        warning_msg = f"تنبيه: الكمية المتبقية ({remaining_quantity}) وصلت إلى أو أقل من الحد الأمن ({safe_limit})"
-                        if remaining_quantity == 0:
-                            warning_msg += "\nلا يمكن بيع المزيد من هذا المنتج!"
-                        response = QMessageBox.warning(self, "تحذير المخزون", 
-                                                    warning_msg + "\n\nهل تريد المتابعة؟",
-                                                    QMessageBox.Yes | QMessageBox.No)
-                        if response == QMessageBox.No:
-                            return
-                    
-                    total_price = price * quantity
-                    
-                    self.cart.append({
-                        'code': code,
-                        'name': name,
-                        'price': price,
-                        'quantity': quantity,
-                        'weight': 0,
-                        'total': total_price
-                    })
-                    
-                else:  # بالوزن
-                    weight_input, ok = QInputDialog.getDouble(self, "إدخال الوزن", 
-                                                            "أدخل الوزن المطلوب (كجم):", 0.1, 0.001, 1000, 3)
-                    if not ok:
-                        return
-                        
-                    if weight_input > weight:
-                        QMessageBox.warning(self, "خطأ", "الوزن المطلوب غير متوفر في المخزون!")
-                        return
-                        
-                    # التحقق من الحد الأمن للوزن
-                    remaining_weight = weight - weight_input
-                    if remaining_weight <= safe_limit:
-                        warning_msg = f"تنبيه: الوزن المتبقي ({remaining_weight:.3f} كجم) وصل إلى أو أقل من الحد الأمن ({safe_limit} كجم)"
-                        if remaining_weight == 0:
-                            warning_msg += "\nلا يمكن بيع المزيد من هذا المنتج!"
-                        response = QMessageBox.warning(self, "تحذير المخزون", 
-                                                    warning_msg + "\n\nهل تريد المتابعة؟",
-                                                    QMessageBox.Yes | QMessageBox.No)
-                        if response == QMessageBox.No:
-                            return
-                    
-                    total_price = price * weight_input
-                    
-                    self.cart.append({
-                        'code': code,
-                        'name': name,
-                        'price': price,
-                        'quantity': 0,
-                        'weight': weight_input,
-                        'total': total_price
-                    })
-            
-            # تحديث عرض السلة والمجموع
-            self.update_cart_display()
-            self.calculate_totals()
-            
-            # تنظيف حقل الإدخال وإعادة التركيز
-            self.external_scanner_input.clear()
-            self.external_scanner_input.setFocus()
-            
-        except Exception as e:
-            QMessageBox.critical(self, "خطأ", f"حدث خطأ أثناء إضافة المنتج: {str(e)}")
-
-    def update_cart_display(self):
-        """تحديث عرض السلة"""
-        try:
-            self.product_table.setRowCount(0)
-            
-            for idx, item in enumerate(self.cart, 1):
-                row = self.product_table.rowCount()
-                self.product_table.insertRow(row)
-                
-                # تحضير القيم للعرض
-                quantity_display = str(item.get('quantity', '-'))
-                weight_display = f"{item.get('weight', 0):.3f}" if item.get('weight') is not None else "-"
-                total_price = item.get('total_price', 0)
-                
-                items = [
-                    QTableWidgetItem(str(idx)),
-                    QTableWidgetItem(item.get('name', '')),
-                    QTableWidgetItem(item.get('code', '')),
-                    QTableWidgetItem(f"{item.get('price', 0):.2f} ج"),
-                    QTableWidgetItem(quantity_display),
-                    QTableWidgetItem(weight_display),
-                    QTableWidgetItem(f"{total_price:.2f} ج")
-                ]
-                
-                for i, table_item in enumerate(items):
-                    table_item.setTextAlignment(Qt.AlignCenter)
-                    self.product_table.setItem(row, i, table_item)
-            
-            self.calculate_totals()
-            
-        except Exception as e:
-            print(f"خطأ في تحديث عرض السلة: {str(e)}")
-            import traceback
-            print(traceback.format_exc())
+    def remove_selected_item(self):
+        """حذف الصنف المحدد في جدول السلة"""
+        rows = self.product_table.selectionModel().selectedRows()
+        if rows:
+            self.cart_model.remove_item(rows[0].row())
+        self.external_scanner_input.setFocus()
 
-    def calculate_totals(self):
+    def calculate_totals(self, total=None):
         """حساب المجاميع"""
         try:
-            self.total = sum(item.get('total_price', 0) for item in self.cart)
-            self.discount = self.total * 0.0  # يمكن تعديل نسبة الخصم هنا
-            self.net_total = self.total - self.discount
+            # المجموع يحدّثه نموذج السلة مع كل إضافة أو تعديل أو حذف
+            self.total = round(self.cart_model.total if total is None else total, 2)
+            self.discount = round(self.total * 0.0, 2)  # يمكن تعديل نسبة الخصم هنا
+            self.net_total = round(self.total - self.discount, 2)
             
             self.total_label.setText(f"المجموع: {self.total:.2f} ج")
             self.discount_label.setText(f"الخصم: {self.discount:.2f} ج (0%)")
@@ -770,8 +1074,7 @@ class SalesWindow(QWidget):
             print(traceback.format_exc())
 
     def clear_cart(self):
-        self.cart = []
-        self.update_cart_display()
+        self.cart_model.clear()
         QMessageBox.information(self, "تم", "تم مسح السلة بنجاح")
         self.external_scanner_input.setFocus()
 
@@ -790,28 +1093,31 @@ class SalesWindow(QWidget):
         
         if reply == QMessageBox.Yes:
             try:
-                db.conn.execute("BEGIN TRANSACTION")
-                
-                db.cursor.execute('''INSERT INTO invoices 
-                                  (invoice_id, date, customer_id, cashier_username, total, discount, net_total)
-                                  VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                                (self.invoice_id, self.date, 
-                                 self.member_input.text() or None,
-                                 self.username,  # Add cashier username
-                                 self.total, self.discount, self.net_total))
-
-                for item in self.cart:
-                    db.cursor.execute('''INSERT INTO invoice_items 
-                                      (invoice_id, product_code, product_name, price, quantity, weight, total_price)
-                                      VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                                    (self.invoice_id, item['code'], item['name'], 
-                                     item['price'], item['quantity'], item.get('weight', 0), item['total_price']))
-                    
-                    if item['quantity'] is not None:
-                        db.cursor.execute("UPDATE products SET quantity = quantity - ? WHERE code = ?",
-                                        (item['quantity'], item['code']))
+                # تاريخ الفاتورة هو وقت إتمام البيع
+                self.date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                success, result = db.commit_sale(
+                    None, self.date,
+                    self.member_input.text() or None,
+                    self.total, self.discount, self.net_total,
+                    self.cart,
+                    self.username
+                )
+                if not success:
+                    QMessageBox.critical(
+                        self, 
+                        "فشل في إتمام العملية", 
+                        f"حدث خطأ أثناء محاولة إتمام البيع:\n{result}\n\nتم التراجع عن جميع التغييرات"
+                    )
+                    return
+                self.invoice_id = result['invoice_id']
+                print(f"تم حفظ الفاتورة {self.invoice_id} في {result['total_ms']:.1f} مللي ثانية "
+                      f"({result['lines']} صنف)")
                 
-                db.conn.commit()
+                # طباعة الفاتورة تلقائيًا بعد إتمام البيع في الخلفية
+                # (قبل رسالة النجاح حتى تبدأ الطباعة دون انتظار الكاشير)
+                if not self.print_spooler.submit(self.build_receipt()):
+                    self.print_queue_label.setText("⚠️ لا توجد طابعة معدة، لم تتم طباعة الفاتورة")
+                    self.print_queue_label.setStyleSheet("color: #e74c3c; font-weight: bold;")
                 
                 QMessageBox.information(
                     self, 
@@ -819,19 +1125,17 @@ class SalesWindow(QWidget):
                     f"تم إتمام عملية البيع بنجاح\nرقم الفاتورة: {self.invoice_id}\nالمبلغ الإجمالي: {self.net_total:.2f} جنيهاً"
                 )
                 
-                # طباعة الفاتورة تلقائيًا بعد إتمام البيع
-                self.print_invoice(direct_print=True)
-                
                 self.clear_cart()
-                self.invoice_id = f"INV-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+                self.invoice_id = None
                 self.date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                self.invoice_label.setText(f"رقم الفاتورة: {PENDING_INVOICE_LABEL}")
+                self.date_label.setText(f"التاريخ: {self.date}")
                 
             except Exception as e:
-                db.conn.rollback()
                 QMessageBox.critical(
                     self, 
                     "فشل في إتمام العملية", 
-                    f"حدث خطأ أثناء محاولة إتمام البيع:\n{str(e)}\n\nتم التراجع عن جميع التغييرات"
+                    f"حدث خطأ أثناء محاولة إتمام البيع:\n{str(e)}"
                 )
 
     def print_invoice(self, direct_print=False):
@@ -841,35 +1145,16 @@ class SalesWindow(QWidget):
             return
         
         try:
-            # محاولة الطباعة على الطابعة الحرارية أولاً
-            if self.print_thermal_invoice():
-                if direct_print:
-                    QMessageBox.information(self, "تم", "تم طباعة الفاتورة بنجاح على الطابعة الحرارية")
-                else:
-                    QMessageBox.information(self, "تم", "تم إرسال الفاتورة للطابعة الحرارية بنجاح")
-                return
-                
-            # إذا فشلت الطباعة الحرارية، نستخدم الطابعة العادية
-            doc = QTextDocument()
-            doc.setHtml(self.generate_invoice_html())
-            
-            # ضبط إعدادات الطابعة العادية
-            self.system_printer.setPageSize(QPrinter.A5)
-            self.system_printer.setFullPage(True)
-            
-            # عرض مربع حوار الطباعة إذا لم يكن طباعة مباشرة
-            if not direct_print:
+            # اختيار الطابعة العادية قبل إرسال الفاتورة (الحرارية لا تحتاج ذلك)
+            if not self.thermal_printer and not direct_print:
                 print_dialog = QPrintDialog(self.system_printer, self)
                 if print_dialog.exec_() != QPrintDialog.Accepted:
                     return
             
-            # تنفيذ الطباعة
-            doc.print_(self.system_printer)
-            
-            if direct_print:
-                QMessageBox.information(self, "تم", "تم طباعة الفاتورة بنجاح")
-            else:
-                QMessageBox.information(self, "تم", "تم إرسال الفاتورة للطباعة بنجاح")
+            # الطباعة اليدوية تمر بنفس طابور الطباعة فلا تنتظر النافذة الطابعة
+            if not self.print_spooler.submit(self.build_receipt()):
+                raise RuntimeError("لا توجد طابعة معدة")
+            QMessageBox.information(self, "تم", "تم إرسال الفاتورة للطباعة")
                 
         except Exception as e:
             QMessageBox.critical(self, "خطأ في الطباعة", f"حدث خطأ أثناء محاولة الطباعة:\n{str(e)}")
@@ -881,169 +1166,8 @@ class SalesWindow(QWidget):
             except Exception as e2:
                 QMessageBox.critical(self, "خطأ", f"فشل في حفظ الفاتورة كصورة:\n{str(e2)}")
 
-    def print_thermal_invoice(self):
-        """طباعة الفاتورة على الطابعة الحرارية"""
-        if not self.thermal_printer:
-            return False
-            
-        try:
-            # إنشاء صورة الفاتورة
-            img_width = 384  # مناسب للطابعات 80mm
-            img_height = 600  # ارتفاع مناسب للفاتورة
-            image = Image.new('RGB', (img_width, img_height), 'white')
-            draw = ImageDraw.Draw(image)
-            
-            # تحميل خط عربي (يجب تثبيت الخط في النظام)
-            try:
-                font_path = "/usr/share/fonts/truetype/noto/NotoNaskhArabic-Regular.ttf"
-                font = ImageFont.truetype(font_path, 20)
-                bold_font = ImageFont.truetype(font_path, 24)
-                title_font = ImageFont.truetype(font_path, 28)
-            except:
-                # إذا لم يتم العثور على الخط العربي، نستخدم خط افتراضي (قد لا يدعم العربية جيداً)
-                font = ImageFont.load_default()
-                bold_font = ImageFont.load_default()
-                title_font = ImageFont.load_default()
-            
-            # كتابة محتوى الفاتورة
-            y = 10
-            
-            # عنوان المتجر
-            draw.text((img_width - 10, y), "منفذ الشهداء", font=title_font, fill="black", anchor="ra")
-            y += 40
-            
-            # معلومات الفاتورة
-            draw.text((img_width - 10, y), f"فاتورة رقم: {self.invoice_id}", font=bold_font, fill="black", anchor="ra")
-            y += 30
-            draw.text((img_width - 10, y), f"التاريخ: {self.date}", font=font, fill="black", anchor="ra")
-            y += 30
-            draw.text((img_width - 10, y), f"الكاشير: {self.username}", font=font, fill="black", anchor="ra")
-            y += 30
-            
-            # معلومات العضو
-            if self.member_input.text():
-                draw.text((img_width - 10, y), f"رقم العضوية: {self.member_input.text()}", font=font, fill="black", anchor="ra")
-                y += 30
-            
-            # خط فاصل
-            draw.line((10, y, img_width - 10, y), fill="black", width=2)
-            y += 20
-            
-            # عناوين الأعمدة
-            headers = ["المنتج", "الكمية", "السعر", "الوزن", "الإجمالي"]
-            draw.text((img_width - 10, y), "  ".join(headers), font=bold_font, fill="black", anchor="ra")
-            y += 30
-            draw.line((10, y, img_width - 10, y), fill="black")
-            y += 10
-            
-            # تفاصيل المنتجات
-            for item in self.cart:
-                # اسم المنتج (مع تقصير إذا كان طويلاً)
-                product_name = item['name'][:15] + "..." if len(item['name']) > 15 else item['name']
-                
-                # تحضير عرض الكمية والوزن
-                quantity_display = str(item['quantity']) if item['quantity'] is not None else "-"
-                weight_display = f"{item['weight']:.3f}" if item.get('weight') is not None else "-"
-                
-                # كتابة بيانات المنتج في سطر واحد
-                line = f"{item['total_price']:.2f} ج  {item['price']:.2f} ج  {quantity_display}  {weight_display}  {product_name}"
-                draw.text((img_width - 10, y), line, font=font, fill="black", anchor="ra")
-                y += 30
-            
-            # خط فاصل
-            draw.line((10, y, img_width - 10, y), fill="black", width=2)
-            y += 20
-            
-            # المجاميع
-            draw.text((img_width - 10, y), f"المجموع: {self.total:.2f} ج", font=bold_font, fill="black", anchor="ra")
-            draw.text((img_width - 10, y), f"الخصم: {self.discount:.2f} ج", font=bold_font, fill="black", anchor="ra")
-            draw.text((img_width - 10, y), f"الصافي: {self.net_total:.2f} ج", font=title_font, fill="black", anchor="ra")
-            y += 40
-            
-            # رسالة الشكر
-            draw.text((img_width // 2, y), "شكراً لزيارتكم", font=bold_font, fill="black", anchor="ma")
-            y += 30
-            draw.text((img_width // 2, y), "نرجو زيارة متجرنا مرة أخرى", font=font, fill="black", anchor="ma")
-            
-            # قص الورق بعد الطباعة
-            self.thermal_printer.image(image)
-            self.thermal_printer.cut()
-            
-            return True
-            
-        except Exception as e:
-            print(f"خطأ في الطباعة الحرارية: {str(e)}")
-            return False
-
     def generate_invoice_html(self):
-        items_html = ""
-        for idx, item in enumerate(self.cart, 1):
-            quantity_display = str(item.get('quantity', '-'))
-            weight_display = f"{item.get('weight', 0):.3f}" if item.get('weight') is not None else "-"
-            items_html += f"""
-            <tr>
-                <td style="border: 1px solid #ddd; padding: 8px; text-align: center;">{idx}</td>
-                <td style="border: 1px solid #ddd; padding: 8px; text-align: right;">{item.get('name', '')}</td>
-                <td style="border: 1px solid #ddd; padding: 8px; text-align: center;">{item.get('code', '')}</td>
-                <td style="border: 1px solid #ddd; padding: 8px; text-align: center;">{quantity_display}</td>
-                <td style="border: 1px solid #ddd; padding: 8px; text-align: center;">{weight_display}</td>
-                <td style="border: 1px solid #ddd; padding: 8px; text-align: center;">{item.get('price', 0):.2f} ج</td>
-                <td style="border: 1px solid #ddd; padding: 8px; text-align: center;">{item.get('total_price', 0):.2f} ج</td>
-            </tr>
-            """
-        
-        return f"""
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <style>
-                body {{ font-family: Arial; direction: rtl; }}
-                .header {{ text-align: center; margin-bottom: 15px; }}
-                .info {{ margin-bottom: 10px; }}
-                table {{ width: 100%; border-collapse: collapse; margin: 10px 0; }}
-                th {{ background-color: #f2f2f2; padding: 6px; text-align: center; }}
-                .total {{ font-weight: bold; margin-top: 8px; }}
-                .footer {{ margin-top: 15px; text-align: center; font-style: italic; }}
-                .cashier-info {{ text-align: right; margin-top: 10px; color: #444; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>منفذ الشهداء</h1>
-                <h2>فاتورة بيع</h2>
-            </div>
-            
-            <div class="info">
-                <p><strong>رقم الفاتورة:</strong> {self.invoice_id}</p>
-                <p><strong>التاريخ:</strong> {self.date}</p>
-                <p><strong>رقم العضوية:</strong> {self.member_input.text() or '-----'}</p>
-                <p><strong>الكاشير:</strong> {self.username}</p>
-            </div>
-            
-            <table border="1">
-                <tr>
-                    <th>م</th>
-                    <th>اسم المنتج</th>
-                    <th>الكود</th>
-                    <th>الكمية</th>
-                    <th>الوزن (كجم)</th>
-                    <th>سعر الوحدة</th>
-                    <th>الإجمالي</th>
-                </tr>
-                {items_html}
-            </table>
-            <div class="total">
-                <p>المجموع: {self.total:.2f} ج</p>
-                <p>الخصم (0%): {self.discount:.2f} ج</p>
-                <p>الإجمالي النهائي: {self.net_total:.2f} ج</p>
-            </div>
-            
-            <div class="footer">
-                <p>شكراً لزيارتكم - نرجو زيارة متجرنا مرة أخرى</p>
-            </div>
-        </body>
-        </html>
-        """
+        return invoice_html(self.build_receipt())
         
     def save_invoice_as_image(self):
         """حفظ الفاتورة كصورة PNG كحل بديل إذا فشلت الطباعة"""
@@ -1061,13 +1185,15 @@ class SalesWindow(QWidget):
         # حفظ الصورة في مجلد المستندات
         docs_path = os.path.expanduser('~/Documents')
         os.makedirs(docs_path, exist_ok=True)
-        file_path = os.path.join(docs_path, f"invoice_{self.invoice_id}.png")
+        file_path = os.path.join(docs_path, f"invoice_{self.invoice_id or 'draft'}.png")
         img.save(file_path, "PNG")
         
         return file_path
         
     def closeEvent(self, event):
         """التعامل مع حدث إغلاق النافذة"""
+        QApplication.instance().removeEventFilter(self.scanner_filter)
+        self.print_spooler.stop()
         self.closed_signal.emit()  # إرسال إشارة الإغلاق
         super().closeEvent(event)
 